@@ -0,0 +1,5 @@
+import sys
+import src.batch as batch
+
+if __name__ == '__main__':
+    sys.exit(batch.cli(sys.argv[1:]))
@@ -0,0 +1,4 @@
+import sys
+import src.client as client
+
+sys.exit(client.cli(sys.argv[1:]))
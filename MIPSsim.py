@@ -1,17 +1,4 @@
 import sys
-import src.main as main
-import src.utils as utils
+import src.driver as driver
 
-sample_path = str(sys.argv[1])
-
-p = main.program(sample_path)
-
-""" Project 1 """
-# disassembly_str, simulation_str = p.simulate()
-#utils.write(p.DISASSEMBLY_FILENAME, disassembly_str)
-#utils.write(p.SIMULATION_FILENAME, simulation_str)
-
-""" Project 2 """
-disassembly_str, pipeline_str = p.pipeline()
-utils.write(p.DISASSEMBLY_FILENAME, disassembly_str)
-utils.write(p.PIPELINE_FILENAME, pipeline_str)
\ No newline at end of file
+sys.exit(driver.cli(sys.argv[1:]))
@@ -0,0 +1,5 @@
+import sys
+import src.sweep as sweep
+
+if __name__ == '__main__':
+    sys.exit(sweep.cli(sys.argv[1:]))
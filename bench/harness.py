@@ -0,0 +1,198 @@
+"""
+Benchmark harness
+
+Generates every workload, runs it with each engine and reports
+instructions/sec, cycles/sec and peak memory (resident set growth, each
+benchmark runs in a fresh process). Results can be saved
+as a JSON baseline, and compared to a baseline to fail on throughput
+regressions past a threshold.
+
+Engines:
+    disassembly : decoding of the input (instructions are decoded words)
+    simulate    : simulation_records(), i.e. simulate() without writing
+    pipeline    : pipeline_records(), i.e. pipeline() without writing
+    closure     : fastsim.closure_engine
+    block       : translator.block_translator
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+import multiprocessing
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import src.main as main
+import bench.workloads as workloads
+
+BASELINE_VERSION = 1
+
+DEFAULT_SIZE = 500
+DEFAULT_UNROLL = 4
+# loop body copies of the disassembly inputs, which only decode the code
+DEFAULT_CODE_UNROLL = 500
+
+# Run the engine on a program read from path, return (instructions, cycles,
+# seconds), disassembly is only timed for the disassembly engine
+def run_engine(engine, path):
+    p = main.program(path)
+    if engine == 'disassembly':
+        start = time.perf_counter()
+        p.disassembly()
+        return len(p.raw_data), 0, time.perf_counter() - start
+    p.load()
+    start = time.perf_counter()
+    if engine == 'simulate':
+        for record in p.simulation_records():
+            pass
+        ists = p.cycle
+    elif engine == 'pipeline':
+        for record in p.pipeline_records():
+            pass
+        ists = p.ist_count
+    else:
+        main.FUNCTIONAL_ENGINES[engine](p).run()
+        ists = p.cycle
+    return ists, p.cycle, time.perf_counter() - start
+
+ENGINES = ['disassembly', 'simulate', 'pipeline'] + sorted(main.FUNCTIONAL_ENGINES)
+
+# Peak resident memory of the process in bytes, None if unknown (no
+# resource module on Windows)
+def peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+# Best of `repeat` runs, and peak memory growth over the runs
+def measure_job(job):
+    engine, path, repeat = job
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        before = peak_rss()
+        runs = [run_engine(engine, path) for i in range(repeat)]
+        after = peak_rss()
+    ists, cycles, seconds = min(runs, key=lambda r: r[2])
+    return {'instructions': ists, 'cycles': cycles, 'seconds': seconds,
+        'ists_per_sec': ists / seconds if seconds else 0.0,
+        'cycles_per_sec': cycles / seconds if seconds else 0.0,
+        'peak_bytes': None if before is None else after - before}
+
+# Measure in a fresh process so the peak memory only covers this benchmark,
+# or in this process without peak memory if not `memory`
+def measure(engine, path, repeat=3, memory=True):
+    if not memory:
+        result = measure_job((engine, path, repeat))
+        result['peak_bytes'] = None
+        return result
+    with multiprocessing.Pool(1) as pool:
+        return pool.apply(measure_job, ((engine, path, repeat),))
+
+# Run every workload with every engine, return results keyed by 'workload/engine'
+def run(names, engines, size, unroll, code_unroll=DEFAULT_CODE_UNROLL, repeat=3, memory=True, keep=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        out = keep or tmp
+        for name in names:
+            for engine in engines:
+                is_code = engine == 'disassembly'
+                path = os.path.join(out, name + ('-code' if is_code else ''), 'sample.txt')
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    workloads.generate(name, path, size, code_unroll if is_code else unroll)
+                results[name + '/' + engine] = measure(engine, path, repeat, memory)
+    return results
+
+################################### Baselines ###################################
+def save_baseline(path, results, size, unroll, code_unroll):
+    with open(path, 'w') as f:
+        json.dump({'version': BASELINE_VERSION, 'python': platform.python_version(),
+            'size': size, 'unroll': unroll, 'code_unroll': code_unroll, 'results': results},
+            f, indent=2, sort_keys=True)
+
+def load_baseline(path):
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get('version') != BASELINE_VERSION:
+        raise ValueError('Unsupported baseline version %s'%baseline.get('version'))
+    return baseline
+
+# Keys whose instructions/sec dropped more than `threshold` (a fraction)
+# below the baseline, with their throughput ratios
+def regressions(results, baseline, threshold):
+    ret = []
+    for key, r in sorted(results.items()):
+        b = baseline['results'].get(key)
+        if b is None or not b['ists_per_sec']:
+            continue
+        ratio = r['ists_per_sec'] / b['ists_per_sec']
+        if ratio < 1 - threshold:
+            ret.append((key, ratio))
+    return ret
+
+def format_results(results, baseline=None):
+    width = max([len('Benchmark')] + [len(k) for k in results])
+    row = '%-' + str(width) + 's  %12s  %12s  %12s  %10s  %9s%s\n'
+    ret = row%('Benchmark', 'Instructions', 'Ists/s', 'Cycles/s', 'Peak(KiB)', 'Time(s)',
+        '  vs baseline' if baseline else '')
+    for key, r in sorted(results.items()):
+        versus = ''
+        if baseline:
+            b = baseline['results'].get(key)
+            versus = '  %+.1f%%'%(100 * (r['ists_per_sec'] / b['ists_per_sec'] - 1)) \
+                if b and b['ists_per_sec'] else '  -'
+        ret += row%(key, r['instructions'], '%.0f'%r['ists_per_sec'], '%.0f'%r['cycles_per_sec'],
+            '-' if r['peak_bytes'] is None else '%.0f'%(r['peak_bytes'] / 1024), '%.3f'%r['seconds'], versus)
+    return ret
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the simulator engines on synthetic workloads.')
+    parser.add_argument('-w', '--workloads', nargs='+', choices=sorted(workloads.WORKLOADS),
+        default=sorted(workloads.WORKLOADS))
+    parser.add_argument('-e', '--engines', nargs='+', choices=ENGINES, default=ENGINES)
+    parser.add_argument('--size', type=int, help='loop iterations of each workload (default: %d, '
+        'or the one of the compared baseline)'%DEFAULT_SIZE)
+    parser.add_argument('--unroll', type=int, help='loop body copies of each workload (default: %d, '
+        'or the one of the compared baseline)'%DEFAULT_UNROLL)
+    parser.add_argument('--code-unroll', type=int, help='loop body copies of the disassembly inputs '
+        '(default: %d, or the one of the compared baseline)'%DEFAULT_CODE_UNROLL)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the best is kept')
+    parser.add_argument('--no-memory', action='store_true',
+        help='run in this process without measuring peak memory')
+    parser.add_argument('--keep', help='directory to keep the generated workloads in')
+    parser.add_argument('--save', help='save results as a JSON baseline')
+    parser.add_argument('--compare', help='JSON baseline to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+        help='fail if instructions/sec drop more than this fraction below the baseline')
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.compare) if args.compare else None
+    size = args.size or (baseline['size'] if baseline else DEFAULT_SIZE)
+    unroll = args.unroll or (baseline['unroll'] if baseline else DEFAULT_UNROLL)
+    code_unroll = args.code_unroll or (baseline['code_unroll'] if baseline else DEFAULT_CODE_UNROLL)
+    if baseline and (size, unroll, code_unroll) != (baseline['size'], baseline['unroll'], baseline['code_unroll']):
+        print('Baseline was measured with --size %d --unroll %d --code-unroll %d !'
+            %(baseline['size'], baseline['unroll'], baseline['code_unroll']))
+        return 1
+    results = run(args.workloads, args.engines, size, unroll, code_unroll, args.repeat,
+        not args.no_memory, args.keep)
+    sys.stdout.write(format_results(results, baseline))
+    if args.save:
+        save_baseline(args.save, results, size, unroll, code_unroll)
+    if baseline:
+        failed = regressions(results, baseline, args.threshold)
+        for key, ratio in failed:
+            print('REGRESSION %s: %.1f%% of baseline throughput'%(key, 100 * ratio))
+        if failed:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(cli(sys.argv[1:]))
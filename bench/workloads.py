@@ -0,0 +1,138 @@
+"""
+Synthetic workloads
+
+Each workload builds a program with src.encoder: `size` loop iterations,
+with the loop body repeated `unroll` times (larger code for disassembly).
+Values stay small or grow polynomially, so registers never turn into big
+python ints, and SRL only shifts non-negative values (utils.shiftLogic).
+"""
+import sys
+import random
+import argparse
+
+import src.encoder as encoder
+
+# Data words of the memory / branch workloads
+ARRAY_LEN = 64
+
+# R1: loop counter
+def loop_begin(asm, size):
+    asm.li(1, size)
+    asm.label('loop')
+
+# jump back with J, a BGTZ offset is too short for big unrolled bodies
+def loop_end(asm):
+    asm.SUB(1, 1, 1)
+    asm.BEQ(1, 0, 'done')
+    asm.J('loop')
+    asm.label('done')
+    asm.BREAK()
+
+# Tight ALU loop of dependent ADD / SUB / SLT / AND / NOR
+def alu_loop(size, unroll, rand):
+    asm = encoder.assembler()
+    loop_begin(asm, size)
+    for u in range(unroll):
+        asm.ADD(2, 2, 'R1')
+        asm.SUB(3, 2, 7 + u)
+        asm.SLT(4, 3, 'R2')
+        asm.AND(5, 4, 'R3')
+        asm.NOR(6, 5, 0)
+        asm.ADD(7, 7, 'R4')
+        asm.SUB(8, 2, 'R7')
+    loop_end(asm)
+    return asm
+
+# Load / store heavy walk over two arrays, b[i] += a[i]; a[i] += 1
+def array_walk(size, unroll, rand):
+    asm = encoder.assembler()
+    asm.la(10)
+    asm.ADD(11, 0, 0)                   # R11: byte offset in the array
+    asm.ADD(13, 0, 4*ARRAY_LEN)         # R13: array end
+    loop_begin(asm, size)
+    for u in range(unroll):
+        asm.ADD(12, 10, 'R11')
+        asm.LW(3, 0, 12)
+        asm.LW(4, 4*ARRAY_LEN, 12)
+        asm.ADD(5, 5, 'R3')
+        asm.ADD(4, 4, 'R3')
+        asm.ADD(3, 3, 1)
+        asm.SW(3, 0, 12)
+        asm.SW(4, 4*ARRAY_LEN, 12)
+        asm.ADD(11, 11, 4)
+        asm.BEQ(11, 13, 'wrap%d'%u)
+        asm.J('next%d'%u)
+        asm.label('wrap%d'%u)
+        asm.ADD(11, 0, 0)
+        asm.label('next%d'%u)
+    loop_end(asm)
+    asm.data = [rand.randint(-1000, 1000) for i in range(2*ARRAY_LEN)]
+    return asm
+
+# Data dependent branches on the sign of random array words
+def branch_heavy(size, unroll, rand):
+    asm = encoder.assembler()
+    asm.la(10)
+    asm.ADD(11, 0, 0)
+    asm.ADD(13, 0, 4*ARRAY_LEN)
+    loop_begin(asm, size)
+    for u in range(unroll):
+        asm.ADD(12, 10, 'R11')
+        asm.LW(3, 0, 12)
+        asm.BLTZ(3, 'neg%d'%u)
+        asm.BGTZ(3, 'pos%d'%u)
+        asm.ADD(7, 7, 1)
+        asm.J('next%d'%u)
+        asm.label('neg%d'%u)
+        asm.SUB(6, 6, 'R3')
+        asm.J('next%d'%u)
+        asm.label('pos%d'%u)
+        asm.ADD(5, 5, 'R3')
+        asm.label('next%d'%u)
+        asm.ADD(11, 11, 4)
+        asm.BEQ(11, 13, 'wrap%d'%u)
+        asm.J('cont%d'%u)
+        asm.label('wrap%d'%u)
+        asm.ADD(11, 0, 0)
+        asm.label('cont%d'%u)
+    loop_end(asm)
+    asm.data = [rand.choice([-1, 0, 1]) * rand.randint(1, 100) for i in range(ARRAY_LEN)]
+    return asm
+
+# MUL / SLL / SRA / SRL chains
+def mul_shift(size, unroll, rand):
+    asm = encoder.assembler()
+    loop_begin(asm, size)
+    for u in range(unroll):
+        asm.ADD(2, 1, u)
+        asm.MUL(3, 2, 'R2')
+        asm.SLL(4, 3, 2)
+        asm.SRA(5, 4, 3)
+        asm.SRL(6, 5, 1)
+        asm.MUL(7, 6, 'R2')
+        asm.SRA(8, 7, 4)
+        asm.ADD(9, 9, 'R8')
+    loop_end(asm)
+    return asm
+
+WORKLOADS = {'alu': alu_loop, 'memory': array_walk, 'branch': branch_heavy, 'mulshift': mul_shift}
+
+# Write workload `name` as a sample.txt at path
+def generate(name, path, size=10000, unroll=1, seed=0):
+    asm = WORKLOADS[name](size, unroll, random.Random(seed))
+    asm.write(path)
+    return path
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description='Generate a synthetic workload in the sample.txt format.')
+    parser.add_argument('workload', choices=sorted(WORKLOADS))
+    parser.add_argument('output', help='output sample file')
+    parser.add_argument('--size', type=int, default=10000, help='loop iterations')
+    parser.add_argument('--unroll', type=int, default=1, help='loop body copies')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    generate(args.workload, args.output, args.size, args.unroll, args.seed)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(cli(sys.argv[1:]))
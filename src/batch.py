@@ -0,0 +1,107 @@
+"""
+Batch mode
+
+Simulate many sample programs in a process pool, outputs are written next
+to each input and one summary table is printed at the end.
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import contextlib
+import multiprocessing
+
+import src.main as main
+import src.utils as utils
+
+MODES = {'simulate': ['simulate'], 'pipeline': ['pipeline'], 'both': ['simulate', 'pipeline']}
+
+# Expand directories (every sample.txt below) and globs into input files
+def find_inputs(patterns):
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            found = glob.glob(os.path.join(pattern, '**', 'sample.txt'), recursive=True)
+        else:
+            found = glob.glob(pattern, recursive=True)
+        paths += sorted(p for p in found if os.path.isfile(p))
+    # keep order, drop duplicates
+    return list(dict.fromkeys(paths))
+
+# Run one program with the given engines, return one result per engine
+def run_job(job):
+    path, engines = job
+    results = []
+    p = None
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        for idx, engine in enumerate(engines):
+            result = {'path': path, 'mode': engine, 'cycles': 0, 'instructions': 0,
+                'time': 0.0, 'error': None}
+            start = time.time()
+            try:
+                # decode once, later engines run on the reset program
+                if p is None:
+                    p = main.program(os.path.abspath(path))
+                    p.load()
+                else:
+                    p.reset()
+                if idx == 0:
+                    utils.write_records(p.DISASSEMBLY_FILENAME, p.disassembly_records())
+                if engine == 'simulate':
+                    utils.write_records(p.SIMULATION_FILENAME, p.simulation_records())
+                    result['instructions'] = p.cycle
+                else:
+                    utils.write_records(p.PIPELINE_FILENAME, p.pipeline_records())
+                    result['instructions'] = p.ist_count
+                result['cycles'] = p.cycle
+            except Exception as e:
+                result['error'] = type(e).__name__ + (': %s'%e if str(e) else '')
+            result['time'] = time.time() - start
+            results.append(result)
+    return results
+
+# Run every input in a pool of `workers` forked processes, return all
+# results. Without fork (or with one worker) the inputs run one after the other
+def run(paths, mode='pipeline', workers=None):
+    jobs = [(path, MODES[mode]) for path in paths]
+    results = []
+    if workers != 1 and 'fork' in multiprocessing.get_all_start_methods():
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            for r in pool.imap_unordered(run_job, jobs):
+                results += r
+    else:
+        for job in jobs:
+            results += run_job(job)
+    order = dict((path, idx) for idx, path in enumerate(paths))
+    results.sort(key=lambda r: (order[r['path']], r['mode']))
+    return results
+
+def format_summary(results, wall_time):
+    width = max([len('Program')] + [len(r['path']) for r in results])
+    row = '%-' + str(width) + 's  %-8s  %10s  %12s  %9s  %s\n'
+    ret = row%('Program', 'Mode', 'Cycles', 'Instructions', 'Time(s)', 'Status')
+    for r in results:
+        ret += row%(r['path'], r['mode'], r['cycles'], r['instructions'], '%.3f'%r['time'],
+            'FAILED ' + r['error'] if r['error'] else 'ok')
+    failures = len([r for r in results if r['error']])
+    ret += '\n%d runs, %d failed, %d cycles, %d instructions, %.3fs wall time\n'%(len(results),
+        failures, sum(r['cycles'] for r in results), sum(r['instructions'] for r in results), wall_time)
+    return ret
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description='Simulate many sample programs in parallel.')
+    parser.add_argument('inputs', nargs='+', help='sample files, directories or globs')
+    parser.add_argument('-m', '--mode', choices=sorted(MODES), default='pipeline')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+        help='worker processes (default: CPU number)')
+    args = parser.parse_args(argv)
+
+    paths = find_inputs(args.inputs)
+    if not paths:
+        print('No input found !')
+        return 1
+    start = time.time()
+    results = run(paths, args.mode, args.workers)
+    sys.stdout.write(format_summary(results, time.time() - start))
+    return 1 if any(r['error'] for r in results) else 0
@@ -0,0 +1,164 @@
+"""
+Data cache model of the MEM unit
+
+A set-associative cache of the LW / SW accesses, which only models timing:
+values are always read from and written to program.mems. An access which
+misses takes miss_latency more cycles of the MEM unit, so misses hold the
+MEM unit and fill the PRE-MEM queue. Write-back caches allocate lines on
+write misses and write dirty lines back when they are evicted;
+write-through caches write every store to memory and do not allocate on
+write misses. Stores and write backs go through a write buffer and do not
+take more cycles.
+
+Tags, dirty bits, LRU stamps and PLRU tree bits are stored in arrays indexed
+by set * assoc + way (set * assoc + tree node for PLRU bits, nodes 1 to
+assoc - 1). Hits, misses, evictions and write
+backs are counted per pc of the LW / SW instruction.
+"""
+from array import array
+
+REPLACEMENTS = ['lru', 'plru']
+WRITE_POLICIES = ['write_back', 'write_through']
+
+# per pc statistics
+STATS = ['hits', 'misses', 'evictions', 'writebacks']
+HITS = 0
+MISSES = 1
+EVICTIONS = 2
+WRITEBACKS = 3
+
+def is_power_of_two(n):
+    return n > 0 and n & (n - 1) == 0
+
+# Raise ValueError if the cache shape is not valid
+def check_geometry(size, assoc, line, replacement):
+    if not is_power_of_two(line) or line < 4:
+        raise ValueError('dcache_line must be a power of two of at least 4 bytes')
+    if size % (line * assoc):
+        raise ValueError('dcache_size must be a multiple of dcache_line * dcache_assoc')
+    if replacement == 'plru' and not is_power_of_two(assoc):
+        raise ValueError('PLRU replacement needs a power of two dcache_assoc')
+
+class data_cache():
+    def __init__(self, size, assoc, line, replacement='lru', write_policy='write_back', miss_latency=10):
+        check_geometry(size, assoc, line, replacement)
+        self.size = size
+        self.assoc = assoc
+        self.line = line
+        self.replacement = replacement
+        self.write_policy = write_policy
+        self.miss_latency = miss_latency
+        self.sets = size // (line * assoc)
+        self.line_bits = line.bit_length() - 1
+        self.levels = assoc.bit_length() - 1     # PLRU tree levels
+        self.is_write_back = write_policy == 'write_back'
+        self.is_plru = replacement == 'plru'
+        self.reset()
+
+    def reset(self):
+        n = self.sets * self.assoc
+        self.tags = array('q', [-1]) * n        # line address, -1 if invalid
+        self.dirty = array('B', bytes(n))
+        self.stamps = array('Q', bytes(8 * n))  # LRU, access clock of the way
+        self.plru = array('B', bytes(n))
+        self.clock = 0
+        self.pc_stats = {}                      # pc => [hits, misses, evictions, writebacks]
+
+    # Access the word at addr for the instruction at pc, return the cycles
+    # taken in addition to a hit
+    def access(self, addr, is_write, pc):
+        stats = self.pc_stats.get(pc)
+        if stats is None:
+            stats = self.pc_stats[pc] = [0] * len(STATS)
+        line = addr >> self.line_bits
+        s = line % self.sets
+        base = s * self.assoc
+        tags = self.tags
+        for way in range(base, base + self.assoc):
+            if tags[way] == line:
+                stats[HITS] += 1
+                if is_write and self.is_write_back:
+                    self.dirty[way] = 1
+                self.touch(s, way - base)
+                return 0
+        stats[MISSES] += 1
+        # write-through stores go to memory only
+        if is_write and not self.is_write_back:
+            return 0
+        way = base + self.victim(s)
+        if tags[way] != -1:
+            stats[EVICTIONS] += 1
+            if self.dirty[way]:
+                stats[WRITEBACKS] += 1
+        tags[way] = line
+        self.dirty[way] = 1 if is_write else 0
+        self.touch(s, way - base)
+        return self.miss_latency
+
+    # way of set s to replace, invalid ways first
+    def victim(self, s):
+        base = s * self.assoc
+        tags = self.tags
+        for way in range(self.assoc):
+            if tags[base + way] == -1:
+                return way
+        if self.is_plru:
+            # follow the tree bits, which point away from the recent ways
+            bits, node, way = self.plru, base + 1, 0
+            for level in range(self.levels):
+                d = bits[node]
+                way = 2*way + d
+                node = base + 2*(node - base) + d
+            return way
+        stamps = self.stamps
+        return min(range(self.assoc), key=lambda way: stamps[base + way])
+
+    def touch(self, s, way):
+        if self.is_plru:
+            bits, base, node = self.plru, s * self.assoc, 1
+            for level in range(self.levels - 1, -1, -1):
+                d = (way >> level) & 1
+                # point the node to the other half
+                bits[base + node] = 1 - d
+                node = 2*node + d
+        else:
+            self.stamps[s * self.assoc + way] = self.clock
+            self.clock += 1
+
+    def report(self):
+        totals = [sum(stats[i] for stats in self.pc_stats.values()) for i in range(len(STATS))]
+        accesses = totals[HITS] + totals[MISSES]
+        ret = {
+            'size': self.size,
+            'assoc': self.assoc,
+            'line': self.line,
+            'replacement': self.replacement,
+            'write_policy': self.write_policy,
+            'miss_latency': self.miss_latency,
+            'accesses': accesses,
+        }
+        ret.update(zip(STATS, totals))
+        ret['hit_rate'] = totals[HITS] / accesses if accesses else None
+        ret['per_pc'] = dict((str(pc), dict(zip(STATS, self.pc_stats[pc]))) for pc in sorted(self.pc_stats))
+        return ret
+
+    """ Checkpoint state as JSON values """
+    def get_state(self):
+        return {'tags': self.tags.tolist(), 'dirty': self.dirty.tolist(), 'stamps': self.stamps.tolist(),
+            'plru': self.plru.tolist(), 'clock': self.clock,
+            'pc_stats': [[pc] + stats for pc, stats in sorted(self.pc_stats.items())]}
+
+    def set_state(self, state):
+        self.tags = array('q', state['tags'])
+        self.dirty = array('B', state['dirty'])
+        self.stamps = array('Q', state['stamps'])
+        self.plru = array('B', state['plru'])
+        self.clock = state['clock']
+        self.pc_stats = dict((e[0], e[1:]) for e in state['pc_stats'])
+
+# Data cache of a pipeline config, None without cache
+def make(config):
+    if config.dcache == 'none':
+        return None
+    return data_cache(config.dcache_size, config.dcache_assoc, config.dcache_line, config.dcache,
+        config.dcache_write, config.dcache_miss_latency)
@@ -0,0 +1,223 @@
+"""
+Checkpoint and restore of simulator state
+
+A checkpoint holds everything needed to resume a program between two cycles
+of simulate() or pipeline(): pc, cycle, registers, memory pages and the
+pipeline buffers / queues / unit state. Instructions are referenced by their
+pc, so a checkpoint is restored onto a program decoded from the same image,
+which is checked by a hash of the input words.
+
+Layout (little-endian):
+    header    : magic 'MCKP', version, START_PC, START_DATA, register number, image hash
+    config    : length, pipeline config as JSON (src.config)
+    scalars   : cycle, pc, instruction count, unready register mask, idle cycles,
+                break fetched flag
+    units     : unit instance number, countdown...
+    pipeline  : PRE_ISSUE buffer, PRE_ALU / PRE_ALUB / PRE_MEM queues and
+                POST_ALU / POST_ALUB / POST_MEM buffers as (entry number, pc...),
+                IF waiting instruction as pc (-1 if empty)
+    branch    : predicted pc (-1 if IF does not fetch past the waiting branch),
+                speculative pre-issue entry number, length, branch predictor
+                tables and statistics as JSON (src.predictor, empty if none)
+    dcache    : length, data cache arrays and statistics as JSON (src.cache,
+                empty if none)
+    registers : value...
+    memory    : highest written address, page number, (page number, page words)...,
+                spill number, (address, value)...
+"""
+import sys
+import json
+import struct
+import hashlib
+from array import array
+
+import src.memory as memory
+import src.trace as trace
+
+MAGIC = b'MCKP'
+VERSION = 4
+
+HEADER = struct.Struct('<4sHqqH20s')
+SCALARS = struct.Struct('<qqQQq?')
+U32 = trace.U32
+U64 = trace.U64
+I64 = trace.I64
+
+NO_IST = -1
+
+# Hash of the input words, instructions referenced by pc are only
+# meaningful for the same image
+def image_hash(program):
+    h = hashlib.sha1()
+    if program.image is not None:
+        h.update(program.image.mm[:])
+        return h.digest()
+    for word in program.raw_data:
+        h.update(word.strip().encode())
+    return h.digest()
+
+def config_bytes(config):
+    return json.dumps(config.to_dict(), sort_keys=True).encode()
+
+################################### Save ###################################
+def save(program, path):
+    _p = program
+    pcs = dict((id(I), _p.START_PC + 4*idx) for idx, I in enumerate(_p.ists))
+    def ist_pc(I):
+        return NO_IST if I is None else pcs[id(I)]
+    def ist_list(l):
+        return U32.pack(len(l)) + b''.join(I64.pack(ist_pc(I)) for I in l)
+
+    chunks = [HEADER.pack(MAGIC, VERSION, _p.START_PC, _p.START_DATA, _p.REGISTER_NUM, image_hash(_p))]
+    cfg = config_bytes(_p.config)
+    chunks.append(U32.pack(len(cfg)) + cfg)
+    chunks.append(SCALARS.pack(_p.cycle, _p.get_pc(), _p.ist_count, _p.unready_mask,
+        _p.idle_cycles, _p.is_break_fetched))
+    chunks.append(U32.pack(len(_p.unit_countdown)))
+    chunks += [U32.pack(c) for c in _p.unit_countdown]
+    # pipeline
+    chunks += [ist_list(l) for l in (_p.buffer_PRE_ISSUE, _p.queue_PRE_ALU, _p.queue_PRE_ALUB,
+        _p.queue_PRE_MEM, _p.buffer_POST_ALU, _p.buffer_POST_ALUB, _p.buffer_POST_MEM)]
+    chunks.append(I64.pack(ist_pc(_p.waiting_ist_IF)))
+    # branch prediction
+    state = b'' if _p.predictor is None else json.dumps(_p.predictor.get_state()).encode()
+    chunks.append(I64.pack(NO_IST if _p.predicted_pc is None else _p.predicted_pc)
+        + U32.pack(_p.speculative_count) + U32.pack(len(state)) + state)
+    # data cache
+    state = b'' if _p.dcache is None else json.dumps(_p.dcache.get_state()).encode()
+    chunks.append(U32.pack(len(state)) + state)
+    # registers
+    chunks += [trace.pack_value(v) for v in _p.regs]
+    # memory
+    mems = _p.mems
+    chunks.append(I64.pack(mems.high) + U32.pack(len(mems.pages)))
+    for number in sorted(mems.pages):
+        page = mems.pages[number]
+        if sys.byteorder != 'little':
+            page = array('i', page)
+            page.byteswap()
+        chunks.append(U64.pack(number) + page.tobytes())
+    chunks.append(U32.pack(len(mems.spill)))
+    for addr in sorted(mems.spill):
+        chunks.append(U64.pack(addr) + trace.pack_value(mems.spill[addr]))
+
+    with open(path, 'wb') as f:
+        f.write(b''.join(chunks))
+
+################################### Restore ###################################
+# Restore a checkpoint onto a program, the program is loaded first if it
+# is not yet
+def load(program, path):
+    _p = program
+    with open(path, 'rb') as f:
+        buf = f.read()
+
+    magic, version, start_pc, start_data, reg_num, digest = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError('Not a checkpoint file')
+    if version != VERSION:
+        raise ValueError('Unsupported checkpoint version %d'%version)
+    if digest != image_hash(_p):
+        raise ValueError('Checkpoint was saved from another program image')
+    _p.load()
+    if (start_pc, start_data, reg_num) != (_p.START_PC, _p.START_DATA, _p.REGISTER_NUM):
+        raise ValueError('Checkpoint layout does not match the program')
+    off = HEADER.size
+    n = U32.unpack_from(buf, off)[0]
+    off += U32.size
+    if buf[off:off+n] != config_bytes(_p.config):
+        raise ValueError('Checkpoint was saved with another pipeline config')
+    off += n
+
+    def ist_at(pc):
+        return None if pc == NO_IST else _p.ists[(pc - _p.START_PC) >> 2]
+    def read_ist():
+        nonlocal off
+        pc = I64.unpack_from(buf, off)[0]
+        off += I64.size
+        return ist_at(pc)
+    def read_ist_list():
+        nonlocal off
+        n = U32.unpack_from(buf, off)[0]
+        off += U32.size
+        return [read_ist() for i in range(n)]
+
+    cycle, pc, ist_count, unready_mask, idle_cycles, is_break_fetched = SCALARS.unpack_from(buf, off)
+    off += SCALARS.size
+    n = U32.unpack_from(buf, off)[0]
+    off += U32.size
+    unit_countdown = list(struct.unpack_from('<%dI'%n, buf, off))
+    off += 4*n
+    # pipeline
+    buffer_PRE_ISSUE = read_ist_list()
+    queue_PRE_ALU = read_ist_list()
+    queue_PRE_ALUB = read_ist_list()
+    queue_PRE_MEM = read_ist_list()
+    buffer_POST_ALU = read_ist_list()
+    buffer_POST_ALUB = read_ist_list()
+    buffer_POST_MEM = read_ist_list()
+    waiting_pc = I64.unpack_from(buf, off)[0]
+    off += I64.size
+    waiting_ist_IF = ist_at(waiting_pc)
+    # branch prediction
+    predicted_pc = I64.unpack_from(buf, off)[0]
+    speculative_count, n = struct.unpack_from('<II', buf, off + I64.size)
+    off += I64.size + 2*U32.size
+    predictor_state = json.loads(buf[off:off+n].decode()) if n else None
+    off += n
+    # data cache
+    n = U32.unpack_from(buf, off)[0]
+    off += U32.size
+    dcache_state = json.loads(buf[off:off+n].decode()) if n else None
+    off += n
+    # registers
+    regs = []
+    for i in range(reg_num):
+        v, off = trace.unpack_value(buf, off)
+        regs.append(v)
+    # memory
+    mems = memory.paged_memory()
+    mems.high = I64.unpack_from(buf, off)[0]
+    n = U32.unpack_from(buf, off + I64.size)[0]
+    off += I64.size + U32.size
+    for i in range(n):
+        number = U64.unpack_from(buf, off)[0]
+        off += U64.size
+        page = array('i')
+        page.frombytes(buf[off:off+memory.PAGE_SIZE])
+        if sys.byteorder != 'little':
+            page.byteswap()
+        mems.pages[number] = page
+        off += memory.PAGE_SIZE
+    n = U32.unpack_from(buf, off)[0]
+    off += U32.size
+    for i in range(n):
+        addr = U64.unpack_from(buf, off)[0]
+        mems.spill[addr], off = trace.unpack_value(buf, off + U64.size)
+
+    _p.cycle = cycle
+    _p.set_pc(pc)
+    _p.ist_count = ist_count
+    _p.unready_mask = unready_mask
+    _p.idle_cycles = idle_cycles
+    _p.is_skipped_cycle = False
+    _p.is_break_fetched = is_break_fetched
+    _p.unit_countdown = unit_countdown
+    _p.buffer_PRE_ISSUE = buffer_PRE_ISSUE
+    _p.queue_PRE_ALU = queue_PRE_ALU
+    _p.queue_PRE_ALUB = queue_PRE_ALUB
+    _p.queue_PRE_MEM = queue_PRE_MEM
+    _p.buffer_POST_ALU = buffer_POST_ALU
+    _p.buffer_POST_ALUB = buffer_POST_ALUB
+    _p.buffer_POST_MEM = buffer_POST_MEM
+    _p.waiting_ist_IF = waiting_ist_IF
+    _p.branch_pc = None if waiting_ist_IF is None else waiting_pc
+    _p.predicted_pc = None if predicted_pc == NO_IST else predicted_pc
+    _p.speculative_count = speculative_count
+    _p.speculative_fetched = 0
+    if _p.predictor is not None:
+        _p.predictor.set_state(predictor_state)
+    if _p.dcache is not None:
+        _p.dcache.set_state(dcache_state)
+    _p.regs = regs
+    _p.mems = mems
@@ -0,0 +1,102 @@
+"""
+Client of the simulation service (src.service)
+
+Sends jobs to the service socket with the MIPSsim.py command line, and only
+imports what the command line needs.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import socket
+import argparse
+import tempfile
+import collections
+
+import src.config as config
+import src.summary as summary
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'mipssim-%d.sock'%os.getuid())
+
+def connect(socket_path=DEFAULT_SOCKET):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(socket_path)
+    except OSError:
+        s.close()
+        raise
+    return s
+
+def is_running(socket_path=DEFAULT_SOCKET):
+    try:
+        connect(socket_path).close()
+        return True
+    except OSError:
+        return False
+
+# Send one request, yield the messages of its reply until the last one
+def request(message, socket_path=DEFAULT_SOCKET):
+    with connect(socket_path) as s:
+        s.sendall(json.dumps(message).encode() + b'\n')
+        with s.makefile('rb') as f:
+            for line in f:
+                reply = json.loads(line)
+                yield reply
+                if reply['type'] != 'output':
+                    return
+    raise ConnectionError('Service closed the connection')
+
+# Run a job on the service, outputs of an inline job are written by
+# write(name, text), return the result message
+def submit(job, socket_path=DEFAULT_SOCKET, write=None):
+    outputs = collections.OrderedDict()
+    for reply in request(job, socket_path):
+        if reply['type'] == 'output':
+            outputs.setdefault(reply['name'], []).append(reply['data'])
+        elif reply['type'] == 'error':
+            raise RuntimeError(reply['message'])
+        else:
+            if write is not None:
+                for name, chunks in outputs.items():
+                    write(name, ''.join(chunks))
+            return reply
+
+# MIPSsim.py interface, run on the service
+def cli(argv):
+    parser = argparse.ArgumentParser(description='MIPS simulator client of the simulation service, '
+        'outputs are written next to the sample file.')
+    parser.add_argument('input', help='sample file or packed image')
+    parser.add_argument('-m', '--mode', choices=list(summary.MODES), default='pipeline')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='ignored, the service runs the engines')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='service socket (%s)'%DEFAULT_SOCKET)
+    parser.add_argument('--inline', action='store_true',
+        help='send the input content, outputs are written by the client')
+    config.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    job = {'id': 0, 'mode': args.mode, 'config': config.from_args(parser, args).to_dict()}
+    path = os.path.abspath(args.input)
+    write = None
+    if args.inline:
+        with open(path, 'rb') as f:
+            job['data'] = base64.b64encode(f.read()).decode()
+        def write(name, text):
+            with open(os.path.join(os.path.dirname(path), name), 'w') as f:
+                f.write(text)
+    else:
+        job['path'] = path
+    try:
+        reply = submit(job, args.socket, write)
+    except OSError as e:
+        sys.stderr.write('No simulation service on %s: %s\n'%(args.socket, e))
+        return 1
+    except RuntimeError as e:
+        sys.stderr.write('%s\n'%e)
+        return 1
+    sys.stdout.write(summary.format_results(reply['results'], time.time() - start))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(cli(sys.argv[1:]))
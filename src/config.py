@@ -0,0 +1,158 @@
+"""
+Pipeline configuration
+
+Shape of the pipeline: fetch width, pre-issue buffer entries, issue width,
+PRE queue entries, unit number and execution cycles of ALU / ALUB / MEM.
+The default configuration is the Proj2 pipeline, where a branch only checks
+its hazards against the pre-issue buffer, so it reads stale registers when
+an instruction fetched before it in the same cycle writes them;
+fetch_hazards also checks those instructions, which matters for wider fetch.
+Instructions read their operands at write back and Issue only checks WAR
+hazards against earlier not issued instructions, so an instruction may
+overwrite the operand of an issued one; read_hazards also checks those,
+which matters with several units and speculative fetch.
+predictor selects the branch predictor of IF (src.predictor) and
+predictor_entries its table size; it needs fetch_hazards and read_hazards,
+without them the stale reads of the Proj2 pipeline make branches resolve
+early and the predictor speedup meaningless. dcache selects the replacement of a data
+cache of the MEM unit (src.cache), the dcache_* fields set its size and
+associativity, line size (bytes), write policy and miss latency (cycles).
+
+A configuration is read from a JSON file holding any of the fields, and / or
+from command line options which override the file.
+"""
+import json
+
+import src.predictor as predictor
+import src.cache as cache
+
+UNIT_NAMES = ['alu', 'alub', 'mem']
+
+# field => default, per-unit fields are lists indexed by unit
+DEFAULTS = {
+    'fetch_width': 2,
+    'pre_issue_size': 4,
+    'issue_width': 3,
+    'queue_sizes': [2, 2, 2],
+    'unit_counts': [1, 1, 1],
+    'unit_latencies': [1, 2, 1],
+    'fetch_hazards': False,
+    'read_hazards': False,
+    'predictor': 'none',
+    'predictor_entries': 256,
+    'dcache': 'none',
+    'dcache_size': 1024,
+    'dcache_assoc': 2,
+    'dcache_line': 16,
+    'dcache_write': 'write_back',
+    'dcache_miss_latency': 10,
+}
+UNIT_FIELDS = ['queue_sizes', 'unit_counts', 'unit_latencies']
+FLAG_FIELDS = ['fetch_hazards', 'read_hazards']
+# field => allowed values
+CHOICE_FIELDS = {
+    'predictor': ['none'] + list(predictor.PREDICTORS),
+    'dcache': ['none'] + cache.REPLACEMENTS,
+    'dcache_write': cache.WRITE_POLICIES,
+}
+
+class pipeline_config():
+    def __init__(self, **fields):
+        for name, default in DEFAULTS.items():
+            value = fields.pop(name, default)
+            setattr(self, name, list(value) if name in UNIT_FIELDS else value)
+        if fields:
+            raise ValueError('Unknown pipeline config field %s'%', '.join(sorted(fields)))
+        self.validate()
+
+    def validate(self):
+        for name in FLAG_FIELDS:
+            if type(getattr(self, name)) is not bool:
+                raise ValueError('%s must be true or false'%name)
+        for name, choices in CHOICE_FIELDS.items():
+            if getattr(self, name) not in choices:
+                raise ValueError('%s must be one of %s'%(name, ', '.join(choices)))
+        for name in DEFAULTS:
+            if name in FLAG_FIELDS or name in CHOICE_FIELDS:
+                continue
+            values = getattr(self, name) if name in UNIT_FIELDS else [getattr(self, name)]
+            if name in UNIT_FIELDS and len(values) != len(UNIT_NAMES):
+                raise ValueError('%s needs %d values'%(name, len(UNIT_NAMES)))
+            if any(type(v) is not int or v < 1 for v in values):
+                raise ValueError('%s must be positive integers'%name)
+        if self.predictor != 'none' and not (self.fetch_hazards and self.read_hazards):
+            raise ValueError('predictor needs fetch_hazards and read_hazards')
+        if self.dcache != 'none':
+            cache.check_geometry(self.dcache_size, self.dcache_assoc, self.dcache_line, self.dcache)
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in DEFAULTS)
+
+    # unit instance indexes of each unit, the instances are numbered unit by unit
+    def unit_slots(self):
+        ret, begin = [], 0
+        for count in self.unit_counts:
+            ret.append(range(begin, begin + count))
+            begin += count
+        return ret
+
+    def __eq__(self, other):
+        return isinstance(other, pipeline_config) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return 'pipeline_config(%s)'%', '.join('%s=%r'%item for item in self.to_dict().items())
+
+def from_dict(d):
+    if not isinstance(d, dict):
+        raise ValueError('Pipeline config must be a JSON object')
+    return pipeline_config(**d)
+
+def load(path):
+    with open(path, 'r') as f:
+        return from_dict(json.load(f))
+
+def save(config, path):
+    with open(path, 'w') as f:
+        json.dump(config.to_dict(), f, indent=2)
+
+################################### Command Line ###################################
+def unit_values(s):
+    return [int(v) for v in s.split(',')]
+
+def add_arguments(parser):
+    group = parser.add_argument_group('pipeline config')
+    group.add_argument('--config', help='JSON pipeline config file')
+    group.add_argument('--fetch-width', type=int, help='instructions fetched per cycle (2)')
+    group.add_argument('--pre-issue-size', type=int, help='pre-issue buffer entries (4)')
+    group.add_argument('--issue-width', type=int, help='instructions issued per cycle (3)')
+    group.add_argument('--queue-sizes', type=unit_values, help='ALU,ALUB,MEM queue entries (2,2,2)')
+    group.add_argument('--unit-counts', type=unit_values, help='ALU,ALUB,MEM unit number (1,1,1)')
+    group.add_argument('--unit-latencies', type=unit_values, help='ALU,ALUB,MEM execution cycles (1,2,1)')
+    group.add_argument('--fetch-hazards', action='store_true', default=None,
+        help='branches also wait on instructions fetched before them in the cycle')
+    group.add_argument('--read-hazards', action='store_true', default=None,
+        help='instructions also wait on issued instructions reading their destination')
+    group.add_argument('--predictor', choices=CHOICE_FIELDS['predictor'], help='branch predictor of IF (none)')
+    group.add_argument('--predictor-entries', type=int, help='branch predictor table entries (256)')
+    group.add_argument('--dcache', choices=CHOICE_FIELDS['dcache'], help='data cache replacement of MEM (none)')
+    group.add_argument('--dcache-size', type=int, help='data cache bytes (1024)')
+    group.add_argument('--dcache-assoc', type=int, help='data cache ways (2)')
+    group.add_argument('--dcache-line', type=int, help='data cache line bytes (16)')
+    group.add_argument('--dcache-write', choices=CHOICE_FIELDS['dcache_write'], help='data cache write policy (write_back)')
+    group.add_argument('--dcache-miss-latency', type=int, help='data cache miss cycles (10)')
+
+# Config of the parsed arguments, options override the config file; invalid
+# configs are reported as usage errors of the parser
+def from_args(parser, args):
+    fields = {}
+    try:
+        if args.config:
+            with open(args.config, 'r') as f:
+                fields = json.load(f)
+        for name in DEFAULTS:
+            value = getattr(args, name, None)
+            if value is not None:
+                fields[name] = value
+        return from_dict(fields)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
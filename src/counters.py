@@ -0,0 +1,175 @@
+"""
+Pipeline performance counters
+
+Counters collected while program.perf is set: IPC / CPI, IF stall cycles,
+Issue blocks by cause, ALU / ALUB / MEM utilization and occupancy
+histograms of the pre-issue buffer and PRE queues, and the branch
+predictor (src.predictor) and data cache (src.cache) statistics if the
+pipeline has them. IF stall cycles do not count cycles where IF fetches
+past a predicted branch. The pipeline reports the events of a cycle to the
+counters, which apply them at the end of the cycle, and again for every
+fast-forwarded cycle repeating it.
+"""
+import os
+import sys
+import json
+import argparse
+import contextlib
+
+import src.main as main
+import src.config as config
+
+UNITS = ['alu', 'alub', 'mem']
+
+# Issue block causes, one block of an entry may have several causes
+ISSUE_CAUSES = ['pre_alu_full', 'pre_alub_full', 'pre_mem_full', 'raw', 'war', 'waw', 'store_order']
+CAUSE_RAW = 3
+CAUSE_WAR = 4
+CAUSE_WAW = 5
+CAUSE_STORE_ORDER = 6
+
+class perf_counters():
+    def __init__(self):
+        self.cycles = [0]
+        self.if_waiting = [0]               # IF waits on a not ready branch
+        self.if_full = [0]                  # IF cannot fetch, pre-issue buffer full
+        self.issue_blocks = [0] * len(ISSUE_CAUSES)
+        self.blocked_entries = [0]          # not issued pre-issue entries, any cause
+        self.issue_width_cycles = [0]       # cycles where the issue width is reached
+        self.issued = [0]                   # histogram of issued instructions per cycle
+        self.unit_busy = [0] * len(UNITS)   # busy unit instance cycles
+        self.unit_counts = [1] * len(UNITS)
+        self.pre_issue = [0]                # histogram of pre-issue buffer entries
+        self.pre_queues = [[0] for u in UNITS]
+        self.start_ist_count = 0
+        self.ist_count = 0
+        self.predictor = None
+        self.dcache = None
+        # counter increments of the current cycle, (counter, index)
+        self.events = []
+
+    # Collect counters of the program from its current cycle
+    def attach(self, program):
+        program.perf = self
+        self.start_ist_count = self.ist_count = program.ist_count
+        # histograms sized by the pipeline config
+        cfg = program.config
+        grow = lambda h, n: h.extend([0] * (n + 1 - len(h)))
+        grow(self.issued, cfg.issue_width)
+        grow(self.pre_issue, cfg.pre_issue_size)
+        for u in range(len(UNITS)):
+            grow(self.pre_queues[u], cfg.queue_sizes[u])
+        self.unit_counts = list(cfg.unit_counts)
+        self.predictor = program.predictor
+        self.dcache = program.dcache
+        return self
+
+    def detach(self, program):
+        program.perf = None
+
+    ################################### Cycle Events ###################################
+    def begin_cycle(self):
+        self.events = [(self.cycles, 0)]
+
+    def IF_waiting(self):
+        self.events.append((self.if_waiting, 0))
+
+    def IF_full(self):
+        self.events.append((self.if_full, 0))
+
+    def issue_width(self):
+        self.events.append((self.issue_width_cycles, 0))
+
+    # unit is the one of a full PRE queue, None if not full
+    def issue_blocked(self, unit, RAW, WAR, WAW, mem_not_in_order):
+        events = self.events
+        events.append((self.blocked_entries, 0))
+        if unit is not None:
+            events.append((self.issue_blocks, unit))
+        if RAW:
+            events.append((self.issue_blocks, CAUSE_RAW))
+        if WAR:
+            events.append((self.issue_blocks, CAUSE_WAR))
+        if WAW:
+            events.append((self.issue_blocks, CAUSE_WAW))
+        if mem_not_in_order:
+            events.append((self.issue_blocks, CAUSE_STORE_ORDER))
+
+    # Occupancy and units at the end of the cycle
+    def end_cycle(self, program, executed, issued):
+        _p = program
+        events = self.events
+        events.append((self.issued, issued))
+        events.append((self.pre_issue, len(_p.buffer_PRE_ISSUE)))
+        countdown = _p.unit_countdown
+        for u, queue in enumerate((_p.queue_PRE_ALU, _p.queue_PRE_ALUB, _p.queue_PRE_MEM)):
+            events.append((self.pre_queues[u], len(queue)))
+            # executing instances finished in this cycle or are counting down
+            busy = executed[u] + len([s for s in _p.UNIT_SLOTS[u] if countdown[s] > 0])
+            for i in range(busy):
+                events.append((self.unit_busy, u))
+        self.repeat_cycle(1)
+        self.ist_count = _p.ist_count
+
+    # Apply the events of the last cycle n times
+    def repeat_cycle(self, n):
+        for counter, idx in self.events:
+            counter[idx] += n
+
+    ################################### Report ###################################
+    def report(self):
+        cycles = self.cycles[0]
+        ists = self.ist_count - self.start_ist_count
+        ratio = lambda a, b: a / b if b else None
+        histogram = lambda h: dict((str(i), c) for i, c in enumerate(h))
+        return {
+            'cycles': cycles,
+            'instructions': ists,
+            'ipc': ratio(ists, cycles),
+            'cpi': ratio(cycles, ists),
+            'if': {
+                'waiting_branch_cycles': self.if_waiting[0],
+                'buffer_full_cycles': self.if_full[0],
+            },
+            'issue': {
+                'issued': sum(i * c for i, c in enumerate(self.issued)),
+                'issued_per_cycle': histogram(self.issued),
+                'width_limited_cycles': self.issue_width_cycles[0],
+                'blocked_entries': self.blocked_entries[0],
+                'blocks': dict(zip(ISSUE_CAUSES, self.issue_blocks)),
+            },
+            'units': dict((name, {'count': self.unit_counts[u], 'busy_cycles': self.unit_busy[u],
+                'utilization': ratio(self.unit_busy[u], cycles * self.unit_counts[u])})
+                for u, name in enumerate(UNITS)),
+            'occupancy': dict([('pre_issue', histogram(self.pre_issue))] +
+                [('pre_' + name, histogram(self.pre_queues[u])) for u, name in enumerate(UNITS)]),
+            'branch': self.predictor.report() if self.predictor is not None else None,
+            'dcache': self.dcache.report() if self.dcache is not None else None,
+        }
+
+    def write_report(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description='Pipeline performance counters of one sample program.')
+    parser.add_argument('input', help='sample file')
+    parser.add_argument('-o', '--output', help='JSON report file (default: stdout)')
+    config.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    perf = perf_counters()
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        p = main.program(args.input, config.from_args(parser, args))
+        p.load()
+        perf.attach(p)
+        p.run_pipeline()
+    if args.output:
+        perf.write_report(args.output)
+    else:
+        json.dump(perf.report(), sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(cli(sys.argv[1:]))
@@ -0,0 +1,373 @@
+"""
+Debugger
+
+PC breakpoints, register / memory watchpoints and conditional breaks for
+the functional (simulate) and pipeline engines, with a command line REPL
+to step, continue and inspect.
+
+Nothing is checked while nothing is armed: continue then runs the plain
+simulation_steps / run_pipeline loops. A watchpoint wraps set_reg_val /
+set_mem_val on the program instance, and a pipeline breakpoint wraps
+fetch_v2, only while one is armed, and runs use an instrumented loop which
+stops after the instruction / cycle with a hit. A functional breakpoint
+stops before the instruction at its pc executes, a pipeline breakpoint at
+the end of the cycle which fetches it.
+
+Conditions are Python expressions of r (registers), m (memory), pc, cycle
+and p (the program); watchpoint conditions also see old and new, the
+values before and after the write:
+    break 148 if r[3] > 5
+    watch r4 if new < 0
+    watch 184 if cycle > 20
+"""
+import os
+import sys
+import cmd
+import argparse
+import contextlib
+
+import src.main as main
+import src.config as config
+import src.formatter as formatter
+
+ENGINES = ['simulate', 'pipeline']
+
+"""
+Breakpoint / watchpoint, kind is 'break', 'reg' or 'mem' and target the
+pc, register index or memory address
+"""
+class watch():
+    def __init__(self, id, kind, target, condition=None):
+        self.id = id
+        self.kind = kind
+        self.target = target
+        self.condition = condition
+        self.code = None
+        if condition is not None:
+            try:
+                self.code = compile(condition, '<condition>', 'eval')
+            except SyntaxError as e:
+                raise ValueError('Invalid condition %s: %s'%(condition, e.msg))
+        self.hits = 0
+        self.hit_cycle = None       # cycle of the last hit
+
+    def describe(self):
+        name = {'break': 'Breakpoint %d at pc %d', 'reg': 'Watchpoint %d on R%d', 'mem': 'Watchpoint %d on mem %d'}
+        ret = name[self.kind]%(self.id, self.target)
+        if self.condition is not None:
+            ret += ' if ' + self.condition
+        return ret
+
+class debugger():
+    def __init__(self, program, engine='simulate'):
+        if engine not in ENGINES:
+            raise ValueError('Unknown engine %s'%engine)
+        self.program = program
+        self.engine = engine
+        self.watches = {}           # id => watch
+        self.next_id = 1
+        self.hits = []              # (watch, pc, old, new) of the last step
+        self.wrapped = []           # method names wrapped on the program instance
+        self.is_finished = False
+        self.last = None            # simulate: (pc, instruction) last executed
+        self.IF_str = None          # pipeline: IF unit string of the last cycle
+        self.exec_pc = None         # simulate: pc of the running instruction
+        self.breaks = {}
+        self.stop_pc = None         # simulate: pc of the last breakpoint stop
+        self.steps = program.simulation_steps() if engine == 'simulate' else None
+
+    ################################### Breakpoints ###################################
+    def add_breakpoint(self, pc, condition=None):
+        return self.add('break', pc, condition)
+
+    def watch_reg(self, reg_idx, condition=None):
+        if not 0 <= reg_idx < len(self.program.regs):
+            raise ValueError('Invalid register R%d'%reg_idx)
+        return self.add('reg', reg_idx, condition)
+
+    def watch_mem(self, addr, condition=None):
+        self.program.mems.check(addr)
+        return self.add('mem', addr, condition)
+
+    def add(self, kind, target, condition):
+        w = watch(self.next_id, kind, target, condition)
+        self.watches[w.id] = w
+        self.next_id += 1
+        self.arm()
+        return w.id
+
+    def delete(self, id=None):
+        if id is None:
+            self.watches.clear()
+        elif self.watches.pop(id, None) is None:
+            raise KeyError('No breakpoint %d'%id)
+        self.arm()
+
+    def targets(self, kind):
+        ret = {}
+        for w in self.watches.values():
+            if w.kind == kind:
+                ret.setdefault(w.target, []).append(w)
+        return ret
+
+    # Wrap the methods the armed watches need, restore the plain others
+    def arm(self):
+        self.detach()
+        p = self.program
+        regs, mems = self.targets('reg'), self.targets('mem')
+        breaks = self.targets('break')
+        if regs:
+            set_reg_val = p.set_reg_val
+            def wrapper(reg_idx, val):
+                old = p.regs[reg_idx]
+                set_reg_val(reg_idx, val)
+                if reg_idx in regs:
+                    self.check(regs[reg_idx], self.exec_pc, old, val)
+            self.wrap('set_reg_val', wrapper)
+        if mems:
+            set_mem_val = p.set_mem_val
+            def wrapper(mem_addr, val):
+                old = p.mems[mem_addr]
+                set_mem_val(mem_addr, val)
+                if mem_addr in mems:
+                    self.check(mems[mem_addr], self.exec_pc, old, val)
+            self.wrap('set_mem_val', wrapper)
+        if breaks and self.engine == 'pipeline':
+            fetch_v2 = p.fetch_v2
+            def wrapper():
+                pc = p.get_pc()
+                if pc in breaks:
+                    self.check(breaks[pc], pc)
+                return fetch_v2()
+            self.wrap('fetch_v2', wrapper)
+        self.breaks = breaks
+
+    def wrap(self, name, wrapper):
+        self.program.__dict__[name] = wrapper
+        self.wrapped.append(name)
+
+    # Restore the plain methods
+    def detach(self):
+        for name in self.wrapped:
+            del self.program.__dict__[name]
+        self.wrapped = []
+
+    # Record a hit of the watches whose condition holds, at most one per
+    # watch and cycle (IF fetches a waiting branch again in the cycle it
+    # executes); pc is None for pipeline writes
+    def check(self, watches, pc, old=None, new=None):
+        cycle = self.program.cycle
+        for w in watches:
+            if w.hit_cycle == cycle:
+                continue
+            if w.code is None or eval(w.code, self.namespace(pc, old, new)):
+                w.hits += 1
+                w.hit_cycle = cycle
+                self.hits.append((w, pc, old, new))
+
+    def namespace(self, pc=None, old=None, new=None):
+        p = self.program
+        return {'r': p.regs, 'm': p.mems, 'p': p, 'pc': p.get_pc() if pc is None else pc,
+            'cycle': p.cycle, 'old': old, 'new': new}
+
+    ################################### Run ###################################
+    # Run one instruction / cycle
+    def advance(self):
+        p = self.program
+        if self.engine == 'simulate':
+            self.exec_pc = p.get_pc()
+            self.last = next(self.steps, None)
+            if p.get_pc() == -1:
+                # BREAK executed, end the steps
+                for step in self.steps:
+                    pass
+                self.is_finished = True
+        else:
+            if p.idle_cycles > 0:
+                p.skip_cycles(1)
+            else:
+                self.IF_str = p.step_pipeline()
+            p.is_skipped_cycle = False
+            self.is_finished = p.is_break_fetched
+
+    # Run n instructions / cycles, or until the end if n is None, stop at a
+    # hit; return the hits
+    def run(self, n=None):
+        self.hits = []
+        if self.is_finished:
+            return self.hits
+        if n is None and not self.watches:
+            self.run_plain()
+            return self.hits
+        breaks = self.breaks if self.engine == 'simulate' else {}
+        p = self.program
+        stop_pc, self.stop_pc = self.stop_pc, None
+        i = 0
+        while not self.is_finished and (n is None or i < n):
+            if breaks:
+                pc = p.get_pc()
+                # a run from a breakpoint stop executes its instruction
+                if pc in breaks and not (i == 0 and pc == stop_pc):
+                    self.check(breaks[pc], pc)
+                    if self.hits:
+                        self.stop_pc = pc
+                        break
+            self.advance()
+            i += 1
+            if self.hits:
+                break
+        return self.hits
+
+    def step(self, n=1):
+        return self.run(n)
+
+    def cont(self):
+        return self.run()
+
+    # Nothing armed, the engine loops as they are
+    def run_plain(self):
+        p = self.program
+        if self.engine == 'simulate':
+            for step in self.steps:
+                self.last = step
+        else:
+            p.skip_cycles(p.idle_cycles)
+            p.run_pipeline()
+        self.is_finished = True
+
+################################### REPL ###################################
+def format_hit(hit):
+    w, pc, old, new = hit
+    if w.kind == 'break':
+        return 'Breakpoint %d, pc %d'%(w.id, pc)
+    target = 'R%d'%w.target if w.kind == 'reg' else 'mem %d'%w.target
+    return 'Watchpoint %d, %s: %s -> %s'%(w.id, target, old, new) + ('' if pc is None else ' (pc %d)'%pc)
+
+# 'target [if condition]' => (target, condition)
+def split_condition(arg):
+    target, sep, condition = arg.strip().partition(' if ')
+    return target.strip(), condition.strip() if sep else None
+
+class debugger_shell(cmd.Cmd):
+    intro = 'Type help or ? to list commands.'
+    prompt = '(mips) '
+
+    def __init__(self, dbg, stdin=None, stdout=None):
+        cmd.Cmd.__init__(self, stdin=stdin, stdout=stdout)
+        self.dbg = dbg
+        self.use_rawinput = stdin is None and sys.stdin.isatty()
+
+    def write(self, s):
+        self.stdout.write(s + '\n')
+
+    def onecmd(self, line):
+        try:
+            return cmd.Cmd.onecmd(self, line)
+        except Exception as e:
+            self.write('Error: %s: %s'%(type(e).__name__, e))
+
+    def do_break(self, arg):
+        """break <pc> [if <condition>]: stop at the instruction at pc"""
+        pc, condition = split_condition(arg)
+        id = self.dbg.add_breakpoint(int(pc), condition)
+        self.write(self.dbg.watches[id].describe())
+
+    def do_watch(self, arg):
+        """watch r<index>|<address> [if <condition>]: stop after a write of the register / memory word"""
+        target, condition = split_condition(arg)
+        if target[:1] in ('r', 'R'):
+            id = self.dbg.watch_reg(int(target[1:]), condition)
+        else:
+            id = self.dbg.watch_mem(int(target), condition)
+        self.write(self.dbg.watches[id].describe())
+
+    def do_delete(self, arg):
+        """delete [<id>]: delete a breakpoint / watchpoint, or all of them"""
+        self.dbg.delete(int(arg) if arg.strip() else None)
+
+    def do_info(self, arg):
+        """info: list the breakpoints and watchpoints"""
+        if not self.dbg.watches:
+            self.write('No breakpoints or watchpoints.')
+        for w in self.dbg.watches.values():
+            self.write('%s, hit %d time%s'%(w.describe(), w.hits, '' if w.hits == 1 else 's'))
+
+    def do_step(self, arg):
+        """step [<n>]: run n instructions (simulate) / cycles (pipeline)"""
+        self.report(self.dbg.step(int(arg) if arg.strip() else 1))
+
+    def do_continue(self, arg):
+        """continue: run until a breakpoint, a watchpoint or the end"""
+        self.report(self.dbg.cont())
+
+    def do_where(self, arg):
+        """where: pc, cycle and the last instruction / pipeline state"""
+        p = self.dbg.program
+        self.write('Cycle %d, pc %d'%(p.cycle, p.get_pc()))
+        if self.dbg.engine == 'simulate':
+            if self.dbg.last is not None:
+                addr, I = self.dbg.last
+                self.write('Executed %d\t%s'%(addr, I.mips))
+        elif self.dbg.IF_str is not None:
+            self.stdout.write(p.get_pipeline_infos(self.dbg.IF_str))
+
+    def do_regs(self, arg):
+        """regs: register values"""
+        regs = self.dbg.program.regs
+        for i in range(0, len(regs), 8):
+            self.write('R%02d:%s'%(i, formatter.format_values(regs[i:i+8])))
+
+    def do_mem(self, arg):
+        """mem <address> [<n>]: n memory words from address (8)"""
+        args = arg.split()
+        addr, n = int(args[0]), int(args[1]) if len(args) > 1 else 8
+        mems = self.dbg.program.mems
+        for a in range(addr, addr + 4*n, 32):
+            self.write('%d:%s'%(a, formatter.format_values([mems[x] for x in range(a, min(a + 32, addr + 4*n), 4)])))
+
+    def do_print(self, arg):
+        """print <expression>: value of an expression of r, m, pc, cycle and p"""
+        self.write(repr(eval(arg, self.dbg.namespace())))
+
+    def do_quit(self, arg):
+        """quit: leave the debugger"""
+        return True
+
+    do_EOF = do_quit
+    do_b = do_break
+    do_s = do_step
+    do_c = do_continue
+    do_p = do_print
+    do_q = do_quit
+
+    def report(self, hits):
+        for hit in hits:
+            self.write(format_hit(hit))
+        if self.dbg.is_finished:
+            self.write('Program finished at cycle %d'%self.dbg.program.cycle)
+        else:
+            self.write('Cycle %d, pc %d'%(self.dbg.program.cycle, self.dbg.program.get_pc()))
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description='Debug a sample program with breakpoints and watchpoints.')
+    parser.add_argument('input', help='sample file or packed image')
+    parser.add_argument('-m', '--mode', choices=ENGINES, default='simulate')
+    parser.add_argument('-x', '--commands', help='file of debugger commands run first')
+    config.add_arguments(parser)
+    args = parser.parse_args(argv)
+    cfg = config.from_args(parser, args)
+
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        p = main.program(args.input, cfg)
+        p.load()
+    shell = debugger_shell(p.debug(args.mode))
+    if args.commands:
+        with open(args.commands, 'r') as f:
+            for line in f:
+                if line.strip() and shell.onecmd(line.strip()):
+                    return 0
+    shell.cmdloop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(cli(sys.argv[1:]))
@@ -0,0 +1,187 @@
+"""
+Integer instruction decoder
+
+A word is decoded as one 32-bit integer: fields are extracted with shifts
+and masks, and the instruction class is picked from tables indexed by
+opcode / funct. Decoded fields are memoized by the raw word, so repeated
+words are only decoded once.
+"""
+import src.utils as utils
+import src.instruction as ist
+
+################################### Field Extraction ###################################
+def opcode(w):
+    return w >> 26
+
+def rs(w):
+    return (w >> 21) & 0x1F
+
+def rt(w):
+    return (w >> 16) & 0x1F
+
+def rd(w):
+    return (w >> 11) & 0x1F
+
+def sa(w):
+    return (w >> 6) & 0x1F
+
+def funct(w):
+    return w & 0x3F
+
+# signed 16-bit immediate / offset
+def imm(w):
+    return utils.sign_extend(w & 0xFFFF, 16)
+
+################################### Field Decoders ###################################
+"""
+Each decoder returns (instruction class, constructor args) for a word,
+the program is appended to args when the instruction is built.
+"""
+def _J(w):
+    return ist.J, (w & 0x3FFFFFF,)
+
+def _BEQ(w):
+    return ist.BEQ, (rs(w), rt(w), imm(w))
+
+def _BGTZ(w):
+    return ist.BGTZ, (rs(w), imm(w))
+
+def _BLTZ(w):
+    return ist.BLTZ, (rs(w), imm(w))
+
+def _SW(w):
+    return ist.SW, (rs(w), rt(w), imm(w))
+
+def _LW(w):
+    return ist.LW, (rs(w), rt(w), imm(w))
+
+def _MUL(w):
+    return ist.MUL, (False, rs(w), rt(w), rd(w))
+
+# category 2 instructions with register / immediate operand
+def _category2(cls, is_imm):
+    if is_imm:
+        return lambda w: (cls, (True, rs(w), rt(w), imm(w)))
+    return lambda w: (cls, (False, rs(w), rt(w), rd(w)))
+
+def _JR(w):
+    return ist.JR, (rs(w), sa(w))
+
+def _BREAK(w):
+    return ist.BREAK, ((w >> 6) & 0xFFFFF,)
+
+def _SLL(w):
+    # SLL R0, R0, #0 is NOP
+    if (w >> 6) & 0xFFFFF == 0:
+        return ist.NOP, ()
+    return ist.SLL, (rt(w), rd(w), sa(w))
+
+def _SRL(w):
+    return ist.SRL, (rt(w), rd(w), sa(w))
+
+def _SRA(w):
+    return ist.SRA, (rt(w), rd(w), sa(w))
+
+################################### Dispatch Tables ###################################
+# SPECIAL instructions indexed by funct
+FUNCT_TABLE = [None] * 64
+FUNCT_TABLE[0b001000] = _JR
+FUNCT_TABLE[0b001101] = _BREAK
+FUNCT_TABLE[0b000000] = _SLL
+FUNCT_TABLE[0b000010] = _SRL
+FUNCT_TABLE[0b000011] = _SRA
+FUNCT_TABLE[0b100000] = _category2(ist.ADD, False)
+FUNCT_TABLE[0b100010] = _category2(ist.SUB, False)
+FUNCT_TABLE[0b100100] = _category2(ist.AND, False)
+FUNCT_TABLE[0b100110] = _category2(ist.NOR, False)
+FUNCT_TABLE[0b101010] = _category2(ist.SLT, False)
+
+def _special(w):
+    decode = FUNCT_TABLE[funct(w)]
+    return decode(w) if decode is not None else None
+
+# Immediate category 2 instructions indexed by opcode
+IMMEDIATE_TABLE = [None] * 64
+IMMEDIATE_TABLE[0b110000] = _category2(ist.ADD, True)
+IMMEDIATE_TABLE[0b110001] = _category2(ist.SUB, True)
+IMMEDIATE_TABLE[0b110010] = _category2(ist.AND, True)
+IMMEDIATE_TABLE[0b110011] = _category2(ist.NOR, True)
+IMMEDIATE_TABLE[0b110101] = _category2(ist.SLT, True)
+
+def _immediate(w):
+    decode = IMMEDIATE_TABLE[opcode(w)]
+    return decode(w) if decode is not None else None
+
+# All instructions indexed by opcode, unknown opcodes fall back to
+# SPECIAL (leading bit 0) or immediate (leading bit 1) decoding
+OPCODE_TABLE = [_special] * 32 + [_immediate] * 32
+OPCODE_TABLE[0b000010] = _J
+OPCODE_TABLE[0b000100] = _BEQ
+OPCODE_TABLE[0b000111] = _BGTZ
+OPCODE_TABLE[0b000001] = _BLTZ
+OPCODE_TABLE[0b101011] = _SW
+OPCODE_TABLE[0b100011] = _LW
+OPCODE_TABLE[0b011100] = _MUL
+
+################################### Decode ###################################
+# raw word => (instruction class, constructor args)
+_cache = {}
+
+# Decode fields of a 32-bit integer word, None if no such instruction
+def decode_fields(w):
+    try:
+        return _cache[w]
+    except KeyError:
+        fields = _cache[w] = OPCODE_TABLE[w >> 26](w)
+        return fields
+
+# Decode a 32-bit integer word into an instruction of the program
+def decode(w, program):
+    fields = decode_fields(w)
+    if fields is None:
+        print('No such instrucion opcode found !')
+        return None
+    cls, args = fields
+    I = cls(*args, program)
+    I.init_hazard()
+    # MIPS text of the listing and the records
+    I.mips = I.get_MIPS()
+    return I
+
+def clear_cache():
+    _cache.clear()
+
+# The word is BREAK, which ends the instructions of a program
+def is_break(w):
+    return opcode(w) == 0 and funct(w) == 0b001101
+
+"""
+Instructions of a program decoded on first access, `word(idx)` returns the
+integer word of instruction idx. The pc of a decoded instruction is kept in
+its `pc`
+"""
+class lazy_ists():
+    def __init__(self, word, n, program):
+        self.word = word
+        self.PG = program
+        self.ists = [None] * n
+
+    def __len__(self):
+        return len(self.ists)
+
+    def __getitem__(self, idx):
+        I = self.ists[idx]
+        if I is None:
+            idx %= len(self.ists)
+            I = self.ists[idx] = decode(self.word(idx), self.PG)
+            if I is not None:
+                I.pc = self.PG.START_PC + 4*idx
+        return I
+
+    def __iter__(self):
+        for idx in range(len(self.ists)):
+            yield self[idx]
+
+    # Number of instructions decoded so far
+    def decoded(self):
+        return len(self.ists) - self.ists.count(None)
@@ -0,0 +1,102 @@
+"""
+Single-pass driver
+
+Decodes a sample once and produces the outputs of the selected mode:
+    functional  : disassembly.txt and simulation.txt (Proj1)
+    pipeline    : disassembly.txt and pipeline.txt (Proj2)
+    both        : disassembly.txt, simulation.txt and pipeline.txt
+    disassembly : disassembly.txt only
+    stats       : no output file, cycles / instructions of both engines
+With both engines, they run in two forked worker processes which share the
+decoded program, or one after the other on a reset program where fork is not
+available.
+"""
+import sys
+import time
+import argparse
+import multiprocessing
+
+import src.main as main
+import src.config as config
+import src.utils as utils
+import src.summary as summary
+
+MODES = summary.MODES
+
+# program shared with forked workers
+_program = None
+
+# Run one engine on a loaded program, its output file is written by
+# write(path, records); if write is None no record is formatted and the
+# unformatted loops only count cycles / instructions
+def run_engine(program, engine, write=utils.write_records):
+    _p = program
+    start = time.time()
+    if engine == 'functional':
+        count = lambda: _p.cycle
+        if write is not None:
+            write(_p.SIMULATION_FILENAME, _p.simulation_records())
+        else:
+            for step in _p.simulation_steps():
+                pass
+    else:
+        count = lambda: _p.ist_count
+        if write is not None:
+            write(_p.PIPELINE_FILENAME, _p.pipeline_records())
+        else:
+            _p.run_pipeline()
+    ret = {'engine': engine, 'cycles': _p.cycle, 'instructions': count(), 'time': time.time() - start}
+    if engine == 'pipeline' and _p.predictor is not None:
+        ret['branch'] = _p.predictor.report()
+    if engine == 'pipeline' and _p.dcache is not None:
+        ret['dcache'] = _p.dcache.report()
+    return ret
+
+def run_forked(job):
+    engine, write = job
+    return run_engine(_program, engine, write)
+
+# Run the engines of mode on a loaded program, return one result per engine.
+# Outputs are written by write(path, records)
+def run(program, mode='pipeline', workers=None, write=utils.write_records):
+    global _program
+    engines = MODES[mode]
+    if mode == 'stats':
+        write = None
+    else:
+        # the listing decodes every instruction once, before the fork
+        write(program.DISASSEMBLY_FILENAME, program.disassembly_records())
+    if len(engines) > 1 and workers != 1 and 'fork' in multiprocessing.get_all_start_methods():
+        _program = program
+        try:
+            with multiprocessing.get_context('fork').Pool(len(engines)) as pool:
+                return pool.map(run_forked, [(engine, write) for engine in engines])
+        finally:
+            _program = None
+    results = []
+    for idx, engine in enumerate(engines):
+        if idx:
+            program.reset()
+        results.append(run_engine(program, engine, write))
+    return results
+
+format_results = summary.format_results
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description='MIPS simulator, outputs are written next to the sample file.')
+    parser.add_argument('input', help='sample file or packed image')
+    parser.add_argument('-m', '--mode', choices=list(MODES), default='pipeline')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+        help='1 runs both engines in this process (default: one worker per engine)')
+    config.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    p = main.program(args.input, config.from_args(parser, args))
+    p.load()
+    results = run(p, args.mode, args.workers)
+    sys.stdout.write(format_results(results, time.time() - start))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(cli(sys.argv[1:]))
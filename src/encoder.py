@@ -0,0 +1,192 @@
+"""
+Instruction encoder and assembler
+
+The inverse of src/decoder.py: instructions are encoded into 32-bit words
+with the opcode / funct codes of src/instruction.py, and an assembler lays
+out instructions, labels and the Data region of a sample.txt program.
+"""
+import src.instruction as ist
+
+START_PC = 64
+
+# mnemonic => opcode / funct
+OPCODES = dict((name, int(code, 2)) for code, name in ist.OPCODE_TYPES.items())
+FUNCTS = dict((name, int(code, 2)) for code, name in ist.SPECIAL_TYPES.items())
+MUL_FUNCT = 0b000010
+
+IMM_MIN = -(1 << 15)
+IMM_MAX = (1 << 15) - 1
+
+################################### Word Encoding ###################################
+def check_imm(imm):
+    if not IMM_MIN <= imm <= IMM_MAX:
+        raise ValueError('Immediate %d out of 16 bits'%imm)
+    return imm & 0xFFFF
+
+def special(funct, rs=0, rt=0, rd=0, sa=0):
+    return rs << 21 | rt << 16 | rd << 11 | sa << 6 | funct
+
+def immediate(opcode, rs, rt, imm):
+    return opcode << 26 | rs << 21 | rt << 16 | check_imm(imm)
+
+# category 2 instruction, register or immediate (is_imm) form
+def category2(name, is_imm, rd_rt, rs, rt_imm):
+    if name == 'MUL':
+        if is_imm:
+            raise ValueError('MUL has no immediate form')
+        return OPCODES['SPECIAL2'] << 26 | special(MUL_FUNCT, rs, rt_imm, rd_rt)
+    if is_imm:
+        return immediate(FUNCTS[name + 'I'], rs, rd_rt, rt_imm)
+    return special(FUNCTS[name], rs, rt_imm, rd_rt)
+
+def shift(name, rd, rt, sa):
+    return special(FUNCTS[name], 0, rt, rd, sa)
+
+# branch offset field from the branch pc to the target address
+def branch_offset(pc, target):
+    return (target - pc - 4) >> 2
+
+def word_str(w):
+    return format(w & 0xFFFFFFFF, '032b')
+
+################################### Assembler ###################################
+"""
+Assembler of one program, branch / jump targets are label names resolved
+when the program is assembled
+"""
+class assembler():
+    def __init__(self, start_pc=START_PC):
+        self.start_pc = start_pc
+        self.items = []         # word, or (name, fields...) waiting for labels
+        self.labels = {}
+        self.data = []
+
+    def pc(self):
+        return self.start_pc + 4*len(self.items)
+
+    def label(self, name):
+        self.labels[name] = self.pc()
+
+    def emit(self, item):
+        self.items.append(item)
+
+    # category 2 instructions, the last operand is an int immediate or 'R<n>'
+    def op(self, name, rd_rt, rs, rt_imm):
+        if isinstance(rt_imm, str):
+            self.emit(category2(name, False, rd_rt, rs, int(rt_imm[1:])))
+        else:
+            self.emit(category2(name, True, rd_rt, rs, rt_imm))
+
+    def ADD(self, rd_rt, rs, rt_imm):
+        self.op('ADD', rd_rt, rs, rt_imm)
+
+    def SUB(self, rd_rt, rs, rt_imm):
+        self.op('SUB', rd_rt, rs, rt_imm)
+
+    def AND(self, rd_rt, rs, rt_imm):
+        self.op('AND', rd_rt, rs, rt_imm)
+
+    def NOR(self, rd_rt, rs, rt_imm):
+        self.op('NOR', rd_rt, rs, rt_imm)
+
+    def SLT(self, rd_rt, rs, rt_imm):
+        self.op('SLT', rd_rt, rs, rt_imm)
+
+    def MUL(self, rd, rs, rt):
+        self.op('MUL', rd, rs, rt)
+
+    def SLL(self, rd, rt, sa):
+        self.emit(shift('SLL', rd, rt, sa))
+
+    def SRL(self, rd, rt, sa):
+        self.emit(shift('SRL', rd, rt, sa))
+
+    def SRA(self, rd, rt, sa):
+        self.emit(shift('SRA', rd, rt, sa))
+
+    def LW(self, rt, offset, base):
+        self.emit(immediate(OPCODES['LW'], base, rt, offset))
+
+    def SW(self, rt, offset, base):
+        self.emit(immediate(OPCODES['SW'], base, rt, offset))
+
+    def NOP(self):
+        self.emit(0)
+
+    def JR(self, rs):
+        self.emit(special(FUNCTS['JR'], rs))
+
+    def BREAK(self):
+        self.emit(special(FUNCTS['BREAK']))
+
+    def J(self, target):
+        self.emit(('J', target))
+
+    def BEQ(self, rs, rt, target):
+        self.emit(('BEQ', rs, rt, target))
+
+    def BGTZ(self, rs, target):
+        self.emit(('BGTZ', rs, target))
+
+    def BLTZ(self, rs, target):
+        self.emit(('BLTZ', rs, target))
+
+    # Load a constant into reg (up to 31 bits), with shifts if it does
+    # not fit in an immediate
+    def li(self, reg, value):
+        if IMM_MIN <= value <= IMM_MAX:
+            self.ADD(reg, 0, value)
+            return
+        if value < 0 or value >= 1 << 31:
+            raise ValueError('Constant %d out of range'%value)
+        self.li(reg, value >> 15)
+        self.SLL(reg, reg, 15)
+        if value & 0x7FFF:
+            self.ADD(reg, reg, value & 0x7FFF)
+
+    # Load the address of Data word `index` into reg, always 3 instructions
+    # since the Data region starts after the last instruction
+    def la(self, reg, index=0):
+        self.emit(('LA_HI', reg, index))
+        self.SLL(reg, reg, 15)
+        self.emit(('LA_LO', reg, index))
+
+    # Address of the Data region, after the BREAK ending the instructions
+    def start_data(self):
+        return self.start_pc + 4*len(self.items)
+
+    def resolve(self, pc, item):
+        name = item[0]
+        if name in ('LA_HI', 'LA_LO'):
+            addr = self.start_data() + 4*item[2]
+            if name == 'LA_HI':
+                return category2('ADD', True, item[1], 0, addr >> 15)
+            return category2('ADD', True, item[1], item[1], addr & 0x7FFF)
+        target = self.labels[item[-1]]
+        if name == 'J':
+            return OPCODES['J'] << 26 | target >> 2
+        if name == 'BEQ':
+            return immediate(OPCODES['BEQ'], item[1], item[2], branch_offset(pc, target))
+        if name == 'BGTZ':
+            return immediate(OPCODES['BGTZ'], item[1], 0, branch_offset(pc, target))
+        return immediate(OPCODES['REGIMM'], item[1], 0, branch_offset(pc, target))
+
+    # Instruction words of the program
+    def words(self):
+        pc = self.start_pc
+        ret = []
+        for item in self.items:
+            ret.append(item if isinstance(item, int) else self.resolve(pc, item))
+            pc += 4
+        return ret
+
+    # Lines of a sample.txt, instructions then Data region
+    def lines(self):
+        if not self.items or self.items[-1] != special(FUNCTS['BREAK']):
+            raise ValueError('The last instruction must be BREAK')
+        return [word_str(w) for w in self.words()] + [word_str(v) for v in self.data]
+
+    def write(self, path):
+        lines = self.lines()
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
@@ -0,0 +1,58 @@
+"""
+Fast functional engine
+
+Each decoded instruction is compiled once into a callable(regs, mems)
+with its operands bound as constants, which returns the next pc. The
+simulation loop is then only `pc = code[pc](regs, mems)`.
+"""
+
+"""
+Closure-compiled functional engine, results match program.simulate()
+"""
+class closure_engine():
+    def __init__(self, program):
+        self.PG = program
+        # pc => compiled instruction, compiled on first fetch
+        self.code = {}
+        # address of the last executed instruction
+        self.last_pc = None
+
+    # Compile the instruction at pc into the code cache
+    def compile(self, pc):
+        _p = self.PG
+        idx = (pc - _p.START_PC) >> 2
+        if idx < 0 or idx >= len(_p.ists):
+            raise IndexError('No instruction at pc %d'%pc)
+        self.code[pc] = _p.ists[idx].compile(pc)
+
+    # Run until BREAK or `max_ists` instructions, return executed number
+    def run(self, max_ists=None):
+        _p = self.PG
+        self.pc, self.n = _p.get_pc(), 0
+        limit = -1 if max_ists is None else max_ists
+        try:
+            while self.pc != -1 and self.n != limit:
+                try:
+                    self._loop(self.pc, self.n, limit)
+                except KeyError:
+                    # a missing pc compiles and resumes, other KeyErrors are real
+                    if self.pc in self.code:
+                        raise
+                    self.compile(self.pc)
+        finally:
+            _p.set_pc(self.pc)
+            _p.cycle += self.n
+        return self.n
+
+    def _loop(self, pc, n, limit):
+        code, regs, mems = self.code, self.PG.regs, self.PG.mems
+        last = self.last_pc
+        try:
+            while pc != -1 and n != limit:
+                last = pc
+                pc = code[pc](regs, mems)
+                n += 1
+        finally:
+            # keep progress when an exception leaves the loop
+            self.pc, self.n = pc, n
+            self.last_pc = last if n else None
@@ -0,0 +1,105 @@
+"""
+Record formatter
+
+Renders the simulation.txt / pipeline.txt records of a program. The MIPS text
+of every instruction is cached on it at decode time (decoder.decode), the
+fixed parts of a record are precompiled strings, and a record is built with
+one join of its parts.
+"""
+
+SEPARATOR = '--------------------\n'
+
+# IF unit lines
+IF_IDLE = 'IF Unit:\n\tWaiting Instruction: \n\tExecuted Instruction: \n'
+IF_WAITING = 'IF Unit:\n\tWaiting Instruction: %s\n\tExecuted Instruction: \n'
+IF_EXECUTED = 'IF Unit:\n\tWaiting Instruction: \n\tExecuted Instruction: %s\n'
+
+# '\tEntry <idx>:' prefixes of a buffer / queue of size entries
+def entry_prefixes(size):
+    return ['\tEntry %d:'%i for i in range(size)]
+
+# Lines of the empty entries n to size-1, for each n
+def empty_entries(size):
+    prefixes = entry_prefixes(size)
+    return [''.join(e + '\n' for e in prefixes[n:]) for n in range(size + 1)]
+
+# '[MIPS]' of each instruction in a POST buffer
+def format_buffer(ists):
+    return ''.join(['[' + I.mips + ']' for I in ists])
+
+# Tab-prefixed values
+def format_values(values):
+    return '\t' + '\t'.join(map(str, values)) if values else ''
+
+"""
+Formatter of the records of one program, caches the rendered Data rows
+"""
+class record_formatter():
+    def __init__(self, program):
+        self.PG = program
+        # entry lines of the pre-issue buffer and PRE queues, by config size
+        sizes = [program.config.pre_issue_size] + program.config.queue_sizes
+        self.prefixes = dict((size, entry_prefixes(size)) for size in sizes)
+        self.empty = dict((size, empty_entries(size)) for size in sizes)
+        self.start_data = None
+        self.rows = {}          # row number => '\n<addr>:' of the Data row
+        self.row_data = {}      # row number => words of the cached row
+        self.row_strs = {}      # row number => rendered row
+
+    # Data region rows of 8 words, rows of pages never written are left out
+    def data_rows(self):
+        _p = self.PG
+        if self.start_data != _p.START_DATA:
+            self.start_data, self.rows, self.row_data, self.row_strs = _p.START_DATA, {}, {}, {}
+        rows, row_data, row_strs = self.rows, self.row_data, self.row_strs
+        # without spilled values the words are plain ints, equal words give
+        # equal rows (True == 1 but is rendered differently)
+        is_int = not _p.mems.spill
+        parts = []
+        for addr, data in _p.get_data_runs():
+            first = (addr - self.start_data) >> 5
+            for k in range(0, len(data), 8):
+                r = first + (k >> 3)
+                words = data[k:k+8]
+                if not is_int or words != row_data.get(r):
+                    row = rows.get(r)
+                    if row is None:
+                        row = rows[r] = '\n%d:'%(self.start_data + 32*r)
+                    row_strs[r] = row + format_values(words)
+                    row_data[r] = words if is_int else None
+                parts.append(row_strs[r])
+        return ''.join(parts)
+
+    # Entry lines of a buffer / queue of size entries
+    def entries(self, ists, size):
+        prefixes = self.prefixes[size]
+        parts = [prefixes[idx] + '[' + I.mips + ']\n' for idx, I in enumerate(ists)]
+        parts.append(self.empty[size][len(ists)])
+        return ''.join(parts)
+
+    def simulation_record(self, o_str, I):
+        regs = self.PG.regs
+        return ''.join([SEPARATOR, o_str, '\t', I.mips, '\n\nRegisters\nR00:', format_values(regs[0:16]),
+            '\nR16:', format_values(regs[16:32]), '\n\nData', self.data_rows(), '\n\n'])
+
+    def pipeline_header(self):
+        return SEPARATOR + 'Cycle:%d\n\n'%self.PG.cycle
+
+    def pipeline_body(self, IF_str):
+        regs = self.PG.regs
+        return ''.join([self.pipeline_infos(IF_str), '\nRegisters\nR00:', format_values(regs[0:8]),
+            '\nR08:', format_values(regs[8:16]), '\nR16:', format_values(regs[16:24]),
+            '\nR24:', format_values(regs[24:32]), '\n\nData', self.data_rows(), '\n'])
+
+    # IF unit, buffers and queues of a pipeline record
+    def pipeline_infos(self, IF_str):
+        _p = self.PG
+        pre_issue_size, queue_sizes = _p.config.pre_issue_size, _p.config.queue_sizes
+        return ''.join([IF_str,
+            'Pre-Issue Buffer:\n', self.entries(_p.buffer_PRE_ISSUE, pre_issue_size),
+            'Pre-ALU Queue:\n', self.entries(_p.queue_PRE_ALU, queue_sizes[0]),
+            'Post-ALU Buffer:', format_buffer(_p.buffer_POST_ALU), '\n',
+            'Pre-ALUB Queue:\n', self.entries(_p.queue_PRE_ALUB, queue_sizes[1]),
+            'Post-ALUB Buffer:', format_buffer(_p.buffer_POST_ALUB), '\n',
+            'Pre-MEM Queue:\n', self.entries(_p.queue_PRE_MEM, queue_sizes[2]),
+            'Post-MEM Buffer:', format_buffer(_p.buffer_POST_MEM), '\n'])
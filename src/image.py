@@ -0,0 +1,129 @@
+"""
+Packed binary program image
+
+A sample.txt holds one word per line as 32 ASCII characters. A packed image
+holds the same words as raw 32-bit words after a small header, and is read
+through mmap: instructions are decoded on first fetch and the Data region
+is loaded into memory in one bulk copy.
+
+Layout:
+    header : magic 'MIPB', version, byte order ('<' little / '>' big endian),
+             instruction number, data word number (header is little-endian)
+    words  : instruction words, then data words, in the image byte order
+The instructions end with the first BREAK, like in sample.txt.
+"""
+import sys
+import mmap
+import struct
+import argparse
+
+import src.utils as utils
+import src.decoder as decoder
+
+MAGIC = b'MIPB'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHcxII')
+BYTEORDERS = {b'<': 'little', b'>': 'big'}
+
+def is_image(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+"""
+Memory-mapped packed image
+"""
+class packed_image():
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mm) < HEADER.size:
+            raise ValueError('Truncated image %s'%path)
+        magic, version, order, self.ist_num, self.data_num = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a packed image %s'%path)
+        if version != VERSION:
+            raise ValueError('Unsupported image version %d'%version)
+        if order not in BYTEORDERS:
+            raise ValueError('Unknown image byte order %r'%order)
+        self.byteorder = BYTEORDERS[order]
+        # data words need a byte swap on this host
+        self.swap = self.byteorder != sys.byteorder
+        self.data_offset = HEADER.size + 4*self.ist_num
+        if len(self.mm) < self.data_offset + 4*self.data_num:
+            raise ValueError('Truncated image %s'%path)
+
+    # Unsigned word idx of the image, instructions then data
+    def word(self, idx):
+        off = HEADER.size + 4*idx
+        return int.from_bytes(self.mm[off:off+4], self.byteorder)
+
+    # Unsigned instruction word idx
+    def ist_word(self, idx):
+        return self.word(idx)
+
+    # Unsigned data word idx
+    def data_word(self, idx):
+        return self.word(self.ist_num + idx)
+
+    # Raw bytes of the data words, in the image byte order
+    def data_bytes(self):
+        return self.mm[self.data_offset:self.data_offset + 4*self.data_num]
+
+    # Every word of the image, instructions then data
+    def words(self):
+        return [self.word(i) for i in range(self.ist_num + self.data_num)]
+
+    def close(self):
+        self.mm.close()
+
+################################### Packing ###################################
+# Number of instruction words, up to the first BREAK
+def split_words(words):
+    for idx, w in enumerate(words):
+        if decoder.is_break(w):
+            return idx + 1
+    return len(words)
+
+# Pack unsigned 32-bit words into an image
+def pack(words, path, byteorder='little'):
+    ist_num = split_words(words)
+    order = dict((v, k) for k, v in BYTEORDERS.items())[byteorder]
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, order, ist_num, len(words) - ist_num))
+        f.write(b''.join(w.to_bytes(4, byteorder) for w in words))
+
+# Pack a sample.txt into an image
+def pack_sample(sample_path, path, byteorder='little'):
+    lines = [l.strip() for l in utils.read(sample_path) if l.strip()]
+    pack([utils.b2i(l) for l in lines], path, byteorder)
+
+# Write an image back as a sample.txt
+def unpack_image(path, sample_path):
+    img = packed_image(path)
+    try:
+        with open(sample_path, 'w') as f:
+            f.write(''.join(format(w, '032b') + '\n' for w in img.words()))
+    finally:
+        img.close()
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description='Convert between sample.txt and packed binary images.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('pack', help='sample.txt to image')
+    p.add_argument('input')
+    p.add_argument('output')
+    p.add_argument('--big-endian', action='store_true', help='big-endian words (default: little-endian)')
+    p = sub.add_parser('unpack', help='image to sample.txt')
+    p.add_argument('input')
+    p.add_argument('output')
+    args = parser.parse_args(argv)
+
+    if args.command == 'pack':
+        pack_sample(args.input, args.output, 'big' if args.big_endian else 'little')
+    else:
+        unpack_image(args.input, args.output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(cli(sys.argv[1:]))
@@ -13,6 +13,16 @@ SPECIAL_TYPES = {'001000':'JR', '001101':'BREAK', '000000':'SLL', '000010':'SRL'
 ALU_ISTS = ['ADD', 'SUB', 'AND', 'NOR', 'SLT']    
 ALUB_ISTS = ['SLL', 'SRL', 'SRA', 'MUL'] 
 MEM_ISTS = ['SW', 'LW']           
+BRANCH_ISTS = ['J', 'JR', 'BEQ', 'BLTZ', 'BGTZ']
+
+# functional unit classes, ALU / ALUB / MEM index the pre-issue queues
+UNIT_ALU = 0
+UNIT_ALUB = 1
+UNIT_MEM = 2
+UNIT_BRANCH = 3
+UNIT_NONE = 4
+UNIT_TYPES = dict([(n, UNIT_ALU) for n in ALU_ISTS] + [(n, UNIT_ALUB) for n in ALUB_ISTS]
+                + [(n, UNIT_MEM) for n in MEM_ISTS] + [(n, UNIT_BRANCH) for n in BRANCH_ISTS])
 
 ################################### BASE INSTRUCION CLASS ###################################
 class ist_obj():
@@ -21,6 +31,18 @@ class ist_obj():
         raise NotImplementedError
     def get_MIPS(self):
         raise NotImplementedError
+    # compile into a callable(regs, mems) which returns the next pc
+    def compile(self, pc):
+        raise NotImplementedError
+    # python statements on register locals r0..r31, branches assign npc
+    def get_py(self, pc):
+        raise NotImplementedError
+
+    # precompute register masks and functional unit for hazard detection
+    def init_hazard(self):
+        self.smask = utils.reg_mask(getattr(self, 'sregs', []))
+        self.dmask = utils.reg_mask(getattr(self, 'dregs', []))
+        self.unit = UNIT_TYPES.get(self.name, UNIT_NONE)
 
 ################################### CATEGORY 1 INSTRUCIONS ###################################
 """  
@@ -42,6 +64,13 @@ class J(ist_obj):
         _p = self.PG
         _p.set_pc(self.target<<2)
     
+    def compile(self, pc):
+        npc = self.target<<2
+        return lambda regs, mems: npc
+    
+    def get_py(self, pc):
+        return ['npc = %d'%(self.target<<2)]
+    
     def get_MIPS(self):
         return 'J #%d'%(self.target<<2)
 
@@ -66,6 +95,13 @@ class JR(ist_obj):
         _p = self.PG
         _p.set_pc(_p.get_reg_val(self.rs))
     
+    def compile(self, pc):
+        rs = self.rs
+        return lambda regs, mems: regs[rs]
+    
+    def get_py(self, pc):
+        return ['npc = r%d'%(self.rs)]
+    
     def get_MIPS(self):
         return 'JR R%d'%(self.rs)
 
@@ -92,6 +128,13 @@ class BEQ(ist_obj):
             _p.set_pc((self.offset<<2) + _p.get_pc())
         _p.next()
     
+    def compile(self, pc):
+        rs, rt, taken, npc = self.rs, self.rt, (self.offset<<2) + pc + 4, pc + 4
+        return lambda regs, mems: taken if regs[rs] == regs[rt] else npc
+    
+    def get_py(self, pc):
+        return ['npc = %d if r%d == r%d else %d'%((self.offset<<2) + pc + 4, self.rs, self.rt, pc + 4)]
+    
     def get_MIPS(self):
         return 'BEQ R%d, R%d, #%d'%(self.rs, self.rt, self.offset<<2)
 
@@ -117,6 +160,13 @@ class BLTZ(ist_obj):
             _p.set_pc((self.offset<<2) + _p.get_pc())
         _p.next()
     
+    def compile(self, pc):
+        rs, taken, npc = self.rs, (self.offset<<2) + pc + 4, pc + 4
+        return lambda regs, mems: taken if regs[rs] < 0 else npc
+    
+    def get_py(self, pc):
+        return ['npc = %d if r%d < 0 else %d'%((self.offset<<2) + pc + 4, self.rs, pc + 4)]
+    
     def get_MIPS(self):
         return 'BLTZ R%d, #%d'%(self.rs, self.offset<<2)
 
@@ -142,6 +192,13 @@ class BGTZ(ist_obj):
             _p.set_pc((self.offset<<2) + _p.get_pc())
         _p.next()
     
+    def compile(self, pc):
+        rs, taken, npc = self.rs, (self.offset<<2) + pc + 4, pc + 4
+        return lambda regs, mems: taken if regs[rs] > 0 else npc
+    
+    def get_py(self, pc):
+        return ['npc = %d if r%d > 0 else %d'%((self.offset<<2) + pc + 4, self.rs, pc + 4)]
+    
     def get_MIPS(self):
         return 'BGTZ R%d, #%d'%(self.rs, self.offset<<2)
 
@@ -161,6 +218,12 @@ class BREAK(ist_obj):
         _p = self.PG
         _p.set_pc(-1)   # set pc = -1 as stop signal 
     
+    def compile(self, pc):
+        return lambda regs, mems: -1
+    
+    def get_py(self, pc):
+        return ['npc = -1']
+    
     def get_MIPS(self):
         return 'BREAK'
 
@@ -188,6 +251,16 @@ class SW(ist_obj):
         self.WB()
         self.PG.next()
     
+    def compile(self, pc):
+        base, rt, offset, npc = self.base, self.rt, self.offset, pc + 4
+        def f(regs, mems):
+            mems[regs[base] + offset] = regs[rt]
+            return npc
+        return f
+    
+    def get_py(self, pc):
+        return ['mems[r%d + %d] = r%d'%(self.base, self.offset, self.rt)]
+    
     def get_MIPS(self):
         return 'SW R%d, %d(R%d)'%(self.rt, self.offset, self.base)
 
@@ -214,6 +287,16 @@ class LW(ist_obj):
         self.WB()
         self.PG.next()
     
+    def compile(self, pc):
+        base, rt, offset, npc = self.base, self.rt, self.offset, pc + 4
+        def f(regs, mems):
+            regs[rt] = mems[regs[base] + offset]
+            return npc
+        return f
+    
+    def get_py(self, pc):
+        return ['r%d = mems[r%d + %d]'%(self.rt, self.base, self.offset)]
+    
     def get_MIPS(self):
         return 'LW R%d, %d(R%d)'%(self.rt, self.offset, self.base)
 
@@ -240,6 +323,16 @@ class SLL(ist_obj):
         self.WB()
         self.PG.next()
     
+    def compile(self, pc):
+        rt, rd, sa, npc = self.rt, self.rd, self.sa, pc + 4
+        def f(regs, mems):
+            regs[rd] = utils.shiftLogic(regs[rt], -sa)
+            return npc
+        return f
+    
+    def get_py(self, pc):
+        return ['r%d = shiftLogic(r%d, %d)'%(self.rd, self.rt, -self.sa)]
+    
     def get_MIPS(self):
         return 'SLL R%d, R%d, #%d'%(self.rd, self.rt, self.sa)
 
@@ -266,6 +359,16 @@ class SRL(ist_obj):
         self.WB()
         self.PG.next()
     
+    def compile(self, pc):
+        rt, rd, sa, npc = self.rt, self.rd, self.sa, pc + 4
+        def f(regs, mems):
+            regs[rd] = utils.shiftLogic(regs[rt], sa)
+            return npc
+        return f
+    
+    def get_py(self, pc):
+        return ['r%d = shiftLogic(r%d, %d)'%(self.rd, self.rt, self.sa)]
+    
     def get_MIPS(self):
         return 'SRL R%d, R%d, #%d'%(self.rd, self.rt, self.sa)
 
@@ -292,6 +395,16 @@ class SRA(ist_obj):
         self.WB()
         self.PG.next()
     
+    def compile(self, pc):
+        rt, rd, sa, npc = self.rt, self.rd, self.sa, pc + 4
+        def f(regs, mems):
+            regs[rd] = utils.shiftArith(regs[rt], sa)
+            return npc
+        return f
+    
+    def get_py(self, pc):
+        return ['r%d = shiftArith(r%d, %d)'%(self.rd, self.rt, self.sa)]
+    
     def get_MIPS(self):
         return 'SRA R%d, R%d, #%d'%(self.rd, self.rt, self.sa)
 
@@ -308,6 +421,13 @@ class NOP(ist_obj):
     def execute(self):
         self.PG.next()
     
+    def compile(self, pc):
+        npc = pc + 4
+        return lambda regs, mems: npc
+    
+    def get_py(self, pc):
+        return []
+    
     def get_MIPS(self):
         return 'NOP'
 
@@ -346,6 +466,23 @@ class ADD(ist_obj):
         self.WB()
         self.PG.next()
     
+    def compile(self, pc):
+        rs, rt, rd_imm, npc = self.rs, self.rt, self.rd_imm, pc + 4
+        if self.is_imm:
+            def f(regs, mems):
+                regs[rt] = regs[rs] + rd_imm
+                return npc
+        else:
+            def f(regs, mems):
+                regs[rd_imm] = regs[rs] + regs[rt]
+                return npc
+        return f
+    
+    def get_py(self, pc):
+        if self.is_imm:
+            return ['r%d = r%d + %d'%(self.rt, self.rs, self.rd_imm)]
+        return ['r%d = r%d + r%d'%(self.rd_imm, self.rs, self.rt)]
+    
     def get_MIPS(self):
         if self.is_imm:
             return 'ADD R%d, R%d, #%d'%(self.rt, self.rs, self.rd_imm)
@@ -383,6 +520,23 @@ class SUB(ist_obj):
         self.WB()
         self.PG.next()
     
+    def compile(self, pc):
+        rs, rt, rd_imm, npc = self.rs, self.rt, self.rd_imm, pc + 4
+        if self.is_imm:
+            def f(regs, mems):
+                regs[rt] = regs[rs] - rd_imm
+                return npc
+        else:
+            def f(regs, mems):
+                regs[rd_imm] = regs[rs] - regs[rt]
+                return npc
+        return f
+    
+    def get_py(self, pc):
+        if self.is_imm:
+            return ['r%d = r%d - %d'%(self.rt, self.rs, self.rd_imm)]
+        return ['r%d = r%d - r%d'%(self.rd_imm, self.rs, self.rt)]
+    
     def get_MIPS(self):
         if self.is_imm:
             return 'SUB R%d, R%d, #%d'%(self.rt, self.rs, self.rd_imm)
@@ -420,6 +574,23 @@ class MUL(ist_obj):
         self.WB()
         self.PG.next()
     
+    def compile(self, pc):
+        rs, rt, rd_imm, npc = self.rs, self.rt, self.rd_imm, pc + 4
+        if self.is_imm:
+            def f(regs, mems):
+                regs[rt] = regs[rs] * rd_imm
+                return npc
+        else:
+            def f(regs, mems):
+                regs[rd_imm] = regs[rs] * regs[rt]
+                return npc
+        return f
+    
+    def get_py(self, pc):
+        if self.is_imm:
+            return ['r%d = r%d * %d'%(self.rt, self.rs, self.rd_imm)]
+        return ['r%d = r%d * r%d'%(self.rd_imm, self.rs, self.rt)]
+    
     def get_MIPS(self):
         if self.is_imm:
             return 'MUL R%d, R%d, #%d'%(self.rt, self.rs, self.rd_imm)
@@ -457,6 +628,23 @@ class AND(ist_obj):
         self.WB()
         self.PG.next()
     
+    def compile(self, pc):
+        rs, rt, rd_imm, npc = self.rs, self.rt, self.rd_imm, pc + 4
+        if self.is_imm:
+            def f(regs, mems):
+                regs[rt] = regs[rs] and rd_imm
+                return npc
+        else:
+            def f(regs, mems):
+                regs[rd_imm] = regs[rs] and regs[rt]
+                return npc
+        return f
+    
+    def get_py(self, pc):
+        if self.is_imm:
+            return ['r%d = r%d and %d'%(self.rt, self.rs, self.rd_imm)]
+        return ['r%d = r%d and r%d'%(self.rd_imm, self.rs, self.rt)]
+    
     def get_MIPS(self):
         if self.is_imm:
             return 'AND R%d, R%d, #%d'%(self.rt, self.rs, self.rd_imm)
@@ -494,6 +682,23 @@ class NOR(ist_obj):
         self.WB()
         self.PG.next()
     
+    def compile(self, pc):
+        rs, rt, rd_imm, npc = self.rs, self.rt, self.rd_imm, pc + 4
+        if self.is_imm:
+            def f(regs, mems):
+                regs[rt] = regs[rs] or not rd_imm
+                return npc
+        else:
+            def f(regs, mems):
+                regs[rd_imm] = regs[rs] or not regs[rt]
+                return npc
+        return f
+    
+    def get_py(self, pc):
+        if self.is_imm:
+            return ['r%d = r%d or not %d'%(self.rt, self.rs, self.rd_imm)]
+        return ['r%d = r%d or not r%d'%(self.rd_imm, self.rs, self.rt)]
+    
     def get_MIPS(self):
         if self.is_imm:
             return 'NOR R%d, R%d, #%d'%(self.rt, self.rs, self.rd_imm)
@@ -531,6 +736,23 @@ class SLT(ist_obj):
         self.WB()
         self.PG.next()
     
+    def compile(self, pc):
+        rs, rt, rd_imm, npc = self.rs, self.rt, self.rd_imm, pc + 4
+        if self.is_imm:
+            def f(regs, mems):
+                regs[rt] = regs[rs] < rd_imm
+                return npc
+        else:
+            def f(regs, mems):
+                regs[rd_imm] = regs[rs] < regs[rt]
+                return npc
+        return f
+    
+    def get_py(self, pc):
+        if self.is_imm:
+            return ['r%d = r%d < %d'%(self.rt, self.rs, self.rd_imm)]
+        return ['r%d = r%d < r%d'%(self.rd_imm, self.rs, self.rt)]
+    
     def get_MIPS(self):
         if self.is_imm:
             return 'SLT R%d, R%d, #%d'%(self.rt, self.rs, self.rd_imm)
@@ -1,120 +1,235 @@
 import os
 import src.utils as utils
 import src.instruction as ist
+import src.decoder as decoder
+import src.memory as memory
+import src.image as image
+import src.formatter as formatter
+import src.config as config
+import src.predictor as predictor
+import src.cache as cache
+import src.fastsim as fastsim
+import src.translator as translator
+import src.checkpoint as checkpoint
+import src.debugger as debugger
+
+# Fast functional engines for program.simulate_fast
+FUNCTIONAL_ENGINES = {'closure': fastsim.closure_engine, 'block': translator.block_translator}
 
 """
 Main program class
 """
 class program():
 ################################### Public Function ###################################
-    # Initiatation and read input
-    def __init__(self, input_path):
+    # Initiatation and read input, pipeline_config is the pipeline shape
+    # (src.config), the Proj2 pipeline by default
+    def __init__(self, input_path, pipeline_config=None):
         """ Program Configs """
         data_dir = os.path.dirname(input_path) + '/'
         self.DISASSEMBLY_FILENAME = data_dir +'disassembly.txt'
         self.SIMULATION_FILENAME = data_dir +'simulation.txt'
         self.PIPELINE_FILENAME = data_dir +'pipeline.txt'
 
-        # read raw sample input 
-        self.raw_data = utils.read(input_path)  
+        # read raw sample input, or map a packed binary image
+        if image.is_image(input_path):
+            self.image = image.packed_image(input_path)
+            self.raw_data = None
+        else:
+            self.image = None
+            self.raw_data = utils.read(input_path)  
 
         self.START_PC = 64                  # pc starts at #64
         self.START_DATA = self.START_PC     # data start address
         self.REGISTER_NUM = 32              # set register number to 32
         
+        """ Decoded Field """
+        self.words = None                   # unsigned input words, of sample.txt
+        self.ists = []
+
+        # pipeline shape, ALU / ALUB / MEM unit instances are numbered unit by unit
+        self.config = pipeline_config if pipeline_config is not None else config.pipeline_config()
+        self.UNIT_SLOTS = self.config.unit_slots()
+        self.UNIT_LATENCY = self.config.unit_latencies
+
+        # branch predictor of IF (src.predictor), None if branches stall IF
+        self.predictor = predictor.make(self.config)
+        # data cache of MEM (src.cache), None if every access takes the MEM latency
+        self.dcache = cache.make(self.config)
+
+        # performance counters (src.counters), None if not collected
+        self.perf = None
+
+        # simulation.txt / pipeline.txt record formatting
+        self.formatter = formatter.record_formatter(self)
+
+        self.reset()
+        print('! Input Read Finished...\n')
+        
+    # Clear the simulation state, a loaded program keeps its decoded
+    # instructions and gets its Data region back
+    def reset(self):
         """ Regular Field """
         self.cycle = 0 
         self.pc = [self.START_PC]    
         self.regs = [0] * self.REGISTER_NUM
-        self.mems = {}
-        self.ists = []
+        self.mems = memory.paged_memory()
 
         """ Pipeline Field """
-        # buffers for pipelining, each has only 1 entry except 4 for PRE_ISSUE 
-        self.buffer_PRE_ISSUE = []          # 4 entries
-        self.buffer_POST_ALU  = None          
-        self.buffer_POST_ALUB = None          
-        self.buffer_POST_MEM  = None          
+        # buffers for pipelining, POST buffers have one entry per unit instance
+        self.buffer_PRE_ISSUE = []          # config.pre_issue_size entries
+        self.buffer_POST_ALU  = []
+        self.buffer_POST_ALUB = []
+        self.buffer_POST_MEM  = []
 
-        # queues for pipelining, each has 2 entries
+        # queues for pipelining, config.queue_sizes entries
         self.queue_PRE_MEM  = []
         self.queue_PRE_ALU  = []
         self.queue_PRE_ALUB = []
 
-        # IF stalling due to branches
+        # IF stalling due to branches, and the pc of the waiting branch
         self.waiting_ist_IF = None
+        self.branch_pc = None
+        # predicted next pc of the waiting branch, None if IF does not fetch
+        # past it. The instructions fetched past it are the last
+        # speculative_count entries of the pre-issue buffer
+        self.predicted_pc = None
+        self.speculative_count = 0
+        # speculative instructions fetched in this cycle
+        self.speculative_fetched = 0
+        if self.predictor is not None:
+            self.predictor.reset()
+        if self.dcache is not None:
+            self.dcache.reset()
+        # IF fetches no new instruction, used to drain the pipeline
+        self.is_fetch_stalled = False
+
+        # scoreboard of destination registers in PRE queues / POST buffers
+        self.unready_mask = 0
+
+        # instructions executed in IF, written back or stored
+        self.ist_count = 0
         
-        """ ALUB cycle state
-        | 0  |  occupied |
-        | 1  | available | """
-        self.ALUB_state = 1
+        """ ALU / ALUB / MEM cycle state, remaining cycles of the instruction
+        executing on each unit instance, 0 if the instance is available """
+        self.unit_countdown = [0] * sum(self.config.unit_counts)
+
+        # cycles which can be fast-forwarded after the last pipeline cycle
+        self.idle_cycles = 0
+        # the last pipeline cycle was fast-forwarded
+        self.is_skipped_cycle = False
 
         # stop signal
         self.is_break_fetched = False
 
-        print('! Input Read Finished...\n')
-        
+        if self.ists:
+            self.load_data()
+
     # Disasembly sample
     def disassembly(self):
-        b = 1
-        pc = self.START_PC
-        disassembly_str = ''
-
-        for idx in range(len(self.raw_data)):
-            word = self.raw_data[idx].strip()
-            # Record disassembly string
-            bitarray = [word[0:6], word[6:11], word[11:16], word[16:21], word[21:26], word[26:32]]
-            disassembly_str += ' '.join(bitarray) + '\t' + str(pc) + '\t'
-            # Decode instruction word
-            decoded = self.decode_ist(word)
-            disassembly_str += decoded.get_MIPS() + '\n' 
-            self.ists.append(decoded)
-            pc += 4
-            # End of instructions if meets [BREAK]
-            if decoded.name == 'BREAK':
-                b = idx
-                self.START_DATA = pc
-                break
-        print('# Instruction Word Decode Finished...')
-        
-        for idx in range(b+1, len(self.raw_data)):
-            word = self.raw_data[idx].strip()
-            # Decode memory word
-            decoded = utils.signed_b2i(self.raw_data[idx].strip())
-            # Record disassembly string
-            disassembly_str += word + '\t' + str(pc) + '\t' +str(decoded) + '\n'
-            self.set_mem_val(pc, decoded)
-            pc += 4
-        print('# Memory Word Decode Finished...')
+        self.load()
+        disassembly_str = ''.join(self.disassembly_records())
         print('! Disassembly Finished...\n')
         return disassembly_str
 
+    # Load instructions and data without any disassembly listing, instructions
+    # are decoded on first fetch
+    def load(self):
+        if self.ists:
+            return
+        if self.image is not None:
+            return self.load_image()
+        self.words = [utils.b2i(line.strip()) for line in self.raw_data if line.strip()]
+        ist_num = image.split_words(self.words)
+        self.ists = decoder.lazy_ists(self.words.__getitem__, ist_num, self)
+        self.START_DATA = self.START_PC + 4*ist_num
+        print('# Instruction Word Decode Finished...')
+        self.load_data()
+        print('# Memory Word Decode Finished...')
+
+    # Map a packed image, the data words are copied in bulk
+    def load_image(self):
+        img = self.image
+        self.words = None
+        self.ists = decoder.lazy_ists(img.ist_word, img.ist_num, self)
+        self.START_DATA = self.START_PC + 4*img.ist_num
+        print('# Instruction Word Decode Finished...')
+        self.load_data()
+        print('# Memory Word Decode Finished...')
+
+    # Copy the Data region of the input into memory
+    def load_data(self):
+        if self.image is not None:
+            self.mems.load_bytes(self.START_DATA, self.image.data_bytes(), self.image.swap)
+        else:
+            ist_num = len(self.ists)
+            self.mems.load_words(self.START_DATA, [utils.sign_extend(w, 32) for w in self.words[ist_num:]])
+
+    # Number of words of the input, instructions then data
+    def get_word_num(self):
+        if self.image is not None:
+            return self.image.ist_num + self.image.data_num
+        return len(self.words)
+
+    # Unsigned word at address addr
+    def get_word(self, addr):
+        idx = (addr - self.START_PC) >> 2
+        return self.image.word(idx) if self.image is not None else self.words[idx]
+
+    # Lines of the disassembly listing with pc in [start, end), the whole
+    # listing by default
+    def disassembly_records(self, start=None, end=None):
+        self.load()
+        end_pc = self.START_PC + 4*self.get_word_num()
+        start = self.START_PC if start is None else max(start, self.START_PC)
+        end = end_pc if end is None else min(end, end_pc)
+        # align start to a word
+        start += (self.START_PC - start) % 4
+        for pc in range(start, end, 4):
+            w = self.get_word(pc)
+            word = format(w, '032b')
+            if pc < self.START_DATA:
+                # Record disassembly string
+                bitarray = [word[0:6], word[6:11], word[11:16], word[16:21], word[21:26], word[26:32]]
+                yield ' '.join(bitarray) + '\t' + str(pc) + '\t' + self.ists[(pc - self.START_PC) >> 2].mips + '\n'
+            else:
+                yield word + '\t' + str(pc) + '\t' + str(utils.sign_extend(w, 32)) + '\n'
+
     # Simulate Disassembly MIPS code
     def simulate(self):
         # Disassembly First
         disassembly_str = self.disassembly()
         # Simulate Then
-        simulation_str = ''
+        simulation_str = ''.join(self.simulation_records())
+        return disassembly_str, simulation_str
+
+    # Generate simulation records cycle by cycle, disassembly must be done first
+    def simulation_records(self):
+        for addr, instruction in self.simulation_steps():
+            # Record simulation string
+            yield self.get_simulation_record('Cycle:%d\t%d'%(self.cycle, addr), instruction)
+
+    # Simulate cycle by cycle, yield address and instruction of each cycle
+    def simulation_steps(self):
         while self.get_pc() != -1:
             # Fetch for a instruction
-            b_data_addr = self.START_DATA
+            addr = self.get_pc()
             instruction, o_str = self.fetch()
             # Execute instruction
             instruction.execute()
-            # Record simulation string
-            simulation_str += '--------------------\n' + o_str + '\t'
-            simulation_str += instruction.get_MIPS() + '\n\n'+ 'Registers\n' + 'R00:'
-            for i in range(16):
-                simulation_str += '\t' + str(self.get_reg_val(i))
-            simulation_str += '\nR16:'
-            for i in range(16, 32):
-                simulation_str += '\t' + str(self.get_reg_val(i))
-            simulation_str += '\n\nData'
-            for i in range(len(self.mems)):
-                if i%8 == 0:
-                    simulation_str += '\n' + str(b_data_addr + 4*i) + ':'
-                simulation_str += '\t' + str(self.get_mem_val(b_data_addr + 4*i))
-            simulation_str += '\n\n'
+            yield addr, instruction
+
+        print('! Simulation Finished...\n')
+
+    # Simulate Disassembly MIPS code with a fast functional engine,
+    # only the record of the last cycle is returned
+    def simulate_fast(self, engine='closure'):
+        disassembly_str = self.disassembly()
+        engine = FUNCTIONAL_ENGINES[engine](self)
+        engine.run()
+        simulation_str = ''
+        if engine.last_pc is not None:
+            I = self.ists[(engine.last_pc - self.START_PC) >> 2]
+            simulation_str = self.get_simulation_record('Cycle:%d\t%d'%(self.cycle, engine.last_pc), I)
 
         print('! Simulation Finished...\n')
         return disassembly_str, simulation_str
@@ -124,31 +239,62 @@ class program():
         # disassembly first
         disassembly_str = self.disassembly()
         # pipeline then
-        pipeline_str = ''
-        while not self.is_break_fetched:
-            # cycle infos
-            self.cycle += 1
-            pipeline_str += '--------------------\nCycle:%d\n\n'%(self.cycle)
-            # pipeline infos
-            fetched_ists, IF_str = self.IF()
-            issued_ists_idx = self.Issue()
-            executed = self.EXE()
-            written_back = self.WB()
-            self.update(fetched_ists, issued_ists_idx, executed, written_back)
-            pipeline_str += IF_str + self.get_pre_issue_infos() + self.get_buffer_queue_infos()
-            # register infos
-            pipeline_str += '\nRegisters\nR00:%s\nR08:%s\nR16:%s\nR24:%s\n\n' \
-                %(self.get_reg_infos(0,8), self.get_reg_infos(8,16), self.get_reg_infos(16,24), self.get_reg_infos(24,32)) 
-            # memory infos
-            b_data_addr = self.START_DATA
-            pipeline_str += 'Data'
-            for i in range(len(self.mems)):
-                if i%8 == 0:
-                    pipeline_str += '\n' + str(b_data_addr + 4*i) + ':'
-                pipeline_str += '\t' + str(self.get_mem_val(b_data_addr + 4*i))
-            pipeline_str += '\n'
+        pipeline_str = ''.join(self.pipeline_records())
         return disassembly_str, pipeline_str
 
+    # Generate pipeline records cycle by cycle, disassembly must be done first
+    def pipeline_records(self):
+        body = ''
+        for IF_str in self.pipeline_steps():
+            # fast-forwarded cycles only differ in the cycle number
+            if not self.is_skipped_cycle:
+                body = self.get_pipeline_body(IF_str)
+            yield self.get_pipeline_header() + body
+
+    # Pipeline cycle by cycle, yield the IF unit string of each cycle
+    def pipeline_steps(self):
+        while not self.is_break_fetched:
+            IF_str = self.step_pipeline()
+            yield IF_str
+            # cycles where only unit countdowns change
+            for i in range(self.idle_cycles):
+                self.skip_cycles(1)
+                yield IF_str
+            self.is_skipped_cycle = False
+
+    # Pipeline without output, return the cycle number
+    def run_pipeline(self):
+        while not self.is_break_fetched:
+            self.step_pipeline()
+            self.skip_cycles(self.idle_cycles)
+        self.is_skipped_cycle = False
+        return self.cycle
+
+    # Pipeline with fetch stalled until every fetched instruction is
+    # written back, return the cycle number
+    def drain_pipeline(self):
+        self.is_fetch_stalled = True
+        while not self.is_break_fetched and not self.is_pipeline_empty():
+            self.step_pipeline()
+            self.skip_cycles(self.idle_cycles)
+        self.is_fetch_stalled = False
+        self.is_skipped_cycle = False
+        return self.cycle
+
+    # Save the simulator state between two cycles to a checkpoint file
+    def save_checkpoint(self, path):
+        checkpoint.save(self, path)
+
+    # Restore the simulator state from a checkpoint file, the simulation /
+    # pipeline generators resume from the restored cycle
+    def load_checkpoint(self, path):
+        checkpoint.load(self, path)
+
+    # Debugger of the loaded program for the simulate or pipeline engine,
+    # see src.debugger
+    def debug(self, engine='simulate'):
+        return debugger.debugger(self, engine)
+
 ################################### Private Function ###################################
     # set pc value
     def set_pc(self, val):
@@ -172,63 +318,8 @@ class program():
     # Decode instructions stored in a word 
     def decode_ist(self, word):
         assert(len(word) == 32)
-        op = ist.OPCODE_TYPES[word[0:6]] if word[0:6] in ist.OPCODE_TYPES.keys() else 'SPECIAL'
-        fst = utils.b2i(word[6:11])
-        sec = utils.b2i(word[11:16])
-        imm_off = utils.signed_b2i(word[16:32])     # signed int  
-        
-        # Non-Special type
-        if op == 'J':
-            return ist.J(utils.b2i(word[6:32]), self)
-        elif op == 'BEQ':
-            return ist.BEQ(fst, sec, imm_off, self)
-        elif op == 'BGTZ':
-            return ist.BGTZ(fst, imm_off, self)
-        elif op == 'SW':
-            return ist.SW(fst, sec, imm_off, self)
-        elif op == 'LW':
-            return ist.LW(fst, sec, imm_off, self)
-        elif op == 'REGIMM':
-            return ist.BLTZ(fst, imm_off, self)
-        # Special type
-        else:
-            is_immidiate = (word[0] == '1')
-            fur = utils.b2i(word[21:26])
-            
-            if is_immidiate:
-                func = ist.SPECIAL_TYPES[word[0:6]] 
-                trd = imm_off
-            else:
-                func = ist.SPECIAL_TYPES[word[26:32]] 
-                trd = utils.b2i(word[16:21])
-
-            # Special 2 type
-            if op == 'SPECIAL2':
-                return ist.MUL(is_immidiate, fst, sec, trd, self)
-
-            if func == 'ADD' or func == 'ADDI':
-                return ist.ADD(is_immidiate, fst, sec, trd, self)
-            elif func == 'SUB' or func == 'SUBI':
-                return ist.SUB(is_immidiate, fst, sec, trd, self)
-            elif func == 'AND' or func == 'ANDI':
-                return ist.AND(is_immidiate, fst, sec, trd, self)
-            elif func == 'NOR' or func == 'NORI':
-                return ist.NOR(is_immidiate, fst, sec, trd, self)
-            elif func == 'SLT' or func =='SLTI':
-                return ist.SLT(is_immidiate, fst, sec, trd, self)
-            elif func == 'JR':
-                return ist.JR(fst, fur, self)
-            elif func == 'BREAK':
-                return ist.BREAK(utils.b2i(word[6:26]), self)
-            elif func == 'SLL':
-                return ist.NOP(self) if word[6:26] == '00000000000000000000' else ist.SLL(sec, trd, fur, self)
-            elif func == 'SRL':
-                return ist.SRL(sec, trd, fur, self)
-            elif func == 'SRA':
-                return ist.SRA(sec, trd, fur, self)
-            else:
-                print('No such instrucion opcode found !')
-                return None
+        return decoder.decode(utils.b2i(word), self)
+
     # pc + 4
     def next(self):
         self.set_pc(self.get_pc() + 4)
@@ -242,44 +333,94 @@ class program():
         return self.ists[idx], 'Cycle:%d\t%d'%(self.cycle, addr) 
 
     """ Used for pipeline of Proj2 """ 
+    # Run one pipeline cycle, return the IF unit string
+    def step_pipeline(self):
+        self.cycle += 1
+        if self.perf is not None:
+            self.perf.begin_cycle()
+        pc, waiting_ist = self.get_pc(), self.waiting_ist_IF
+        fetched_ists, IF_str = self.IF()
+        issued_ists_idx = self.Issue()
+        executed = self.EXE()
+        written_back = self.WB()
+        self.update(fetched_ists, issued_ists_idx, executed, written_back)
+
+        """ next event, if nothing but unit countdowns changed in this cycle the
+        following cycles repeat it until the first busy unit finishes """
+        self.idle_cycles = 0
+        if not (fetched_ists or issued_ists_idx or any(executed) or any(written_back)) \
+            and pc == self.get_pc() and waiting_ist is self.waiting_ist_IF:
+            busy = [c for c in self.unit_countdown if c > 0]
+            if busy:
+                self.idle_cycles = min(busy) - 1
+        if self.perf is not None:
+            self.perf.end_cycle(self, executed, len(issued_ists_idx))
+        return IF_str
+
+    # Fast-forward n idle cycles
+    def skip_cycles(self, n):
+        if n > 0:
+            self.cycle += n
+            self.unit_countdown = [max(c - n, 0) for c in self.unit_countdown]
+            self.idle_cycles -= n
+            self.is_skipped_cycle = True
+            if self.perf is not None:
+                self.perf.repeat_cycle(n)
+
     # stage 1 of Instruction Fetch
     def IF(self):
         # cycle += 1
-        ret_str = 'IF Unit:\n\tWaiting Instruction: \n\tExecuted Instruction: \n'
+        ret_str = formatter.IF_IDLE
         fetched_ists = []
+        is_fetching = not self.is_fetch_stalled
+        self.speculative_fetched = 0
 
         """ check branch waiting stalling of IF """
         if self.is_branch_waiting():
-            tmp = self.waiting_ist_IF.get_MIPS()
+            tmp = self.waiting_ist_IF.mips
             # check branch is ready to execute
             if self.is_branch_ready(self.waiting_ist_IF):
-                self.waiting_ist_IF.execute()
-                self.waiting_ist_IF = None
-                ret_str = 'IF Unit:\n\tWaiting Instruction: \n\tExecuted Instruction: %s\n'%tmp
+                self.resolve_branch_IF()
+                ret_str = formatter.IF_EXECUTED%tmp
+                is_fetching = False
             else: 
-                ret_str = 'IF Unit:\n\tWaiting Instruction: %s\n\tExecuted Instruction: \n'%tmp
+                ret_str = formatter.IF_WAITING%tmp
+                # fetch goes on past a predicted branch
+                is_fetching = is_fetching and self.predicted_pc is not None
+                if self.perf is not None and not is_fetching:
+                    self.perf.IF_waiting()
 
-        else:        
+        if is_fetching:
             """ check structural hazards """
-            buffer_empty = 4 - len(self.buffer_PRE_ISSUE)
-            assert(buffer_empty >= 0 and buffer_empty <= 4)
+            buffer_empty = self.config.pre_issue_size - len(self.buffer_PRE_ISSUE)
+            assert(buffer_empty >= 0 and buffer_empty <= self.config.pre_issue_size)
             # no empty slot in pre-issue buffer
             if buffer_empty != 0:
                 """ IF operation """
-                iterations = 1 if buffer_empty == 1 else 2
+                iterations = min(buffer_empty, self.config.fetch_width)
                 for i in range(iterations):
                     I = self.fetch_v2()
-                    if I.name == 'NOP' or I.name == 'BREAK':
+                    if self.predicted_pc is not None:
+                        # speculative fetch stops at instructions executed in IF
+                        if I.unit > ist.UNIT_MEM:
+                            break
+                        fetched_ists.append(I)
+                        self.speculative_fetched += 1
+                        self.next()
+                    elif I.name == 'NOP' or I.name == 'BREAK':
                         I.execute()
-                        ret_str = 'IF Unit:\n\tWaiting Instruction: \n\tExecuted Instruction: %s\n'%(I.name)
+                        self.ist_count += 1
+                        ret_str = formatter.IF_EXECUTED%(I.name)
                         if I.name == 'BREAK':
                             self.is_break_fetched = True
                     elif I.name == 'J' or I.name == 'JR' or I.name == 'BEQ' or I.name == 'BLTZ' or I.name == 'BGTZ':
-                        ret_str = self.exec_branch_IF(I)
+                        ret_str = self.exec_branch_IF(I, fetched_ists if self.config.fetch_hazards else ())
                     else:
                         # write non-Branch/NOP/BREAK instruction to pre-issue buffer
                         fetched_ists.append(I)
                         self.next()
+            elif self.perf is not None:
+                self.perf.IF_full()
 
         return fetched_ists, ret_str
           
@@ -288,50 +429,51 @@ class program():
         issue_list = []
         """ decide which entries to issue """
         if len(self.buffer_PRE_ISSUE) != 0:            
-            earlier_not_issued_ists_sregs = []
-            earlier_not_issued_ists_dregs = []
+            # register masks of earlier not issued instructions
+            earlier_not_issued_ists_smask = 0
+            earlier_not_issued_ists_dmask = 0
             has_earlier_not_issued_sw = False
-
-            PRE_ALU_size = len(self.queue_PRE_ALU)
-            PRE_ALUB_size = len(self.queue_PRE_ALUB)
-            PRE_MEM_size = len(self.queue_PRE_MEM)
-            for idx, I in enumerate(self.buffer_PRE_ISSUE):
-                # cannot issue more than two instruction per cycle
-                if len(issue_list) > 2:
+            unready_mask = self.unready_mask
+            # operands of issued instructions and of stores, read at write back
+            read_hazards = self.config.read_hazards
+            unread_mask = self.get_unread_mask() if read_hazards else 0
+
+            # PRE-ALU / PRE-ALUB / PRE-MEM sizes indexed by unit
+            PRE_sizes = [len(self.queue_PRE_ALU), len(self.queue_PRE_ALUB), len(self.queue_PRE_MEM)]
+            queue_sizes, issue_width = self.config.queue_sizes, self.config.issue_width
+            # speculative entries do not issue
+            buffer = self.buffer_PRE_ISSUE
+            if self.speculative_count:
+                buffer = buffer[:-self.speculative_count]
+            for idx, I in enumerate(buffer):
+                # cannot issue more than issue_width instructions per cycle
+                if len(issue_list) >= issue_width:
+                    if self.perf is not None:
+                        self.perf.issue_width()
                     break
-                # structural hazards
-                PRE_ALU_not_empty = I.name in ist.ALU_ISTS and PRE_ALU_size == 2        # PRE-ALU not empty
-                PRE_ALUB_not_empty = I.name in ist.ALUB_ISTS and PRE_ALUB_size == 2     # PRE-ALUB not empty
-                PRE_MEM_not_empty = I.name in ist.MEM_ISTS and PRE_MEM_size == 2        # PRE-MEM not empty
-                #print(PRE_ALU_not_empty, PRE_ALUB_not_empty, PRE_MEM_not_empty)
+                # structural hazards, PRE queue of the unit not empty
+                PRE_not_empty = PRE_sizes[I.unit] == queue_sizes[I.unit]
                 # data hazards
-                WAR = utils.list_intersection(I.dregs, earlier_not_issued_ists_sregs)   # WAR hazards
-                RAW = utils.list_intersection(I.sregs,                                  # RAW hazards
-                    utils.list_union(self.get_unready_regs(), earlier_not_issued_ists_dregs))                                         
-                WAW = utils.list_intersection(I.dregs,                                  # WAW hazards   
-                    utils.list_union(self.get_unready_regs(), earlier_not_issued_ists_dregs))                                              
-                #print(WAR, RAW, WAW)
+                busy_mask = unready_mask | earlier_not_issued_ists_dmask
+                WAR = I.dmask & (earlier_not_issued_ists_smask | unread_mask)  # WAR hazards
+                RAW = I.smask & busy_mask                           # RAW hazards
+                WAW = I.dmask & busy_mask                           # WAW hazards
     
                 # mem hazards, stores must in order and load should issued after stores
-                mem_not_in_order = I.name in ist.MEM_ISTS and has_earlier_not_issued_sw
-                #print(mem_not_in_order)
-                if I.name != 'SW':
-                    earlier_not_issued_ists_sregs = utils.list_union(earlier_not_issued_ists_sregs, I.sregs)
-                earlier_not_issued_ists_dregs = utils.list_union(earlier_not_issued_ists_dregs, I.dregs)
+                mem_not_in_order = I.unit == ist.UNIT_MEM and has_earlier_not_issued_sw
+                if I.name != 'SW' or read_hazards:
+                    earlier_not_issued_ists_smask |= I.smask
+                earlier_not_issued_ists_dmask |= I.dmask
                 # cannot issue cases
-                if PRE_ALU_not_empty or PRE_ALUB_not_empty or PRE_MEM_not_empty \
-                    or RAW != [] or WAR != [] or WAW != [] or mem_not_in_order:
+                if PRE_not_empty or RAW or WAR or WAW or mem_not_in_order:
                     if I.name == 'SW':
                         has_earlier_not_issued_sw = True
+                    if self.perf is not None:
+                        self.perf.issue_blocked(I.unit if PRE_not_empty else None, RAW, WAR, WAW, mem_not_in_order)
                 # can issue
                 else:
                     issue_list.append(idx)
-                    if I.name in ist.ALU_ISTS:
-                        PRE_ALU_size += 1
-                    elif I.name in ist.ALUB_ISTS:
-                        PRE_ALUB_size += 1
-                    else:
-                        PRE_MEM_size += 1
+                    PRE_sizes[I.unit] += 1
         return issue_list
     
     # stage 3 of Execution of ALU / ALUB / MEM
@@ -340,153 +482,221 @@ class program():
     
     def ALU(self):
         """ ALU operation """
-        return self.queue_PRE_ALU != []
+        return self.exec_unit(ist.UNIT_ALU, self.queue_PRE_ALU)
 
     def ALUB(self):
         """ ALUB operation """
-        assert(self.ALUB_state == -1 or self.ALUB_state == 0 or self.ALUB_state == 1)
-        if self.ALUB_state == 1:
-            if self.queue_PRE_ALUB != []:
-                self.ALUB_state = 0
-            return False
-        else:
-            self.ALUB_state = 1
-            return True
+        return self.exec_unit(ist.UNIT_ALUB, self.queue_PRE_ALUB)
 
     def MEM(self):
-        return self.queue_PRE_MEM != []
+        return self.exec_unit(ist.UNIT_MEM, self.queue_PRE_MEM, self.get_mem_latency if self.dcache is not None else None)
+
+    # Count down the instances of the unit, available instances start the next
+    # entries of its PRE queue, return the number of executing instructions
+    # which finish in this cycle. Instances of a unit have the same latency,
+    # so the executing instructions are the first entries of the queue and
+    # finish in queue order. latency(I) gives the cycles of I if they vary,
+    # an instruction then takes at least the remaining cycles of the ones
+    # started before it to keep the queue order
+    def exec_unit(self, unit, queue, latency=None):
+        countdown = self.unit_countdown
+        slots = self.UNIT_SLOTS[unit]
+        if len(slots) == 1:
+            s = slots.start
+            c = countdown[s]
+            if c == 0:
+                if not queue:
+                    return 0
+                c = self.UNIT_LATENCY[unit] if latency is None else latency(queue[0])
+            c -= 1
+            countdown[s] = c
+            return 1 if c == 0 else 0
+        executing = 0
+        remaining = 0
+        for s in slots:
+            if countdown[s] > 0:
+                executing += 1
+                remaining = max(remaining, countdown[s])
+        finished = 0
+        for s in slots:
+            c = countdown[s]
+            if c == 0:
+                if executing >= len(queue):
+                    continue
+                if latency is None:
+                    c = self.UNIT_LATENCY[unit]
+                else:
+                    c = remaining = max(latency(queue[executing]), remaining)
+                executing += 1
+            c -= 1
+            countdown[s] = c
+            if c == 0:
+                finished += 1
+        return finished
     
+    # MEM cycles of a LW / SW, with the data cache
+    def get_mem_latency(self, I):
+        addr = self.get_reg_val(I.base) + I.offset
+        return self.UNIT_LATENCY[ist.UNIT_MEM] + self.dcache.access(addr, I.name == 'SW', I.pc)
+
     # stage 4 of Write Back
     def WB(self):    
-        return self.buffer_POST_ALU is not None, self.buffer_POST_ALUB is not None, self.buffer_POST_MEM is not None
+        return len(self.buffer_POST_ALU), len(self.buffer_POST_ALUB), len(self.buffer_POST_MEM)
 
     def update(self, fetched_ists, issued_ists_idx, executed, written_back):
         # issue
+        PRE_queues = (self.queue_PRE_ALU, self.queue_PRE_ALUB, self.queue_PRE_MEM)
         for i in range(len(issued_ists_idx)):
             idx = issued_ists_idx[i] - i
             I = self.buffer_PRE_ISSUE[idx]
             # enqueue pre-ALU / pre-ALUB / pre-MEM
-            if I.name in ist.ALU_ISTS:
-                self.queue_PRE_ALU.append(I)
-            elif I.name in ist.ALUB_ISTS:
-                self.queue_PRE_ALUB.append(I)
-            else:
-                self.queue_PRE_MEM.append(I)
+            PRE_queues[I.unit].append(I)
+            # destination registers are not ready until written back
+            self.unready_mask |= I.dmask
             # dequeue pre-issue 
             self.buffer_PRE_ISSUE.pop(idx)
         # IF
         for i in fetched_ists:
             # add pre-issue
             self.buffer_PRE_ISSUE.append(i) 
+        # speculative entries of a correctly predicted branch issue from
+        # the next cycle
+        if self.waiting_ist_IF is None:
+            self.speculative_count = 0
+        else:
+            self.speculative_count += self.speculative_fetched
         # WB
-        if written_back[0]:
-            self.buffer_POST_ALU.WB()
-            self.buffer_POST_ALU = None
-        if written_back[1]:
-            self.buffer_POST_ALUB.WB()
-            self.buffer_POST_ALUB = None
-        if written_back[2]:
-            self.buffer_POST_MEM.WB()
-            self.buffer_POST_MEM = None  
+        POST_buffers = (self.buffer_POST_ALU, self.buffer_POST_ALUB, self.buffer_POST_MEM)
+        for u in range(3):
+            if written_back[u]:
+                buffer = POST_buffers[u]
+                for I in buffer:
+                    I.WB()
+                    self.unready_mask &= ~I.dmask
+                self.ist_count += len(buffer)
+                buffer.clear()
         # execute
-        if executed[0]:
-            self.buffer_POST_ALU = self.queue_PRE_ALU.pop(0)
-        if executed[1]:
-            self.buffer_POST_ALUB = self.queue_PRE_ALUB.pop(0)
-        if executed[2]:
-            I = self.queue_PRE_MEM.pop(0)
-            if I.name == 'SW':
-                I.WB()
-                self.buffer_POST_MEM = None  
-            else:
-                self.buffer_POST_MEM = I
+        for u in range(3):
+            if not executed[u]:
+                continue
+            buffer = POST_buffers[u]
+            for i in range(executed[u]):
+                I = PRE_queues[u].pop(0)
+                # stores write memory when they finish, unless an older load
+                # finishing in this cycle has not read it yet
+                if I.name == 'SW' and not buffer:
+                    I.WB()
+                    self.ist_count += 1
+                else:
+                    buffer.append(I)
         
     def fetch_v2(self):
         addr = self.get_pc()
         idx = int((addr - self.START_PC) / 4) % len(self.ists)
         return self.ists[idx]
 
+    # no instruction in any buffer / queue or waiting in IF
+    def is_pipeline_empty(self):
+        return self.waiting_ist_IF is None and not self.buffer_PRE_ISSUE \
+            and not self.queue_PRE_ALU and not self.queue_PRE_ALUB and not self.queue_PRE_MEM \
+            and not self.buffer_POST_ALU and not self.buffer_POST_ALUB and not self.buffer_POST_MEM
+
+    # source registers of the issued instructions not written back
+    def get_unread_mask(self):
+        mask = 0
+        for l in (self.queue_PRE_ALU, self.queue_PRE_ALUB, self.queue_PRE_MEM,
+            self.buffer_POST_ALU, self.buffer_POST_ALUB, self.buffer_POST_MEM):
+            for E in l:
+                mask |= E.smask
+        return mask
+
     def is_branch_waiting(self):
         return self.waiting_ist_IF is not None
 
-    def is_branch_ready(self, I):
+    # fetched_ists are the instructions fetched before I in this cycle
+    def is_branch_ready(self, I, fetched_ists=()):
         if I.name == 'J': 
             return True
-        tmp = self.get_unready_regs()
-        for i in range(len(self.buffer_PRE_ISSUE)):
-            tmp = utils.list_union(self.buffer_PRE_ISSUE[i].dregs, tmp)
-
-        return utils.list_intersection(I.sregs, tmp) == []
-
-    def exec_branch_IF(self, I):
-        tmp = I.get_MIPS()
+        mask = self.unready_mask
+        for E in fetched_ists:
+            mask |= E.dmask
+        # speculative entries are younger than the branch
+        buffer = self.buffer_PRE_ISSUE
+        if self.speculative_count:
+            buffer = buffer[:-self.speculative_count]
+        for E in buffer:
+            mask |= E.dmask
+        return I.smask & mask == 0
+
+    def exec_branch_IF(self, I, fetched_ists=()):
+        tmp = I.mips
+        pc = self.get_pc()
+        predicted = None
+        if self.predictor is not None and I.name != 'J':
+            predicted = self.predictor.predict(pc, I)
         # check branch is ready to execute
-        if self.is_branch_ready(I):
+        if self.is_branch_ready(I, fetched_ists):
             I.execute()
-            return 'IF Unit:\n\tWaiting Instruction: \n\tExecuted Instruction: %s\n'%tmp
+            self.ist_count += 1
+            if self.predictor is not None and I.name != 'J':
+                self.predictor.resolve(pc, I, predicted, self.get_pc())
+            return formatter.IF_EXECUTED%tmp
         else:
             self.waiting_ist_IF = I
-            return 'IF Unit:\n\tWaiting Instruction: %s\n\tExecuted Instruction: \n'%tmp
-
-    def get_unready_regs(self):
-        ret = set()
-        if self.buffer_POST_ALU:
-            ret |= set(self.buffer_POST_ALU.dregs)
-        if self.buffer_POST_ALUB:
-            ret |= set(self.buffer_POST_ALUB.dregs) 
-        if self.buffer_POST_MEM:
-            ret |= set(self.buffer_POST_MEM.dregs) 
-        
-        for i in self.queue_PRE_ALU:
-            ret = ret | set(i.dregs)
-        for i in self.queue_PRE_ALUB:
-            ret = ret | set(i.dregs)
-        for i in self.queue_PRE_MEM:
-            ret = ret | set(i.dregs)
-
-        return list(ret)
-
-    def get_queue_buffer_info(self, obj, obj_max_size):
-        ret_str = ''  
-        assert(obj != [])
-        for idx, I in enumerate(obj):
-            ret_str += '\tEntry %d:[%s]\n'%(idx, I.get_MIPS())
-        for i in range(obj_max_size - len(obj)):
-            ret_str += '\tEntry %d:\n'%(i+len(obj))
-        return ret_str
+            self.branch_pc = pc
+            # fetch from the predicted pc until the branch executes
+            if predicted is not None:
+                self.predicted_pc = predicted
+                self.predictor.speculated += 1
+                self.set_pc(predicted)
+            return formatter.IF_WAITING%tmp
+
+    # Execute the waiting branch, keep the speculative entries if it was
+    # predicted correctly, flush them otherwise
+    def resolve_branch_IF(self):
+        I, pc = self.waiting_ist_IF, self.get_pc()
+        self.set_pc(self.branch_pc)
+        I.execute()
+        self.ist_count += 1
+        self.waiting_ist_IF = None
+        if self.predictor is not None and I.name != 'J':
+            self.predictor.resolve(self.branch_pc, I, self.predicted_pc, self.get_pc())
+        if self.predicted_pc is not None:
+            if self.get_pc() == self.predicted_pc:
+                self.set_pc(pc)
+            else:
+                n = self.speculative_count
+                if n:
+                    del self.buffer_PRE_ISSUE[-n:]
+                self.speculative_count = 0
+                self.predictor.flush(n)
+            self.predicted_pc = None
+
+    """ Record formatting, see src.formatter """
+    def get_simulation_record(self, o_str, I):
+        return self.formatter.simulation_record(o_str, I)
+
+    def get_pipeline_record(self, IF_str):
+        return self.get_pipeline_header() + self.get_pipeline_body(IF_str)
+
+    def get_pipeline_header(self):
+        return self.formatter.pipeline_header()
+
+    def get_pipeline_body(self, IF_str):
+        return self.formatter.pipeline_body(IF_str)
+
+    # IF unit, buffers and queues of a pipeline record
+    def get_pipeline_infos(self, IF_str):
+        return self.formatter.pipeline_infos(IF_str)
+
+    # Data region rows of 8 words
+    def get_mem_infos(self):
+        return self.formatter.data_rows()
+
+    # (start address, words) runs of the Data region: from START_DATA up to
+    # the highest written word, without the pages never written
+    def get_data_runs(self):
+        return [(addr, self.mems.read_range(addr, n)) for addr, n in self.mems.data_runs(self.START_DATA)]
 
     def get_reg_infos(self, begin, end):
-        ret = ''
-        for i in range(begin, end):
-            ret += '\t' + str(self.get_reg_val(i))
-        return ret
-
-    def get_pre_issue_infos(self):
-        ret_str = '\tEntry 0:\n\tEntry 1:\n\tEntry 2:\n\tEntry 3:\n' \
-            if len(self.buffer_PRE_ISSUE) == 0 else self.get_queue_buffer_info(self.buffer_PRE_ISSUE, 4)
-        return 'Pre-Issue Buffer:\n' + ret_str
-            
-    def get_buffer_queue_infos(self):  
-        # pre-ALU 
-        tmp = '\tEntry 0:\n\tEntry 1:\n' if len(self.queue_PRE_ALU) == 0 \
-            else self.get_queue_buffer_info(self.queue_PRE_ALU, 2)
-        ret_str = 'Pre-ALU Queue:\n' + tmp
-        # Post-ALU 
-        ret_str += 'Post-ALU Buffer:%s\n'%('['+self.buffer_POST_ALU.get_MIPS()+']' \
-            if self.buffer_POST_ALU is not None else '')
-        # pre-ALUB
-        tmp = '\tEntry 0:\n\tEntry 1:\n' if len(self.queue_PRE_ALUB) == 0 \
-            else self.get_queue_buffer_info(self.queue_PRE_ALUB, 2)
-        ret_str += 'Pre-ALUB Queue:\n' + tmp
-        # Post-ALUB 
-        ret_str += 'Post-ALUB Buffer:%s\n'%('['+self.buffer_POST_ALUB.get_MIPS()+']' \
-            if self.buffer_POST_ALUB is not None else '')
-        # pre-MEM 
-        tmp = '\tEntry 0:\n\tEntry 1:\n' if len(self.queue_PRE_MEM) == 0 \
-            else self.get_queue_buffer_info(self.queue_PRE_MEM, 2)
-        ret_str += 'Pre-MEM Queue:\n' + tmp
-        # Post-MEM 
-        ret_str += 'Post-MEM Buffer:%s\n'%('['+self.buffer_POST_MEM.get_MIPS()+']' \
-            if self.buffer_POST_MEM is not None else '')
-        
-        return ret_str
+        return formatter.format_values(self.regs[begin:end])
@@ -0,0 +1,152 @@
+"""
+Paged memory model
+
+Word-addressed memory of a 32-bit (4 GiB) address space, made of fixed-size
+pages backed by array('i') which are allocated on first touch. Values
+which are not 32-bit ints (e.g. python bool from SLT, or ints beyond 32
+bits since registers are not wrapped) are kept exactly in a spill dict.
+The Data dump only covers the pages which were written, so a store far
+away from the Data region adds one row instead of every word in between.
+"""
+from array import array
+
+PAGE_BITS = 12                      # 4 KiB pages
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_WORDS = PAGE_SIZE >> 2
+WORD_MASK = PAGE_WORDS - 1
+MEMORY_SIZE = 1 << 32
+
+INT32_MIN = -(1 << 31)
+INT32_MAX = (1 << 31) - 1
+
+ZERO_PAGE = bytes(PAGE_SIZE)
+
+class paged_memory():
+    def __init__(self):
+        self.pages = {}             # page number => array('i')
+        self.spill = {}             # address => value not fitting in int32
+        self.high = -1              # highest written address
+
+    def check(self, addr):
+        if addr & 3 or addr < 0 or addr >= MEMORY_SIZE:
+            raise IndexError('Invalid word address %d'%addr)
+
+    # page of the address, allocated on first touch
+    def get_page(self, addr):
+        page = self.pages.get(addr >> PAGE_BITS)
+        if page is None:
+            self.check(addr)
+            page = self.pages[addr >> PAGE_BITS] = array('i', ZERO_PAGE)
+        return page
+
+    # Untouched words read as 0
+    def __getitem__(self, addr):
+        if addr & 3:
+            self.check(addr)
+        if self.spill and addr in self.spill:
+            return self.spill[addr]
+        page = self.pages.get(addr >> PAGE_BITS)
+        if page is None:
+            self.check(addr)
+            return 0
+        return page[(addr >> 2) & WORD_MASK]
+
+    def __setitem__(self, addr, val):
+        if addr & 3:
+            self.check(addr)
+        page = self.pages.get(addr >> PAGE_BITS) or self.get_page(addr)
+        if type(val) is int and INT32_MIN <= val <= INT32_MAX:
+            page[(addr >> 2) & WORD_MASK] = val
+            if self.spill:
+                self.spill.pop(addr, None)
+        else:
+            page[(addr >> 2) & WORD_MASK] = 0
+            self.spill[addr] = val
+        if addr > self.high:
+            self.high = addr
+
+    # Bulk initialization of consecutive words from addr
+    def load_words(self, addr, values):
+        values = array('i', values)
+        self.load_array(addr, values)
+
+    # Bulk initialization from raw 32-bit words, byte-swapped if
+    # `swap` (the buffer endianness differs from the host)
+    def load_bytes(self, addr, buf, swap=False):
+        values = array('i')
+        values.frombytes(buf)
+        if swap:
+            values.byteswap()
+        self.load_array(addr, values)
+
+    def load_array(self, addr, values):
+        self.check(addr)
+        n = len(values)
+        if n == 0:
+            return
+        self.check(addr + 4*(n-1))
+        i = 0
+        while i < n:
+            page = self.get_page(addr)
+            off = (addr >> 2) & WORD_MASK
+            k = min(PAGE_WORDS - off, n - i)
+            page[off:off+k] = values[i:i+k]
+            if self.spill:
+                for a in range(addr, addr + 4*k, 4):
+                    self.spill.pop(a, None)
+            addr += 4*k
+            i += k
+        self.high = max(self.high, addr - 4)
+
+    # n consecutive words from addr as a list
+    def read_range(self, addr, n):
+        ret = []
+        end = addr + 4*n
+        while addr < end:
+            off = (addr >> 2) & WORD_MASK
+            k = min(PAGE_WORDS - off, (end - addr) >> 2)
+            page = self.pages.get(addr >> PAGE_BITS)
+            if page is None:
+                self.check(addr)
+                ret += [0] * k
+            else:
+                ret += page[off:off+k].tolist()
+            addr += 4*k
+        if self.spill:
+            begin = end - 4*n
+            for a, v in self.spill.items():
+                if begin <= a < end:
+                    ret[(a - begin) >> 2] = v
+        return ret
+
+    # Number of words from addr up to the highest written word
+    def data_words(self, addr):
+        return max((self.high - addr) // 4 + 1, 0)
+
+    # Runs (start, word number) of the words from addr up to the highest
+    # written word which lie on written pages, untouched pages in between
+    # are left out. Runs start on rows of `row` words from addr and end on
+    # them, but at the highest written word.
+    def data_runs(self, addr, row=8):
+        if self.high < addr:
+            return []
+        first, last = addr >> PAGE_BITS, self.high >> PAGE_BITS
+        end = self.high + 4
+        if len(self.pages) >= last - first + 1 and all(n in self.pages for n in range(first, last + 1)):
+            return [(addr, (end - addr) >> 2)]
+        row_bytes = 4 * row
+        runs = []
+        for n in sorted(n for n in self.pages if first <= n <= last):
+            a = max(addr, n << PAGE_BITS)
+            b = min(end, (n + 1) << PAGE_BITS)
+            a = addr + (a - addr) // row_bytes * row_bytes
+            b = min(addr + -(-(b - addr) // row_bytes) * row_bytes, end)
+            if runs and a <= runs[-1][1]:
+                runs[-1][1] = max(runs[-1][1], b)
+            else:
+                runs.append([a, b])
+        return [(a, (b - a) >> 2) for a, b in runs]
+
+    # Allocated bytes of page storage
+    def allocated(self):
+        return len(self.pages) * PAGE_SIZE
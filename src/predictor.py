@@ -0,0 +1,182 @@
+"""
+Branch predictors of the IF stage
+
+A predictor gives the next pc of a conditional branch / JR when it is
+fetched. If the branch cannot execute yet, IF fetches on from the predicted
+pc: the instructions fetched after the branch stay at the end of the
+pre-issue buffer and do not issue until the branch executes, and are
+flushed if the prediction was wrong. J always executes when fetched and is
+not predicted.
+    static  : conditional branches not taken, no JR prediction
+    bimodal : 2-bit saturating counters indexed by pc, no JR prediction
+    btb     : branch target buffer of (pc, target, 2-bit counter) entries,
+              also predicts JR targets
+"""
+
+# 2-bit counter states, taken from WEAKLY_TAKEN
+WEAKLY_NOT_TAKEN = 1
+WEAKLY_TAKEN = 2
+STRONGLY_TAKEN = 3
+
+def taken_target(pc, I):
+    return (I.offset<<2) + pc + 4
+
+def count(counter, is_taken):
+    return min(counter + 1, STRONGLY_TAKEN) if is_taken else max(counter - 1, 0)
+
+"""
+Base predictor, collects the prediction statistics
+"""
+class branch_predictor():
+    name = None
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.reset()
+
+    def reset(self):
+        self.branches = 0           # executed conditional branches / JR
+        self.predicted = 0          # branches with a predicted pc
+        self.correct = 0
+        self.speculated = 0         # branches IF fetched past before they executed
+        self.flushes = 0
+        self.flushed = 0            # flushed pre-issue entries
+
+    # predicted next pc of branch I at pc, None if not predicted
+    def predict(self, pc, I):
+        raise NotImplementedError
+
+    # learn the next pc npc of branch I at pc
+    def train(self, pc, I, npc):
+        raise NotImplementedError
+
+    # branch I at pc executed with next pc npc, predicted is the pc given by
+    # predict() when it was fetched
+    def resolve(self, pc, I, predicted, npc):
+        self.branches += 1
+        if predicted is not None:
+            self.predicted += 1
+            if predicted == npc:
+                self.correct += 1
+        self.train(pc, I, npc)
+
+    def flush(self, n):
+        self.flushes += 1
+        self.flushed += n
+
+    def report(self):
+        return {
+            'predictor': self.name,
+            'entries': self.entries,
+            'branches': self.branches,
+            'predicted': self.predicted,
+            'correct': self.correct,
+            'accuracy': self.correct / self.predicted if self.predicted else None,
+            'speculated': self.speculated,
+            'flushes': self.flushes,
+            'flushed_instructions': self.flushed,
+        }
+
+    """ Checkpoint state, tables and statistics as JSON values """
+    def get_state(self):
+        return {'stats': [self.branches, self.predicted, self.correct, self.speculated, self.flushes, self.flushed],
+            'table': self.get_table()}
+
+    def set_state(self, state):
+        self.branches, self.predicted, self.correct, self.speculated, self.flushes, self.flushed = state['stats']
+        self.set_table(state['table'])
+
+    def get_table(self):
+        return None
+
+    def set_table(self, table):
+        pass
+
+"""
+Static not taken
+"""
+class static_predictor(branch_predictor):
+    name = 'static'
+
+    def predict(self, pc, I):
+        return None if I.name == 'JR' else pc + 4
+
+    def train(self, pc, I, npc):
+        pass
+
+"""
+Bimodal, one 2-bit counter per pc modulo entries
+"""
+class bimodal_predictor(branch_predictor):
+    name = 'bimodal'
+
+    def reset(self):
+        branch_predictor.reset(self)
+        self.counters = [WEAKLY_NOT_TAKEN] * self.entries
+
+    def predict(self, pc, I):
+        if I.name == 'JR':
+            return None
+        if self.counters[(pc >> 2) % self.entries] >= WEAKLY_TAKEN:
+            return taken_target(pc, I)
+        return pc + 4
+
+    def train(self, pc, I, npc):
+        if I.name != 'JR':
+            idx = (pc >> 2) % self.entries
+            self.counters[idx] = count(self.counters[idx], npc != pc + 4)
+
+    def get_table(self):
+        return self.counters
+
+    def set_table(self, table):
+        self.counters = list(table)
+
+"""
+Branch target buffer, direct mapped by pc modulo entries. A branch enters
+it when taken, a hit predicts the stored target while its counter is taken,
+a miss predicts not taken (and nothing for JR)
+"""
+class btb_predictor(branch_predictor):
+    name = 'btb'
+
+    def reset(self):
+        branch_predictor.reset(self)
+        self.table = [None] * self.entries       # [pc, target, counter] or None
+
+    def predict(self, pc, I):
+        entry = self.table[(pc >> 2) % self.entries]
+        if entry is not None and entry[0] == pc:
+            if I.name == 'JR' or entry[2] >= WEAKLY_TAKEN:
+                return entry[1]
+            return pc + 4
+        return None if I.name == 'JR' else pc + 4
+
+    def train(self, pc, I, npc):
+        idx = (pc >> 2) % self.entries
+        entry = self.table[idx]
+        is_taken = I.name == 'JR' or npc != pc + 4
+        if entry is not None and entry[0] == pc:
+            entry[2] = count(entry[2], is_taken)
+            if is_taken:
+                entry[1] = npc
+        elif is_taken:
+            self.table[idx] = [pc, npc, WEAKLY_TAKEN]
+
+    def get_table(self):
+        return self.table
+
+    def set_table(self, table):
+        self.table = [None if e is None else list(e) for e in table]
+
+PREDICTORS = {
+    'static': static_predictor,
+    'bimodal': bimodal_predictor,
+    'btb': btb_predictor,
+}
+
+# Predictor of a pipeline config, None without prediction
+def make(config):
+    if config.predictor == 'none':
+        return None
+    return PREDICTORS[config.predictor](config.predictor_entries)
@@ -0,0 +1,141 @@
+"""
+Host-side profiler of the simulator
+
+Measures wall time and call counts of the simulator's own hot paths: the
+pipeline stages, the record formatting functions and execute / WB of every
+instruction class. Methods are wrapped on the program / instruction
+instances only while a profiler is attached, so a detached (or never
+attached) program runs its plain methods at no cost.
+
+Results are a flame-graph compatible collapsed-stack file (one line per
+call stack, self time in microseconds) and a summary table.
+"""
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+import src.main as main
+
+# pipeline stages, and the functional fetch
+STAGE_METHODS = ['step_pipeline', 'IF', 'Issue', 'EXE', 'WB', 'update', 'skip_cycles', 'fetch']
+# record formatting of program.formatter, data_rows is the Data dump
+FORMAT_METHODS = ['simulation_record', 'pipeline_body', 'pipeline_infos', 'data_rows']
+# instruction methods, reported as <class>.<method>
+IST_METHODS = ['execute', 'WB']
+
+class profiler():
+    def __init__(self):
+        self.stats = {}         # collapsed stack => [calls, total time, self time]
+        self.keys = []          # stacks of running wrapped calls
+        self.children = []      # time spent in wrapped callees of running calls
+        self.wrapped = []       # (object, method name) wrapped on the instance
+
+    # Wrap the stage / formatting methods of a loaded program and the
+    # methods of its instructions
+    def attach(self, program):
+        for name in STAGE_METHODS:
+            self.wrap(program, name, name)
+        for name in FORMAT_METHODS:
+            self.wrap(program.formatter, name, name)
+        for I in program.ists:
+            for name in IST_METHODS:
+                if hasattr(I, name):
+                    self.wrap(I, name, type(I).__name__ + '.' + name)
+        return self
+
+    # Restore the plain methods
+    def detach(self):
+        for obj, name in self.wrapped:
+            del obj.__dict__[name]
+        self.wrapped = []
+
+    def wrap(self, obj, name, frame):
+        fn = getattr(obj, name)
+        stats, keys, children, clock = self.stats, self.keys, self.children, time.perf_counter
+        def wrapper(*args, **kwargs):
+            key = keys[-1] + ';' + frame if keys else frame
+            keys.append(key)
+            children.append(0.0)
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                keys.pop()
+                child = children.pop()
+                if children:
+                    children[-1] += elapsed
+                s = stats.get(key)
+                if s is None:
+                    s = stats[key] = [0, 0.0, 0.0]
+                s[0] += 1
+                s[1] += elapsed
+                s[2] += elapsed - child
+        obj.__dict__[name] = wrapper
+        self.wrapped.append((obj, name))
+
+    def reset(self):
+        self.stats.clear()
+
+    ################################### Reports ###################################
+    # Collapsed stacks 'frame;frame;... self-microseconds', for flamegraph.pl
+    # or speedscope
+    def collapsed(self):
+        return ''.join('%s %d\n'%(key, round(s[2] * 1e6)) for key, s in sorted(self.stats.items()))
+
+    def write_collapsed(self, path):
+        with open(path, 'w') as f:
+            f.write(self.collapsed())
+
+    # frame => [calls, total time, self time], summed over call stacks
+    def frames(self):
+        ret = {}
+        for key, s in self.stats.items():
+            frame = key.rsplit(';', 1)[-1]
+            f = ret.setdefault(frame, [0, 0.0, 0.0])
+            for i in range(3):
+                f[i] += s[i]
+        return ret
+
+    def format_summary(self):
+        frames = self.frames()
+        total = sum(f[2] for f in frames.values()) or 1.0
+        width = max([len('Frame')] + [len(k) for k in frames])
+        row = '%-' + str(width) + 's  %10s  %12s  %12s  %7s  %10s\n'
+        ret = row%('Frame', 'Calls', 'Total(ms)', 'Self(ms)', 'Self%', 'Avg(us)')
+        for frame, f in sorted(frames.items(), key=lambda item: -item[1][2]):
+            ret += row%(frame, f[0], '%.3f'%(f[1] * 1e3), '%.3f'%(f[2] * 1e3),
+                '%.1f'%(100 * f[2] / total), '%.2f'%(f[1] * 1e6 / f[0]))
+        return ret
+
+# Profile the program within a with block
+@contextlib.contextmanager
+def profile(program):
+    prof = profiler().attach(program)
+    try:
+        yield prof
+    finally:
+        prof.detach()
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description='Profile the simulator on one sample program.')
+    parser.add_argument('input', help='sample file')
+    parser.add_argument('-m', '--mode', choices=['simulate', 'pipeline'], default='pipeline')
+    parser.add_argument('-o', '--output', help='collapsed-stack output file')
+    args = parser.parse_args(argv)
+
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        p = main.program(args.input)
+        p.load()
+        with profile(p) as prof:
+            for record in (p.simulation_records() if args.mode == 'simulate' else p.pipeline_records()):
+                pass
+    if args.output:
+        prof.write_collapsed(args.output)
+    sys.stdout.write(prof.format_summary())
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(cli(sys.argv[1:]))
@@ -0,0 +1,309 @@
+"""
+Sampled pipeline simulation
+
+The program runs with a fast functional engine (simulate() semantics) and
+only switches to the pipeline model around sample points: a warm-up window
+refills the empty pipeline, a measurement window records the CPI, and the
+pipeline is drained with fetch stalled before fast-forwarding again. The
+total pipeline cycle number is extrapolated from the measured CPIs with a
+confidence interval.
+
+The pipeline config needs fetch_hazards and read_hazards (the default when
+no config is given): without them the Proj2 pipeline may read operands
+after a later write, so a drained window would not leave the registers and
+memory of simulate() to the functional engine.
+
+Sample points are picked either
+    periodic : one window every `period` instructions
+    bbv      : intervals of `period` instructions are clustered by their
+               basic block vectors (collected with the block translator), a
+               few intervals nearest to each cluster centroid are measured and
+               weighted by cluster size (stratified sampling)
+"""
+import os
+import sys
+import math
+import random
+import argparse
+import contextlib
+import statistics
+
+import src.main as main
+import src.config as config
+import src.translator as translator
+
+MODES = ('periodic', 'bbv')
+
+"""
+Measurement of one window
+"""
+class window():
+    def __init__(self, start, instructions, cycles, stratum=0):
+        self.start = start                  # instruction number at the window start
+        self.instructions = instructions
+        self.cycles = cycles
+        self.stratum = stratum              # cluster of the window, 0 if periodic
+
+    def cpi(self):
+        return self.cycles / self.instructions
+
+"""
+Extrapolated result of a sampled run
+"""
+class sample_result():
+    def __init__(self, instructions, windows, weights, confidence):
+        self.instructions = instructions    # total executed instructions
+        self.windows = windows
+        self.weights = weights              # stratum => weight (fraction of intervals)
+        self.confidence = confidence
+        self.detailed_instructions = 0      # instructions run in the pipeline model
+        self.cpi, self.cpi_error = self.estimate()
+
+    # Stratified mean of window CPIs and its confidence half-width. Strata
+    # without any window (e.g. a tail shorter than the warm-up) are left out
+    # and the weights rescaled. A stratum with one window takes the pooled
+    # variance of the strata with two or more (of all windows if there are
+    # none) and is listed in self.singletons; the half-width is None with a
+    # single window
+    def estimate(self):
+        strata = dict((w.stratum, []) for w in self.windows)
+        for w in self.windows:
+            strata[w.stratum].append(w.cpi())
+        self.singletons = sorted(stratum for stratum, cpis in strata.items() if len(cpis) == 1)
+        total = sum(self.weights[s] for s in strata)
+        if not total:
+            return None, None
+        z = statistics.NormalDist().inv_cdf(0.5 + self.confidence/2)
+        multi = [cpis for cpis in strata.values() if len(cpis) > 1]
+        if multi:
+            pooled = sum((len(cpis) - 1) * statistics.variance(cpis) for cpis in multi) \
+                / sum(len(cpis) - 1 for cpis in multi)
+        elif len(self.windows) > 1:
+            pooled = statistics.variance([w.cpi() for w in self.windows])
+        else:
+            pooled = None
+        cpi, var = 0.0, 0.0
+        for stratum, cpis in strata.items():
+            weight = self.weights[stratum] / total
+            cpi += weight * statistics.mean(cpis)
+            if len(cpis) > 1:
+                var += weight**2 * statistics.variance(cpis) / len(cpis)
+            elif pooled is not None:
+                var += weight**2 * pooled
+            else:
+                var = None
+                break
+        return cpi, None if var is None else z * math.sqrt(var)
+
+    def cycles(self):
+        return None if self.cpi is None else self.cpi * self.instructions
+
+    def cycles_error(self):
+        return None if self.cpi_error is None else self.cpi_error * self.instructions
+
+    def format(self):
+        if self.cpi is None:
+            return 'No window measured, the program is shorter than one sample\n'
+        error = lambda e: '' if e is None else ' +- %.4g'%e
+        ret = 'Instructions:\t%d\n'%self.instructions
+        ret += 'Windows:\t%d\n'%len(self.windows)
+        ret += 'Detailed:\t%d instructions (%.2f%%)\n' \
+            %(self.detailed_instructions, 100.0 * self.detailed_instructions / max(self.instructions, 1))
+        ret += 'CPI:\t\t%.4f%s\n'%(self.cpi, error(self.cpi_error))
+        ret += 'IPC:\t\t%.4f\n'%(1 / self.cpi)
+        ret += 'Cycles:\t\t%.0f%s\n'%(self.cycles(), error(self.cycles_error()))
+        if self.cpi_error is not None:
+            ret += 'Confidence:\t%g%%\n'%(100*self.confidence)
+        if self.singletons and self.cpi_error is not None:
+            ret += 'Singletons:\t%d of %d strata measured once, with the pooled variance\n' \
+                %(len(self.singletons), len(set(w.stratum for w in self.windows)))
+        return ret
+
+"""
+Sampled simulation of one input, the program is read again for each pass
+"""
+class sampler():
+    def __init__(self, input_path, mode='periodic', period=10000, warmup=500, measure=1000,
+            clusters=4, per_cluster=2, confidence=0.95, engine='closure', seed=0, pipeline_config=None):
+        if mode not in MODES:
+            raise ValueError('Unknown sampling mode %s'%mode)
+        if warmup + measure > period:
+            raise ValueError('Warm-up and measurement windows exceed the period')
+        if pipeline_config is None:
+            pipeline_config = config.pipeline_config(fetch_hazards=True, read_hazards=True)
+        elif not (pipeline_config.fetch_hazards and pipeline_config.read_hazards):
+            raise ValueError('sampling needs fetch_hazards and read_hazards')
+        self.input_path = input_path
+        self.mode = mode
+        self.period = period
+        self.warmup = warmup
+        self.measure = measure
+        self.clusters = clusters
+        self.per_cluster = per_cluster
+        self.confidence = confidence
+        self.engine = engine
+        self.seed = seed
+        self.pipeline_config = pipeline_config
+
+    def load(self):
+        with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+            p = main.program(self.input_path, self.pipeline_config)
+            p.load()
+        return p
+
+    def run(self):
+        if self.mode == 'periodic':
+            points = None
+            weights = {0: 1.0}
+        else:
+            points, weights = self.select_bbv_points()
+        return self.measure_points(points, weights)
+
+    # Fast-forward to each sample point and measure it, periodic points
+    # (every period from the first warm-up) if `points` is None.
+    # points are (start instruction, stratum) sorted by start. The run ends
+    # in the pipeline model if BREAK is fetched in a window, pc is then past
+    # the program
+    def measure_points(self, points, weights):
+        p = self.load()
+        engine = main.FUNCTIONAL_ENGINES[self.engine](p)
+        position = 0
+        windows = []
+        detailed = 0
+        k = 0
+        with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+            while p.get_pc() != -1 and not p.is_break_fetched:
+                if points is None:
+                    start, stratum = k*self.period + self.warmup, 0
+                elif k < len(points):
+                    start, stratum = points[k]
+                else:
+                    break
+                k += 1
+                # functional fast-forward up to the warm-up
+                if start - self.warmup > position:
+                    position += engine.run(start - self.warmup - position)
+                    if p.get_pc() == -1:
+                        break
+                # pipeline warm-up, then measurement
+                begin = p.ist_count
+                self.run_pipeline_ists(p, max(start - position, 0))
+                count, cycle = p.ist_count, p.cycle
+                self.run_pipeline_ists(p, self.measure)
+                if p.ist_count > count:
+                    windows.append(window(position + count - begin, p.ist_count - count, p.cycle - cycle, stratum))
+                p.drain_pipeline()
+                position += p.ist_count - begin
+                detailed += p.ist_count - begin
+            # rest of the program
+            if not p.is_break_fetched:
+                position += engine.run()
+        result = sample_result(position, windows, weights, self.confidence)
+        result.detailed_instructions = detailed
+        return result
+
+    # Pipeline until n more instructions are finished or BREAK is fetched
+    def run_pipeline_ists(self, p, n):
+        target = p.ist_count + n
+        while not p.is_break_fetched and p.ist_count < target:
+            p.step_pipeline()
+            p.skip_cycles(p.idle_cycles)
+        p.is_skipped_cycle = False
+
+    ################################### BBV Clustering ###################################
+    # Normalized basic block vectors of every `period` instructions (blocks
+    # are atomic, so an interval may be a little longer) and interval starts
+    def collect_bbvs(self):
+        p = self.load()
+        engine = translator.block_translator(p)
+        bbvs, starts = [], []
+        position = 0
+        while p.get_pc() != -1:
+            bbv = {}
+            n = engine.run(self.period, bbv)
+            bbvs.append(dict((pc, c / n) for pc, c in bbv.items()))
+            starts.append(position)
+            position += n
+        return bbvs, starts
+
+    # Sample points nearest to the centroids of k-means clusters of
+    # interval BBVs, and weights of the clusters
+    def select_bbv_points(self):
+        bbvs, starts = self.collect_bbvs()
+        labels, centroids = kmeans(bbvs, self.clusters, random.Random(self.seed))
+        points, weights = [], {}
+        for c, centroid in enumerate(centroids):
+            members = [i for i in range(len(bbvs)) if labels[i] == c]
+            if not members:
+                continue
+            weights[c] = len(members) / len(bbvs)
+            members.sort(key=lambda i: distance(bbvs[i], centroid))
+            points += [(starts[i] + self.warmup, c) for i in members[:self.per_cluster]]
+        points.sort()
+        return points, weights
+
+# Manhattan distance of sparse vectors
+def distance(a, b):
+    d = sum(abs(v - b.get(k, 0)) for k, v in a.items())
+    return d + sum(v for k, v in b.items() if k not in a)
+
+def mean_vector(vectors):
+    ret = {}
+    for v in vectors:
+        for k, x in v.items():
+            ret[k] = ret.get(k, 0) + x
+    return dict((k, x / len(vectors)) for k, x in ret.items())
+
+# k-means with k-means++ seeding, return labels and centroids
+def kmeans(vectors, k, rand, iterations=50):
+    k = min(k, len(vectors))
+    centroids = [vectors[rand.randrange(len(vectors))]]
+    while len(centroids) < k:
+        d = [min(distance(v, c) for c in centroids) for v in vectors]
+        if sum(d) == 0:
+            break
+        centroids.append(rand.choices(vectors, weights=d)[0])
+    labels = None
+    for it in range(iterations):
+        new_labels = [min(range(len(centroids)), key=lambda c: distance(v, centroids[c])) for v in vectors]
+        if new_labels == labels:
+            break
+        labels = new_labels
+        for c in range(len(centroids)):
+            members = [v for v, l in zip(vectors, labels) if l == c]
+            if members:
+                centroids[c] = mean_vector(members)
+    return labels, centroids
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description='Sampled pipeline simulation with extrapolated CPI.')
+    parser.add_argument('input', help='sample file')
+    parser.add_argument('-m', '--mode', choices=MODES, default='periodic')
+    parser.add_argument('--period', type=int, default=10000, help='instructions per interval')
+    parser.add_argument('--warmup', type=int, default=500, help='pipeline warm-up instructions')
+    parser.add_argument('--measure', type=int, default=1000, help='measured instructions per window')
+    parser.add_argument('--clusters', type=int, default=4, help='BBV clusters')
+    parser.add_argument('--per-cluster', type=int, default=2, help='measured intervals per cluster')
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--engine', choices=sorted(main.FUNCTIONAL_ENGINES), default='closure')
+    parser.add_argument('--exact', action='store_true', help='also run the full pipeline for comparison')
+    config.add_arguments(parser)
+    parser.set_defaults(fetch_hazards=True, read_hazards=True)
+    args = parser.parse_args(argv)
+
+    try:
+        s = sampler(args.input, args.mode, args.period, args.warmup, args.measure,
+            args.clusters, args.per_cluster, args.confidence, args.engine, pipeline_config=config.from_args(parser, args))
+    except ValueError as e:
+        parser.error(str(e))
+    result = s.run()
+    sys.stdout.write(result.format())
+    if args.exact and result.cpi is not None:
+        p = s.load()
+        with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+            cycles = p.run_pipeline()
+        sys.stdout.write('Exact:\t\t%d cycles (error %.2f%%)\n'%(cycles, 100.0 * (result.cycles() - cycles) / cycles))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(cli(sys.argv[1:]))
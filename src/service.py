@@ -0,0 +1,234 @@
+"""
+Simulation service
+
+A daemon listening on a Unix domain socket, which runs simulation jobs in a
+pool of worker processes so a job does not pay interpreter startup, imports
+and decoding. Every worker keeps its last decoded programs, keyed by the
+hash of the input content, the output directory and the pipeline config; a
+program of a later job with the same key is reset instead of decoded again.
+
+The protocol is one JSON object per line. A job is
+    {"id": ..., "path": <sample file or packed image>, "mode": ..., "config": {...}}
+whose outputs are written next to the input as MIPSsim.py does, or
+    {"id": ..., "data": <base64 of the sample file or image>, "mode": ..., "config": {...}}
+whose outputs are sent back. Jobs of a connection run concurrently, the
+messages of a job are
+    {"id": ..., "type": "output", "name": <file name>, "data": <chunk>}...
+    {"id": ..., "type": "result", "results": [...], "cached": ..., "time": ...}
+or {"id": ..., "type": "error", "message": ...}. {"op": "ping"} returns the
+service statistics and {"op": "shutdown"} stops the service. The client is
+src.client.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import signal
+import shutil
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import contextlib
+import collections
+import concurrent.futures
+
+import src.main as main
+import src.utils as utils
+import src.config as config
+import src.driver as driver
+import src.checkpoint as checkpoint
+import src.client as client
+
+DEFAULT_SOCKET = client.DEFAULT_SOCKET
+DEFAULT_CACHE_SIZE = 16
+# characters of output data per message
+CHUNK_SIZE = 1 << 16
+# longest message line
+LINE_LIMIT = 1 << 28
+
+################################### Worker ###################################
+_programs = collections.OrderedDict()   # (content hash, output dir, config) => program
+_cache_size = DEFAULT_CACHE_SIZE
+_data_dir = None                        # files of inline jobs
+
+def init_worker(data_dir, cache_size):
+    global _data_dir, _cache_size
+    _data_dir, _cache_size = data_dir, cache_size
+    # the front end handles SIGINT
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+# Loaded program of the content, from the cache or decoded
+def get_program(data, path, cfg):
+    digest = hashlib.sha1(data).hexdigest()
+    key = (digest, None if path is None else os.path.dirname(path), checkpoint.config_bytes(cfg))
+    p = _programs.pop(key, None)
+    cached = p is not None
+    if cached:
+        p.reset()
+    else:
+        if path is None:
+            # inline content is kept as a file, packed images stay mapped
+            path = os.path.join(_data_dir, digest, 'sample.txt')
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(data)
+                os.replace(path + '.tmp', path)
+        p = main.program(path, cfg)
+        p.load()
+    _programs[key] = p
+    while len(_programs) > _cache_size:
+        _programs.popitem(last=False)
+    return p, cached
+
+# Run a job, return its results and the outputs of an inline job
+def run_job(job):
+    start = time.time()
+    mode = job.get('mode', 'pipeline')
+    if mode not in driver.MODES:
+        raise ValueError('Unknown mode %s'%mode)
+    cfg = config.from_dict(job.get('config', {}))
+    outputs = collections.OrderedDict()
+    if 'data' in job:
+        data, path = base64.b64decode(job['data']), None
+        write = lambda path, records: outputs.__setitem__(os.path.basename(path), ''.join(records))
+    else:
+        path = os.path.abspath(job['path'])
+        with open(path, 'rb') as f:
+            data = f.read()
+        write = utils.write_records
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        p, cached = get_program(data, path, cfg)
+        results = driver.run(p, mode, 1, write)
+    return {'results': results, 'outputs': outputs, 'cached': cached, 'time': time.time() - start}
+
+################################### Front End ###################################
+class simulation_service():
+    def __init__(self, socket_path=DEFAULT_SOCKET, workers=None, cache_size=DEFAULT_CACHE_SIZE):
+        self.socket_path = socket_path
+        self.workers = workers
+        self.cache_size = cache_size
+        self.jobs = 0
+        self.hits = 0
+        self.errors = 0
+
+    def serve(self):
+        if os.path.exists(self.socket_path):
+            if client.is_running(self.socket_path):
+                raise RuntimeError('A service is already listening on %s'%self.socket_path)
+            os.unlink(self.socket_path)
+        data_dir = tempfile.mkdtemp(prefix='mipssim-')
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=init_worker,
+            initargs=(data_dir, self.cache_size))
+        try:
+            asyncio.run(self.main())
+        finally:
+            self.pool.shutdown()
+            shutil.rmtree(data_dir, ignore_errors=True)
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.socket_path)
+
+    async def main(self):
+        self.stopped = asyncio.Event()
+        self.handlers = {}      # handler task => writer of its connection
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stopped.set)
+        server = await asyncio.start_unix_server(self.handle, path=self.socket_path, limit=LINE_LIMIT)
+        async with server:
+            await self.stopped.wait()
+            # close the connections, their handlers read EOF and end once
+            # their running jobs are done
+            for writer in self.handlers.values():
+                writer.close()
+            if self.handlers:
+                await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    # Read the requests of a connection, jobs run concurrently
+    async def handle(self, reader, writer):
+        tasks = set()
+        handler = asyncio.current_task()
+        self.handlers[handler] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('Request must be a JSON object')
+                except ValueError as e:
+                    self.send(writer, {'id': None, 'type': 'error', 'message': 'Invalid request: %s'%e})
+                    continue
+                op = request.get('op', 'job')
+                if op == 'ping':
+                    self.send(writer, {'id': request.get('id'), 'type': 'pong', 'jobs': self.jobs,
+                        'hits': self.hits, 'errors': self.errors})
+                elif op == 'shutdown':
+                    self.send(writer, {'id': request.get('id'), 'type': 'shutdown'})
+                    self.stopped.set()
+                else:
+                    task = asyncio.ensure_future(self.run(request, writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                await writer.drain()
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            del self.handlers[handler]
+
+    async def run(self, job, writer):
+        job_id = job.get('id')
+        self.jobs += 1
+        try:
+            ret = await asyncio.get_running_loop().run_in_executor(self.pool, run_job, job)
+        except Exception as e:
+            self.errors += 1
+            self.send(writer, {'id': job_id, 'type': 'error', 'message': type(e).__name__ + (': %s'%e if str(e) else '')})
+        else:
+            self.hits += ret['cached']
+            for name, text in ret['outputs'].items():
+                for i in range(0, max(len(text), 1), CHUNK_SIZE):
+                    self.send(writer, {'id': job_id, 'type': 'output', 'name': name, 'data': text[i:i+CHUNK_SIZE]})
+                    await writer.drain()
+            self.send(writer, {'id': job_id, 'type': 'result', 'results': ret['results'],
+                'cached': ret['cached'], 'time': ret['time']})
+        with contextlib.suppress(ConnectionError):
+            await writer.drain()
+
+    def send(self, writer, message):
+        if not writer.is_closing():
+            writer.write(json.dumps(message).encode() + b'\n')
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description='Simulation service on a Unix domain socket.')
+    parser.add_argument('command', choices=['serve', 'ping', 'stop'])
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='service socket (%s)'%DEFAULT_SOCKET)
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: CPU number)')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE, help='decoded programs kept per worker')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        try:
+            simulation_service(args.socket, args.workers, args.cache_size).serve()
+        except RuntimeError as e:
+            sys.stderr.write('%s\n'%e)
+            return 1
+        return 0
+    try:
+        for reply in client.request({'op': 'ping' if args.command == 'ping' else 'shutdown'}, args.socket):
+            if args.command == 'ping':
+                sys.stdout.write('%d jobs, %d cached programs, %d errors\n'%(reply['jobs'], reply['hits'], reply['errors']))
+    except OSError as e:
+        sys.stderr.write('No simulation service on %s: %s\n'%(args.socket, e))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(cli(sys.argv[1:]))
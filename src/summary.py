@@ -0,0 +1,31 @@
+"""
+Run modes and result summary
+
+Shared by the driver and the service client, so the client does not import
+the simulator.
+"""
+
+# mode => engines run
+MODES = {
+    'functional': ['functional'],
+    'pipeline': ['pipeline'],
+    'both': ['functional', 'pipeline'],
+    'disassembly': [],
+    'stats': ['functional', 'pipeline'],
+}
+
+# Summary of the results of driver.run()
+def format_results(results, wall_time):
+    ret = ''
+    for r in results:
+        ret += '%-10s  %d cycles, %d instructions, %.3fs\n'%(r['engine'], r['cycles'], r['instructions'], r['time'])
+        if 'branch' in r:
+            b = r['branch']
+            accuracy = '-' if b['accuracy'] is None else '%.2f%%'%(100*b['accuracy'])
+            ret += '%-10s  %s accuracy %s, %d speculated, %d flushes\n'%('', b['predictor'], accuracy, b['speculated'], b['flushes'])
+        if 'dcache' in r:
+            d = r['dcache']
+            hit_rate = '-' if d['hit_rate'] is None else '%.2f%%'%(100*d['hit_rate'])
+            ret += '%-10s  dcache hit rate %s, %d misses, %d evictions, %d writebacks\n'%('', hit_rate, d['misses'], d['evictions'], d['writebacks'])
+    ret += '%.3fs wall time\n'%wall_time
+    return ret
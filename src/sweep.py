@@ -0,0 +1,203 @@
+"""
+Design-space sweep
+
+Runs pipeline() of sample programs over a grid of pipeline configs in a
+process pool. Each result (cycles, instructions, performance counters and a
+digest of the pipeline.txt output) is stored in an on-disk cache keyed by
+the hash of the program image, the config and the simulator version (a hash
+of the simulator sources), so running a sweep again only simulates the
+points which are not cached yet.
+
+Axes are config fields with values separated by ':', per-unit values are
+comma separated:
+    -a issue_width=2:3:4 -a unit_counts=1,1,1:2,1,2
+    -a fetch_hazards=true -a read_hazards=true -a predictor=none:bimodal:btb
+"""
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import itertools
+import contextlib
+import multiprocessing
+
+import src.main as main
+import src.config as config
+import src.counters as counters
+import src.checkpoint as checkpoint
+
+DEFAULT_CACHE_DIR = '.sweep_cache'
+
+# Hash of the simulator sources, results of another version are not reused
+def simulator_version():
+    h = hashlib.sha1()
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(glob.glob(os.path.join(src_dir, '*.py'))):
+        with open(path, 'rb') as f:
+            h.update(os.path.basename(path).encode() + b'\0' + f.read())
+    return h.hexdigest()
+
+# Hash of the program words, as in checkpoints
+def program_hash(path):
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        p = main.program(path)
+    return checkpoint.image_hash(p).hex()
+
+def result_key(image_hash, cfg, version):
+    key = json.dumps({'image': image_hash, 'config': cfg.to_dict(), 'version': version}, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+"""
+Directory of cached results, one JSON file per key
+"""
+class result_cache():
+    def __init__(self, path=DEFAULT_CACHE_DIR):
+        self.path = path
+
+    def file(self, key):
+        return os.path.join(self.path, key[:2], key + '.json')
+
+    def get(self, key):
+        try:
+            with open(self.file(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # Written to a temporary file first, an interrupted sweep leaves no
+    # partial result
+    def put(self, key, result):
+        path = self.file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '%s.%d.tmp'%(path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp, path)
+
+################################### Grid ###################################
+def axis_value(name, s):
+    if name in config.UNIT_FIELDS:
+        return config.unit_values(s)
+    if name in config.FLAG_FIELDS:
+        if s.lower() not in ('true', 'false'):
+            raise ValueError('%s takes true or false'%name)
+        return s.lower() == 'true'
+    if name in config.CHOICE_FIELDS:
+        return s
+    return int(s)
+
+# 'name=v1:v2:...' => (name, [values])
+def parse_axis(s):
+    name, sep, values = s.partition('=')
+    name = name.strip().replace('-', '_')
+    if not sep or name not in config.DEFAULTS:
+        raise ValueError('Invalid axis %s, expected <config field>=<value>:<value>...'%s)
+    return name, [axis_value(name, v) for v in values.split(':')]
+
+# Configs of every grid point, axes vary over the base config fields
+def expand_grid(axes, base=None):
+    base = base if base is not None else {}
+    names = [name for name, values in axes]
+    ret = []
+    for values in itertools.product(*[values for name, values in axes]):
+        fields = dict(base)
+        fields.update(zip(names, values))
+        ret.append(config.from_dict(fields))
+    return ret
+
+################################### Run ###################################
+# Run pipeline() of one point, return its result
+def run_point(job):
+    path, fields = job
+    start = time.time()
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        p = main.program(path, config.from_dict(fields))
+        p.load()
+        perf = counters.perf_counters().attach(p)
+        digest = hashlib.sha1()
+        for record in p.pipeline_records():
+            digest.update(record.encode())
+    return {'cycles': p.cycle, 'instructions': p.ist_count, 'digest': digest.hexdigest(),
+        'counters': perf.report(), 'time': time.time() - start}
+
+# Run every (program, config) point not in the cache, return one entry per
+# point: (path, config, result, cached)
+def run(paths, configs, cache, workers=None):
+    version = simulator_version()
+    points, missing = [], []
+    for path in paths:
+        image_hash = program_hash(path)
+        for cfg in configs:
+            key = result_key(image_hash, cfg, version)
+            result = cache.get(key)
+            points.append([path, cfg, result, result is not None])
+            if result is None:
+                missing.append((len(points) - 1, key))
+    jobs = [(points[idx][0], points[idx][1].to_dict()) for idx, key in missing]
+    if jobs:
+        # forked workers, the points run one after the other without fork
+        pool = None
+        if workers != 1 and 'fork' in multiprocessing.get_all_start_methods():
+            pool = multiprocessing.get_context('fork').Pool(workers)
+            results = pool.imap(run_point, jobs)
+        else:
+            results = map(run_point, jobs)
+        try:
+            for (idx, key), result in zip(missing, results):
+                cache.put(key, result)
+                points[idx][2] = result
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    return [tuple(point) for point in points]
+
+def format_summary(points, axes):
+    names = [name for name, values in axes]
+    head = ['Program'] + names + ['Cycles', 'CPI', 'Cached']
+    rows = []
+    for path, cfg, result, cached in points:
+        cpi = result['counters']['cpi']
+        rows.append([path] + [str(getattr(cfg, name)).replace(' ', '') for name in names] +
+            [str(result['cycles']), '-' if cpi is None else '%.4f'%cpi, 'yes' if cached else 'no'])
+    widths = [max(len(r[i]) for r in [head] + rows) for i in range(len(head))]
+    fmt = lambda r: '  '.join(v.ljust(w) for v, w in zip(r, widths)).rstrip() + '\n'
+    ret = fmt(head) + ''.join(fmt(r) for r in rows)
+    ret += '\n%d points, %d simulated, %d cached\n'%(len(points),
+        len([p for p in points if not p[3]]), len([p for p in points if p[3]]))
+    return ret
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description='Sweep pipeline configs over sample programs.')
+    parser.add_argument('inputs', nargs='+', help='sample files or packed images')
+    parser.add_argument('-a', '--axis', action='append', default=[], help='<config field>=<value>:<value>...')
+    parser.add_argument('--base', help='JSON pipeline config the axes vary')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_DIR, help='result cache directory')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: CPU number)')
+    parser.add_argument('-o', '--output', help='JSON file of every point')
+    args = parser.parse_args(argv)
+
+    try:
+        axes = [parse_axis(a) for a in args.axis]
+        base = None
+        if args.base:
+            with open(args.base, 'r') as f:
+                base = json.load(f)
+            if not isinstance(base, dict):
+                raise ValueError('Base config %s must be a JSON object'%args.base)
+        configs = expand_grid(axes, base)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    points = run(args.inputs, configs, result_cache(args.cache), args.workers)
+    sys.stdout.write(format_summary(points, axes))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump([{'program': path, 'config': cfg.to_dict(), 'cached': cached, 'result': result}
+                for path, cfg, result, cached in points], f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(cli(sys.argv[1:]))
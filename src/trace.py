@@ -0,0 +1,372 @@
+"""
+Compact binary delta trace
+
+Instead of reprinting every register and the whole Data region each cycle,
+a cycle record only keeps the registers and memory words it changed, with
+a full keyframe every KEYFRAME_INTERVAL cycles. The text part of a record
+(instruction / pipeline buffers) is interned in a string table. An index
+from keyframe cycle to file offset is appended when the trace is closed,
+so a reader can rebuild any cycle by seeking to the nearest keyframe.
+
+Layout (little-endian):
+    header   : magic 'MDTR', version, kind, keyframe interval, START_DATA, register number
+    'S' record : string id, length, utf-8 bytes
+    'K' record : cycle, string id, all registers, Data word number, (address, value)...
+    'D' record : cycle, string id, changed register number, (index, value)...,
+                 changed Data word number, (address, value)...
+    'I' record : keyframe number, (cycle, offset)..., string number, (length, bytes)...
+    footer   : index offset, last cycle, magic 'MDTE'
+A trace without footer (interrupted run) is still readable by scanning it.
+"""
+import sys
+import mmap
+import bisect
+import struct
+
+import src.formatter as formatter
+
+MAGIC = b'MDTR'
+FOOTER_MAGIC = b'MDTE'
+VERSION = 1
+
+KIND_SIMULATION = 0
+KIND_PIPELINE = 1
+
+KEYFRAME_INTERVAL = 1000
+
+HEADER = struct.Struct('<4sHBIqH')
+FOOTER = struct.Struct('<QQ4s')
+RECORD = struct.Struct('<cQI')
+STRING = struct.Struct('<cII')
+U8 = struct.Struct('<B')
+U16 = struct.Struct('<H')
+U32 = struct.Struct('<I')
+U64 = struct.Struct('<Q')
+I64 = struct.Struct('<q')
+INDEX_ENTRY = struct.Struct('<QQ')
+
+# value tags
+VAL_INT = 0         # fits in int64
+VAL_BOOL = 1        # SLT results are stored as python bool
+VAL_BIGINT = 2      # arbitrary precision int
+
+INT_VALUE = struct.Struct('<Bq')
+BOOL_VALUE = struct.Struct('<B?')
+
+################################### Value Encoding ###################################
+def pack_value(v):
+    t = type(v)
+    if t is int and -0x8000000000000000 <= v <= 0x7FFFFFFFFFFFFFFF:
+        return INT_VALUE.pack(VAL_INT, v)
+    if t is bool:
+        return BOOL_VALUE.pack(VAL_BOOL, v)
+    if t is int:
+        n = v.bit_length() // 8 + 1
+        return U8.pack(VAL_BIGINT) + U16.pack(n) + v.to_bytes(n, 'little', signed=True)
+    raise TypeError('Cannot trace value %r'%(v,))
+
+# Unpack a value at offset, return value and next offset
+def unpack_value(buf, off):
+    tag = buf[off]
+    if tag == VAL_INT:
+        return INT_VALUE.unpack_from(buf, off)[1], off + INT_VALUE.size
+    if tag == VAL_BOOL:
+        return BOOL_VALUE.unpack_from(buf, off)[1], off + BOOL_VALUE.size
+    if tag == VAL_BIGINT:
+        n = U16.unpack_from(buf, off + 1)[0]
+        off += 3
+        return int.from_bytes(buf[off:off+n], 'little', signed=True), off + n
+    raise ValueError('Unknown value tag %d at offset %d'%(tag, off))
+
+def is_changed(old, new):
+    return old is not new and (old != new or type(old) is not type(new))
+
+################################### Text Rendering ###################################
+# Data region rows of 8 words, same as program.get_mem_infos; mems holds
+# the traced words by address
+def render_mem_infos(mems, start_data):
+    ret = ''
+    row = None
+    for addr in sorted(mems):
+        if (addr - start_data) >> 5 != row:
+            row = (addr - start_data) >> 5
+            ret += '\n' + str(start_data + 32*row) + ':'
+        ret += '\t' + str(mems[addr])
+    return ret
+
+def render_reg_infos(regs, begin, end):
+    return formatter.format_values(regs[begin:end])
+
+# Same as program.get_simulation_record, text is 'addr\tMIPS'
+def render_simulation(cycle, text, regs, mems, start_data):
+    return '--------------------\nCycle:%d\t%s\n\nRegisters\nR00:%s\nR16:%s\n\nData%s\n\n' \
+        %(cycle, text, render_reg_infos(regs, 0, 16), render_reg_infos(regs, 16, 32),
+        render_mem_infos(mems, start_data))
+
+# Same as program.get_pipeline_record, text is program.get_pipeline_infos
+def render_pipeline(cycle, text, regs, mems, start_data):
+    return '--------------------\nCycle:%d\n\n%s\nRegisters\nR00:%s\nR08:%s\nR16:%s\nR24:%s\n\nData%s\n' \
+        %(cycle, text, render_reg_infos(regs, 0, 8), render_reg_infos(regs, 8, 16),
+        render_reg_infos(regs, 16, 24), render_reg_infos(regs, 24, 32), render_mem_infos(mems, start_data))
+
+RENDERERS = {KIND_SIMULATION: render_simulation, KIND_PIPELINE: render_pipeline}
+
+################################### Writer ###################################
+"""
+Delta trace writer, call record() after every cycle of the program
+"""
+class delta_trace_writer():
+    def __init__(self, path, program, kind, keyframe_interval=KEYFRAME_INTERVAL):
+        self.PG = program
+        self.keyframe_interval = keyframe_interval
+        self.f = open(path, 'wb')
+        self.f.write(HEADER.pack(MAGIC, VERSION, kind, keyframe_interval,
+            program.START_DATA, program.REGISTER_NUM))
+        self.strings = {}
+        self.index = []             # (cycle, offset) of keyframes
+        self.prev_regs = None
+        self.prev_mems = None
+        self.recorded = 0
+        self.last_cycle = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_string_id(self, text):
+        sid = self.strings.get(text)
+        if sid is None:
+            sid = self.strings[text] = len(self.strings)
+            data = text.encode()
+            self.f.write(STRING.pack(b'S', sid, len(data)) + data)
+        return sid
+
+    # Record the current cycle of the program with its text part
+    def record(self, text):
+        _p = self.PG
+        sid = self.get_string_id(text)
+        if self.recorded % self.keyframe_interval == 0:
+            self.write_keyframe(_p, sid)
+        else:
+            self.write_delta(_p, sid)
+        self.recorded += 1
+        self.last_cycle = _p.cycle
+
+    def write_keyframe(self, _p, sid):
+        self.index.append((_p.cycle, self.f.tell()))
+        self.prev_regs = list(_p.regs)
+        # address => value of the traced Data words
+        self.prev_mems = dict((addr + 4*i, v) for addr, data in _p.get_data_runs() for i, v in enumerate(data))
+        out = [RECORD.pack(b'K', _p.cycle, sid)]
+        out += [pack_value(v) for v in self.prev_regs]
+        out.append(U32.pack(len(self.prev_mems)))
+        for addr, v in self.prev_mems.items():
+            out.append(I64.pack(addr) + pack_value(v))
+        self.f.write(b''.join(out))
+
+    def write_delta(self, _p, sid):
+        regs, prev_regs = _p.regs, self.prev_regs
+        reg_out = []
+        for i in range(len(regs)):
+            if is_changed(prev_regs[i], regs[i]):
+                prev_regs[i] = regs[i]
+                reg_out.append(U8.pack(i) + pack_value(regs[i]))
+        # only the Data region is traced
+        prev_mems = self.prev_mems
+        mem_out = []
+        for start, data in _p.get_data_runs():
+            for i in range(len(data)):
+                addr, v = start + 4*i, data[i]
+                if addr not in prev_mems or is_changed(prev_mems[addr], v):
+                    prev_mems[addr] = v
+                    mem_out.append(I64.pack(addr) + pack_value(v))
+        self.f.write(RECORD.pack(b'D', _p.cycle, sid) + U8.pack(len(reg_out)) + b''.join(reg_out)
+            + U32.pack(len(mem_out)) + b''.join(mem_out))
+
+    def close(self):
+        if self.f.closed:
+            return
+        offset = self.f.tell()
+        out = [b'I', U64.pack(len(self.index))]
+        out += [INDEX_ENTRY.pack(c, o) for c, o in self.index]
+        out.append(U32.pack(len(self.strings)))
+        for text in self.strings:
+            data = text.encode()
+            out.append(U32.pack(len(data)) + data)
+        out.append(FOOTER.pack(offset, self.last_cycle, FOOTER_MAGIC))
+        self.f.write(b''.join(out))
+        self.f.close()
+
+# Simulate the program into a delta trace, disassembly must be done first
+def write_simulation_trace(path, program, keyframe_interval=KEYFRAME_INTERVAL):
+    with delta_trace_writer(path, program, KIND_SIMULATION, keyframe_interval) as w:
+        for addr, I in program.simulation_steps():
+            w.record('%d\t%s'%(addr, I.mips))
+
+# Pipeline the program into a delta trace, disassembly must be done first
+def write_pipeline_trace(path, program, keyframe_interval=KEYFRAME_INTERVAL):
+    with delta_trace_writer(path, program, KIND_PIPELINE, keyframe_interval) as w:
+        for IF_str in program.pipeline_steps():
+            w.record(program.get_pipeline_infos(IF_str))
+
+################################### Reader ###################################
+"""
+Delta trace reader, rebuilds the state of any cycle or renders the text format
+"""
+class delta_trace_reader():
+    def __init__(self, path):
+        self.f = open(path, 'rb')
+        self.buf = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.kind, self.keyframe_interval, self.START_DATA, self.REGISTER_NUM \
+            = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a version %d delta trace: %s'%(VERSION, path))
+        self.strings = []
+        self.index_cycles = []
+        self.index_offsets = []
+        self.end = len(self.buf)
+        if not self.read_index():
+            self.scan()
+
+    def close(self):
+        self.buf.close()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Load index and strings from the footer, False if the trace has none
+    def read_index(self):
+        if len(self.buf) < HEADER.size + FOOTER.size:
+            return False
+        offset, self.last_cycle, magic = FOOTER.unpack_from(self.buf, len(self.buf) - FOOTER.size)
+        if magic != FOOTER_MAGIC:
+            return False
+        off = offset + 1
+        n = U64.unpack_from(self.buf, off)[0]
+        off += U64.size
+        for i in range(n):
+            c, o = INDEX_ENTRY.unpack_from(self.buf, off)
+            self.index_cycles.append(c)
+            self.index_offsets.append(o)
+            off += INDEX_ENTRY.size
+        n = U32.unpack_from(self.buf, off)[0]
+        off += U32.size
+        for i in range(n):
+            length = U32.unpack_from(self.buf, off)[0]
+            off += U32.size
+            self.strings.append(self.buf[off:off+length].decode())
+            off += length
+        self.end = offset
+        return True
+
+    # Rebuild index and strings of a trace without footer
+    def scan(self):
+        self.last_cycle = 0
+        off = HEADER.size
+        while off < len(self.buf):
+            try:
+                tag, cycle, sid, off_next = self.read_record(off, None, None)
+            except (struct.error, ValueError, IndexError):
+                break       # truncated last record
+            if tag == b'K':
+                self.index_cycles.append(cycle)
+                self.index_offsets.append(off)
+            if tag in (b'K', b'D'):
+                self.last_cycle = cycle
+            off = off_next
+        self.end = off
+
+    # Parse the record at offset, apply it to regs / mems if given,
+    # return tag, cycle, text id and next offset
+    def read_record(self, off, regs, mems):
+        buf = self.buf
+        tag = buf[off:off+1]
+        if tag == b'S':
+            _, sid, length = STRING.unpack_from(buf, off)
+            off += STRING.size
+            if sid == len(self.strings):
+                self.strings.append(buf[off:off+length].decode())
+            return tag, None, sid, off + length
+        if tag == b'I':
+            return tag, None, None, len(buf)
+        _, cycle, sid = RECORD.unpack_from(buf, off)
+        off += RECORD.size
+        if tag == b'K':
+            for i in range(self.REGISTER_NUM):
+                v, off = unpack_value(buf, off)
+                if regs is not None:
+                    regs[i] = v
+            n = U32.unpack_from(buf, off)[0]
+            off += U32.size
+            if mems is not None:
+                mems.clear()
+        elif tag == b'D':
+            n = buf[off]
+            off += 1
+            for i in range(n):
+                idx = buf[off]
+                v, off = unpack_value(buf, off + 1)
+                if regs is not None:
+                    regs[idx] = v
+            n = U32.unpack_from(buf, off)[0]
+            off += U32.size
+        else:
+            raise ValueError('Unknown record %r at offset %d'%(tag, off))
+        for i in range(n):
+            addr = I64.unpack_from(buf, off)[0]
+            v, off = unpack_value(buf, off + I64.size)
+            if mems is not None:
+                mems[addr] = v
+        return tag, cycle, sid, off
+
+    @property
+    def first_cycle(self):
+        return self.index_cycles[0] if self.index_cycles else None
+
+    # Yield (cycle, text, regs, mems) of cycles in [begin, end],
+    # regs / mems are updated in place
+    def states(self, begin=None, end=None):
+        if not self.index_cycles:
+            return
+        begin = self.first_cycle if begin is None else begin
+        end = self.last_cycle if end is None else end
+        k = max(bisect.bisect_right(self.index_cycles, begin) - 1, 0)
+        off = self.index_offsets[k]
+        regs = [0] * self.REGISTER_NUM
+        mems = {}
+        while off < self.end:
+            tag, cycle, sid, off = self.read_record(off, regs, mems)
+            if tag == b'I':
+                break
+            if tag == b'S':
+                continue
+            if cycle > end:
+                break
+            if cycle >= begin:
+                yield cycle, self.strings[sid], regs, mems
+
+    # State of one cycle as (text, regs, mems), None if not traced
+    def state(self, cycle):
+        for c, text, regs, mems in self.states(cycle, cycle):
+            return text, list(regs), dict(mems)
+        return None
+
+    # Render cycles in [begin, end] in the simulation.txt / pipeline.txt format
+    def render(self, begin=None, end=None):
+        render = RENDERERS[self.kind]
+        for cycle, text, regs, mems in self.states(begin, end):
+            yield render(cycle, text, regs, mems, self.START_DATA)
+
+# python -m src.trace trace_path [begin [end]]
+if __name__ == '__main__':
+    with delta_trace_reader(sys.argv[1]) as reader:
+        begin = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        end = int(sys.argv[3]) if len(sys.argv) > 3 else begin
+        for record in reader.render(begin, end):
+            sys.stdout.write(record)
@@ -0,0 +1,127 @@
+"""
+Basic-block translator
+
+program.ists is split into basic blocks ending at J/JR/BEQ/BLTZ/BGTZ/BREAK.
+Each block is translated into one python function with the registers it
+uses held in locals, compiled once and cached by its entry pc. Instructions
+without a translation fall back to the interpreter (ist.execute()).
+"""
+import src.utils as utils
+import src.instruction as ist
+
+# Longest block translated into one function
+MAX_BLOCK_SIZE = 256
+
+# Names visible to translated blocks
+BLOCK_GLOBALS = {'shiftLogic': utils.shiftLogic, 'shiftArith': utils.shiftArith}
+
+"""
+A translated block, `fn(regs, mems)` runs it and returns the next pc
+"""
+class block():
+    def __init__(self, start, end, size, fn, src):
+        self.start = start      # entry pc
+        self.end = end          # pc after the last instruction
+        self.size = size        # instruction number
+        self.fn = fn
+        self.src = src
+
+"""
+Block-translating functional engine, results match program.simulate()
+"""
+class block_translator():
+    def __init__(self, program):
+        self.PG = program
+        # entry pc => block, None if the entry instruction is interpreted
+        self.cache = {}
+        # address of the last executed instruction
+        self.last_pc = None
+
+    # Run until BREAK or after the block reaching `max_ists` instructions,
+    # return executed number. Instructions executed per block entry pc are
+    # added to the `bbv` dict (basic block vector) if given
+    def run(self, max_ists=None, bbv=None):
+        _p = self.PG
+        cache, regs, mems = self.cache, _p.regs, _p.mems
+        pc, n = _p.get_pc(), 0
+        limit = -1 if max_ists is None else max_ists
+        try:
+            while pc != -1 and (limit < 0 or n < limit):
+                try:
+                    b = cache[pc]
+                except KeyError:
+                    b = self.translate(pc)
+                if b is None:
+                    # fallback to the interpreter
+                    self.last_pc = pc
+                    _p.set_pc(pc)
+                    self.get_ist(pc).execute()
+                    if bbv is not None:
+                        bbv[self.last_pc] = bbv.get(self.last_pc, 0) + 1
+                    pc = _p.get_pc()
+                    n += 1
+                else:
+                    self.last_pc = b.end - 4
+                    if bbv is not None:
+                        bbv[b.start] = bbv.get(b.start, 0) + b.size
+                    pc = b.fn(regs, mems)
+                    n += b.size
+        finally:
+            _p.set_pc(pc)
+            _p.cycle += n
+        return n
+
+    def get_ist(self, pc):
+        _p = self.PG
+        idx = (pc - _p.START_PC) >> 2
+        if idx < 0 or idx >= len(_p.ists):
+            raise IndexError('No instruction at pc %d'%pc)
+        return _p.ists[idx]
+
+    # Translate the block entered at pc and cache it
+    def translate(self, pc):
+        body, sregs, dregs = [], set(), set()
+        end = pc
+        terminated = False
+        while end - pc < MAX_BLOCK_SIZE * 4:
+            try:
+                I = self.get_ist(end)
+                lines = I.get_py(end)
+            except (IndexError, NotImplementedError):
+                break
+            body += lines
+            sregs.update(getattr(I, 'sregs', []))
+            dregs.update(getattr(I, 'dregs', []))
+            end += 4
+            if I.name in ist.BRANCH_ISTS or I.name == 'BREAK':
+                terminated = True
+                break
+        # entry instruction cannot be translated
+        if end == pc:
+            self.cache[pc] = None
+            return None
+        if not terminated:
+            body.append('npc = %d'%end)
+
+        src = 'def block(regs, mems):\n'
+        for r in sorted(sregs | dregs):
+            src += '    r%d = regs[%d]\n'%(r, r)
+        for line in body:
+            src += '    ' + line + '\n'
+        for r in sorted(dregs):
+            src += '    regs[%d] = r%d\n'%(r, r)
+        src += '    return npc\n'
+
+        namespace = dict(BLOCK_GLOBALS)
+        exec(compile(src, '<block %d>'%pc, 'exec'), namespace)
+        b = self.cache[pc] = block(pc, end, (end - pc) >> 2, namespace['block'], src)
+        return b
+
+    # Drop the blocks covering pc, or every block if pc is None
+    def invalidate(self, pc=None):
+        if pc is None:
+            self.cache.clear()
+            return
+        for start, b in list(self.cache.items()):
+            if start == pc or (b is not None and b.start <= pc < b.end):
+                del self.cache[start]
@@ -24,6 +24,13 @@ def write(path, in_str, avoid_rewriting = False):
     f.write(in_str)
     f.close()
 
+# Write records one by one through a buffered file, records already
+# produced stay in the file if the run is interrupted
+def write_records(path, records):
+    with open(path, 'w') as f:
+        for record in records:
+            f.write(record)
+
 ################################### Bit Manipulation ###################################
 """
 Shift bits arithmetically, left shift if bits<0 else right shift
@@ -53,13 +60,12 @@ def b2i(word):
 
 # Decode signed bits(32) to integers 
 def signed_b2i(word):
-    if word[0] == '0':
-        return b2i(word)
-    else:
-        tmp = ''
-        for c in word[1:]:
-            tmp += str(1-int(c))
-        return -b2i(tmp)-1
+    return sign_extend(b2i(word), len(word))
+
+# Interpret the low `bits` bits of an unsigned integer as two's complement
+def sign_extend(value, bits):
+    sign = 1 << (bits - 1)
+    return (value & (sign - 1)) - (value & sign)
 
 # get first non-zero index of a word.
 def get_first_NZ_idx(word):
@@ -72,4 +78,11 @@ def list_intersection(a, b):
     return [val for val in a if val in b]
 
 def list_union(a, b):
-    return list(set(a) | set(b))
\ No newline at end of file
+    return list(set(a) | set(b))
+
+# Bit mask of register indexes
+def reg_mask(regs):
+    mask = 0
+    for r in regs:
+        mask |= 1 << r
+    return mask
@@ -0,0 +1,153 @@
+"""
+Lockstep vectorized simulation
+
+One decoded instruction stream (program.ists) runs over N data sets at once:
+the N register files and Data regions are NumPy arrays of shape (N, 32) and
+(N, words), and each instruction executes across every lane at its pc.
+Lanes have their own pc; when branches diverge, the lanes at the lowest pc
+run first (masking the others) so loops reconverge.
+
+Semantics follow program.simulate(), except that values are int64 instead
+of unbounded python ints, and SLT results are stored as 0 / 1.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+"""
+N lanes of the program, each with the same instructions and its own data set
+"""
+class lockstep():
+    def __init__(self, program, datasets, mem_words=None):
+        if np is None:
+            raise ImportError('Lockstep simulation requires numpy')
+        self.PG = program
+        self.START_PC = program.START_PC
+        self.START_DATA = program.START_DATA
+        self.N = len(datasets)
+        words = max([len(d) for d in datasets] + [mem_words or 0])
+        self.regs = np.zeros((self.N, program.REGISTER_NUM), dtype=np.int64)
+        self.mems = np.zeros((self.N, words), dtype=np.int64)
+        for i, data in enumerate(datasets):
+            self.mems[i, :len(data)] = data
+        self.pcs = np.full(self.N, self.START_PC, dtype=np.int64)
+        self.cycles = np.zeros(self.N, dtype=np.int64)
+        self.steps = 0
+
+    # Run until every lane meets BREAK or `max_steps` vector steps,
+    # return the number of vector steps
+    def run(self, max_steps=None):
+        n = 0
+        pcs = self.pcs
+        while max_steps is None or n < max_steps:
+            lo, hi = pcs.min(), pcs.max()
+            if hi == -1:
+                break
+            if lo == hi:
+                # converged, every lane at the same pc
+                pc, lanes = lo, slice(None)
+            else:
+                pc = pcs[pcs != -1].min()
+                lanes = np.nonzero(pcs == pc)[0]
+            I = self.get_ist(pc)
+            pcs[lanes] = VECTOR_OPS[type(I).__name__](self, I, lanes, int(pc))
+            self.cycles[lanes] += 1
+            n += 1
+        self.steps += n
+        return n
+
+    def get_ist(self, pc):
+        idx = (pc - self.START_PC) >> 2
+        if idx < 0 or idx >= len(self.PG.ists):
+            raise IndexError('No instruction at pc %d'%pc)
+        return self.PG.ists[idx]
+
+    # Data region indexes of word addresses
+    def mem_index(self, addr):
+        off = addr - self.START_DATA
+        if (off & 3).any() or (off < 0).any() or (off >= 4*self.mems.shape[1]).any():
+            raise IndexError('Data address out of the vector Data region')
+        return off >> 2
+
+    # Registers, Data region words and cycle number of one lane
+    def lane_state(self, lane):
+        return self.regs[lane].tolist(), self.mems[lane].tolist(), int(self.cycles[lane])
+
+################################### Vector Operations ###################################
+"""
+Each operation executes the instruction at pc on the given lanes and
+returns their next pcs.
+"""
+def _J(v, I, lanes, pc):
+    return I.target<<2
+
+def _JR(v, I, lanes, pc):
+    return v.regs[lanes, I.rs]
+
+def _BEQ(v, I, lanes, pc):
+    return np.where(v.regs[lanes, I.rs] == v.regs[lanes, I.rt], (I.offset<<2) + pc + 4, pc + 4)
+
+def _BLTZ(v, I, lanes, pc):
+    return np.where(v.regs[lanes, I.rs] < 0, (I.offset<<2) + pc + 4, pc + 4)
+
+def _BGTZ(v, I, lanes, pc):
+    return np.where(v.regs[lanes, I.rs] > 0, (I.offset<<2) + pc + 4, pc + 4)
+
+def _BREAK(v, I, lanes, pc):
+    return -1
+
+def _NOP(v, I, lanes, pc):
+    return pc + 4
+
+def _SW(v, I, lanes, pc):
+    idx = v.mem_index(v.regs[lanes, I.base] + I.offset)
+    rows = np.arange(v.N)[lanes]
+    v.mems[rows, idx] = v.regs[lanes, I.rt]
+    return pc + 4
+
+def _LW(v, I, lanes, pc):
+    idx = v.mem_index(v.regs[lanes, I.base] + I.offset)
+    rows = np.arange(v.N)[lanes]
+    v.regs[lanes, I.rt] = v.mems[rows, idx]
+    return pc + 4
+
+def _SLL(v, I, lanes, pc):
+    val = v.regs[lanes, I.rt]
+    # utils.shiftLogic shifts the absolute value of negative words
+    v.regs[lanes, I.rd] = val if I.sa == 0 else np.abs(val) << I.sa
+    return pc + 4
+
+def _SRL(v, I, lanes, pc):
+    val = v.regs[lanes, I.rt]
+    if I.sa != 0 and (val < 0).any():
+        raise TypeError('SRL of a negative word is not supported by utils.shiftLogic')
+    v.regs[lanes, I.rd] = val >> I.sa
+    return pc + 4
+
+def _SRA(v, I, lanes, pc):
+    v.regs[lanes, I.rd] = v.regs[lanes, I.rt] >> I.sa
+    return pc + 4
+
+# category 2 instructions, `op` combines rs values with rt values / immediate
+def _category2(op):
+    def execute(v, I, lanes, pc):
+        a = v.regs[lanes, I.rs]
+        if I.is_imm:
+            v.regs[lanes, I.rt] = op(a, I.rd_imm)
+        else:
+            v.regs[lanes, I.rd_imm] = op(a, v.regs[lanes, I.rt])
+        return pc + 4
+    return execute
+
+VECTOR_OPS = {
+    'J': _J, 'JR': _JR, 'BEQ': _BEQ, 'BLTZ': _BLTZ, 'BGTZ': _BGTZ, 'BREAK': _BREAK, 'NOP': _NOP,
+    'SW': _SW, 'LW': _LW, 'SLL': _SLL, 'SRL': _SRL, 'SRA': _SRA,
+    'ADD': _category2(lambda a, b: a + b),
+    'SUB': _category2(lambda a, b: a - b),
+    'MUL': _category2(lambda a, b: a * b),
+    # python `a and b` / `a or not b` as used by the instruction classes
+    'AND': _category2(lambda a, b: np.where(a != 0, b, a)),
+    'NOR': _category2(lambda a, b: np.where(a != 0, a, np.equal(b, 0).astype(np.int64))),
+    'SLT': _category2(lambda a, b: np.less(a, b).astype(np.int64)),
+}
@@ -0,0 +1,95 @@
+"""
+Data cache replacement order, write policies and state
+"""
+import unittest
+
+import src.cache as cache
+
+LINE = 4
+
+# one set of assoc ways, one word lines
+def one_set(assoc, replacement, write_policy='write_back'):
+    return cache.data_cache(assoc * LINE, assoc, LINE, replacement, write_policy, miss_latency=5)
+
+def lines(c):
+    return [t for t in c.tags]
+
+class lru_test(unittest.TestCase):
+    def test_victim_is_least_recent(self):
+        c = one_set(4, 'lru')
+        for line in range(4):
+            self.assertEqual(c.access(line * LINE, False, 0), 5)
+        # line 0 is used again, line 1 is the least recent
+        self.assertEqual(c.access(0, False, 0), 0)
+        c.access(4 * LINE, False, 0)
+        self.assertEqual(sorted(lines(c)), [0, 2, 3, 4])
+        c.access(5 * LINE, False, 0)
+        self.assertEqual(sorted(lines(c)), [0, 3, 4, 5])
+
+    def test_invalid_ways_first(self):
+        c = one_set(4, 'lru')
+        c.access(0, False, 0)
+        c.access(0, False, 0)
+        c.access(LINE, False, 0)
+        self.assertEqual(sorted(lines(c)), [-1, -1, 0, 1])
+
+class plru_test(unittest.TestCase):
+    def test_victim_follows_tree(self):
+        c = one_set(4, 'plru')
+        for line in range(4):
+            c.access(line * LINE, False, 0)
+        # every tree node points away from the last accessed ways
+        self.assertEqual(c.victim(0), 0)
+        c.access(0, False, 0)
+        self.assertEqual(c.victim(0), 2)
+        c.access(2 * LINE, False, 0)
+        self.assertEqual(c.victim(0), 1)
+        c.access(4 * LINE, False, 0)
+        self.assertEqual(lines(c), [0, 4, 2, 3])
+
+    def test_wide_sets(self):
+        for assoc in (64, 128, 256):
+            c = one_set(assoc, 'plru')
+            for line in range(2 * assoc):
+                c.access(line * LINE, False, 0)
+            self.assertEqual(c.report()['evictions'], assoc)
+            self.assertEqual(sorted(lines(c)), list(range(assoc, 2 * assoc)))
+
+    def test_needs_power_of_two(self):
+        with self.assertRaises(ValueError):
+            cache.data_cache(3 * LINE, 3, LINE, 'plru')
+
+class write_policy_test(unittest.TestCase):
+    def test_write_back(self):
+        c = one_set(2, 'lru')
+        self.assertEqual(c.access(0, True, 8), 5)        # allocates
+        c.access(LINE, False, 8)
+        c.access(2 * LINE, False, 12)                     # evicts the dirty line
+        r = c.report()
+        self.assertEqual((r['misses'], r['evictions'], r['writebacks']), (3, 1, 1))
+        self.assertEqual(r['per_pc']['12'], {'hits': 0, 'misses': 1, 'evictions': 1, 'writebacks': 1})
+
+    def test_write_through(self):
+        c = one_set(2, 'lru', 'write_through')
+        self.assertEqual(c.access(0, True, 0), 0)        # no allocation
+        self.assertEqual(lines(c), [-1, -1])
+        c.access(0, False, 0)
+        c.access(0, True, 0)
+        c.access(LINE, False, 0)
+        c.access(2 * LINE, False, 0)
+        self.assertEqual(c.report()['writebacks'], 0)
+
+class state_test(unittest.TestCase):
+    def test_round_trip(self):
+        for replacement in cache.REPLACEMENTS:
+            c = cache.data_cache(64, 4, 8, replacement)
+            for addr in (0, 64, 128, 8, 192, 0, 256, 72):
+                c.access(addr, addr % 16 == 0, addr)
+            d = cache.data_cache(64, 4, 8, replacement)
+            d.set_state(c.get_state())
+            for addr in (320, 8, 384, 0, 448):
+                self.assertEqual(d.access(addr, False, 0), c.access(addr, False, 0))
+            self.assertEqual(d.report(), c.report())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Checkpoint save -> load -> continue against uninterrupted runs
+"""
+import os
+import io
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+import src.main as main
+import src.config as config
+import src.encoder as encoder
+import src.checkpoint as checkpoint
+import bench.workloads as workloads
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = [os.path.join(ROOT, d, 'sample.txt') for d in ('sample', 'sample-pipeline', 'test')]
+
+HAZARDS = dict(fetch_hazards=True, read_hazards=True)
+CONFIGS = [
+    {},
+    dict(unit_counts=[2, 1, 2], unit_latencies=[1, 3, 2], queue_sizes=[3, 2, 3]),
+    dict(predictor='bimodal', **HAZARDS),
+    dict(predictor='btb', predictor_entries=16, **HAZARDS),
+    dict(dcache='lru', dcache_size=64, dcache_assoc=2, dcache_line=8, dcache_miss_latency=3),
+    dict(dcache='plru', dcache_size=128, dcache_assoc=4, dcache_line=8, dcache_write='write_through'),
+]
+
+def load(path, cfg=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = main.program(path, cfg)
+        p.load()
+    return p
+
+def records(p, engine):
+    return p.simulation_records() if engine == 'simulate' else p.pipeline_records()
+
+class checkpoint_test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        branch = os.path.join(cls.tmp, 'branch', 'sample.txt')
+        os.makedirs(os.path.dirname(branch))
+        workloads.generate('branch', branch, size=40)
+        cls.samples = SAMPLES + [branch]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    # Save after k records, restore on a new program and run to the end
+    def resume(self, path, cfg, engine, k):
+        p = load(path, cfg)
+        ckpt = os.path.join(self.tmp, 'run.ckpt')
+        with contextlib.redirect_stdout(io.StringIO()):
+            g = records(p, engine)
+            head = [next(g) for i in range(k)]
+            p.save_checkpoint(ckpt)
+            q = main.program(path, cfg)
+            q.load_checkpoint(ckpt)
+            tail = list(records(q, engine))
+        return head + tail, q
+
+    def check(self, path, cfg, engine):
+        ref = load(path, cfg)
+        with contextlib.redirect_stdout(io.StringIO()):
+            full = list(records(ref, engine))
+        for k in sorted(set(min(k, len(full)) for k in (0, 1, 5, len(full) // 2, len(full) - 1))):
+            with self.subTest(path=path, config=cfg.to_dict(), engine=engine, k=k):
+                got, q = self.resume(path, cfg, engine, k)
+                self.assertEqual(got, full)
+                self.assertEqual((q.cycle, q.ist_count), (ref.cycle, ref.ist_count))
+                if ref.predictor is not None:
+                    self.assertEqual(q.predictor.report(), ref.predictor.report())
+                if ref.dcache is not None:
+                    self.assertEqual(q.dcache.report(), ref.dcache.report())
+
+    def test_simulation(self):
+        for path in self.samples:
+            self.check(path, config.pipeline_config(), 'simulate')
+
+    def test_pipeline(self):
+        for path in self.samples:
+            for fields in CONFIGS:
+                self.check(path, config.from_dict(fields), 'pipeline')
+
+    # more than 255 unit instances and pre-issue entries
+    def test_wide_config(self):
+        asm = encoder.assembler()
+        for i in range(300):
+            asm.ADD(1 + i % 8, 1 + (i + 7) % 8, 0)
+        asm.BREAK()
+        path = os.path.join(self.tmp, 'wide', 'sample.txt')
+        os.makedirs(os.path.dirname(path))
+        asm.write(path)
+        cfg = config.pipeline_config(unit_counts=[300, 1, 1], pre_issue_size=300, fetch_width=300)
+        p = load(path, cfg)
+        with contextlib.redirect_stdout(io.StringIO()):
+            next(p.pipeline_records())
+        self.assertGreater(len(p.buffer_PRE_ISSUE), 255)
+        self.check(path, cfg, 'pipeline')
+
+    def test_rejects_other_config(self):
+        path = self.samples[0]
+        p = load(path)
+        ckpt = os.path.join(self.tmp, 'other.ckpt')
+        p.save_checkpoint(ckpt)
+        q = main.program(path, config.pipeline_config(issue_width=4))
+        with self.assertRaises(ValueError):
+            q.load_checkpoint(ckpt)
+
+    def test_rejects_other_version(self):
+        path = self.samples[0]
+        p = load(path)
+        ckpt = os.path.join(self.tmp, 'version.ckpt')
+        p.save_checkpoint(ckpt)
+        with open(ckpt, 'r+b') as f:
+            f.seek(4)
+            f.write(bytes([checkpoint.VERSION + 1]))
+        with self.assertRaises(ValueError):
+            load(path).load_checkpoint(ckpt)
+
+if __name__ == '__main__':
+    unittest.main()
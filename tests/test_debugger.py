@@ -0,0 +1,172 @@
+"""
+Breakpoints, watchpoints and the debugger REPL
+"""
+import os
+import io
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+import src.main as main
+import src.config as config
+import src.encoder as encoder
+import src.debugger as debugger
+
+LOOPS = 3
+# the pipeline checks every hazard, so both engines compute the same values
+HAZARDS = config.pipeline_config(fetch_hazards=True, read_hazards=True)
+
+def load(path, engine='simulate'):
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = main.program(path, HAZARDS if engine == 'pipeline' else None)
+        p.load()
+    return p
+
+class debugger_test(unittest.TestCase):
+    # R1 counts up to LOOPS and is stored to Data word 0 every iteration
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        asm = encoder.assembler()
+        asm.la(2, 0)
+        asm.ADD(1, 0, 0)
+        asm.ADD(3, 0, LOOPS)
+        asm.label('loop')
+        cls.loop = asm.pc()
+        asm.ADD(1, 1, 1)
+        asm.SW(1, 0, 2)
+        asm.SUB(3, 3, 1)
+        asm.BGTZ(3, 'loop')
+        asm.BREAK()
+        asm.data = [0]
+        cls.data = asm.start_data()
+        cls.path = os.path.join(cls.tmp, 'sample.txt')
+        asm.write(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def reference(self, engine):
+        p = load(self.path, engine)
+        with contextlib.redirect_stdout(io.StringIO()):
+            if engine == 'simulate':
+                list(p.simulation_steps())
+            else:
+                p.run_pipeline()
+        return p
+
+    def check_end(self, dbg, engine):
+        ref = self.reference(engine)
+        p = dbg.program
+        self.assertTrue(dbg.is_finished)
+        self.assertEqual((p.cycle, p.regs, p.mems[self.data]), (ref.cycle, ref.regs, ref.mems[self.data]))
+
+    def test_breakpoint(self):
+        for engine in debugger.ENGINES:
+            with self.subTest(engine=engine):
+                dbg = load(self.path, engine).debug(engine)
+                id = dbg.add_breakpoint(self.loop)
+                stops = []
+                with contextlib.redirect_stdout(io.StringIO()):
+                    while True:
+                        hits = dbg.cont()
+                        if not hits:
+                            break
+                        self.assertEqual([(w.id, pc) for w, pc, old, new in hits], [(id, self.loop)])
+                        stops.append(dbg.program.cycle)
+                self.assertEqual(len(stops), LOOPS)
+                self.assertEqual(dbg.watches[id].hits, LOOPS)
+                self.check_end(dbg, engine)
+
+    # stops before the instruction executes, continue runs it
+    def test_simulate_breakpoint_stop(self):
+        dbg = load(self.path).debug('simulate')
+        dbg.add_breakpoint(self.loop, 'r[1] == 1')
+        dbg.add_breakpoint(self.loop + 4)
+        with contextlib.redirect_stdout(io.StringIO()):
+            hits = dbg.cont()
+            self.assertEqual((hits[0][1], dbg.program.get_pc(), dbg.program.regs[1]), (self.loop + 4, self.loop + 4, 1))
+            hits = dbg.cont()
+            self.assertEqual((hits[0][1], dbg.program.regs[1]), (self.loop, 1))
+            hits = dbg.cont()
+            self.assertEqual((hits[0][1], dbg.program.regs[1]), (self.loop + 4, 2))
+
+    def test_first_instruction(self):
+        dbg = load(self.path).debug('simulate')
+        dbg.add_breakpoint(encoder.START_PC)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(len(dbg.cont()), 1)
+            self.assertEqual(dbg.program.cycle, 0)
+            self.assertEqual(dbg.cont(), [])
+        self.check_end(dbg, 'simulate')
+
+    def test_watchpoints(self):
+        for engine in debugger.ENGINES:
+            with self.subTest(engine=engine):
+                dbg = load(self.path, engine).debug(engine)
+                reg = dbg.watch_reg(1, 'new == 2')
+                mem = dbg.watch_mem(self.data)
+                hits = []
+                with contextlib.redirect_stdout(io.StringIO()):
+                    while not dbg.is_finished:
+                        hits += [(w.id, old, new) for w, pc, old, new in dbg.cont()]
+                self.assertEqual(hits, [(mem, 0, 1), (reg, 1, 2), (mem, 1, 2), (mem, 2, 3)])
+                self.check_end(dbg, engine)
+
+    def test_simulate_watch_pc(self):
+        dbg = load(self.path).debug('simulate')
+        dbg.watch_reg(3)
+        with contextlib.redirect_stdout(io.StringIO()):
+            pcs = [dbg.cont()[0][1] for i in range(LOOPS + 1)]
+        self.assertEqual(pcs, [self.loop - 4] + [self.loop + 8] * LOOPS)
+
+    def test_step_and_detach(self):
+        for engine in debugger.ENGINES:
+            with self.subTest(engine=engine):
+                p = load(self.path, engine)
+                dbg = p.debug(engine)
+                dbg.watch_reg(5)
+                dbg.add_breakpoint(0)
+                self.assertIn('set_reg_val', p.__dict__)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    self.assertEqual(dbg.step(4), [])
+                self.assertEqual(p.cycle, 4)
+                dbg.delete()
+                self.assertEqual([n for n in ('set_reg_val', 'set_mem_val', 'fetch_v2') if n in p.__dict__], [])
+                with contextlib.redirect_stdout(io.StringIO()):
+                    dbg.cont()
+                self.check_end(dbg, engine)
+
+    def test_invalid(self):
+        dbg = load(self.path).debug('simulate')
+        with self.assertRaises(ValueError):
+            dbg.add_breakpoint(self.loop, 'r[1] ==')
+        with self.assertRaises(ValueError):
+            dbg.watch_reg(32)
+        with self.assertRaises(IndexError):
+            dbg.watch_mem(self.data + 2)
+        with self.assertRaises(KeyError):
+            dbg.delete(7)
+        with self.assertRaises(ValueError):
+            debugger.debugger(dbg.program, 'unknown')
+
+    def test_shell(self):
+        out = io.StringIO()
+        shell = debugger.debugger_shell(load(self.path).debug('simulate'), stdout=out)
+        commands = ['break %d if r[1] == 2'%self.loop, 'watch %d'%self.data, 'continue', 'continue', 'continue',
+            'print r[1]', 'info', 'delete', 'continue', 'mem %d 1'%self.data, 'bogus 1']
+        with contextlib.redirect_stdout(io.StringIO()):
+            for line in commands:
+                shell.onecmd(line)
+        text = out.getvalue()
+        self.assertIn('Watchpoint 2, mem %d: 0 -> 1 (pc %d)'%(self.data, self.loop + 4), text)
+        self.assertIn('Breakpoint 1, pc %d'%self.loop, text)
+        self.assertIn('\n2\n', text)
+        self.assertIn('Breakpoint 1 at pc %d if r[1] == 2, hit 1 time\n'%self.loop, text)
+        self.assertIn('Program finished at cycle', text)
+        self.assertIn('*** Unknown syntax: bogus 1', text)
+
+if __name__ == '__main__':
+    unittest.main()
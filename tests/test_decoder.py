@@ -0,0 +1,92 @@
+"""
+Integer decoder fields, instruction text and decode cache
+"""
+import os
+import io
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+import src.main as main
+import src.encoder as encoder
+import src.decoder as decoder
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load(path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = main.program(path)
+        p.load()
+    return p
+
+class decoder_test(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    # listing of the original simulator
+    def test_sample_listing(self):
+        path = os.path.join(ROOT, 'sample', 'sample.txt')
+        with open(os.path.join(ROOT, 'sample', 'disassembly.txt'), 'r') as f:
+            expected = f.read()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(''.join(load(path).disassembly_records()), expected)
+
+    def test_every_instruction(self):
+        asm = encoder.assembler()
+        asm.label('top')
+        asm.ADD(1, 0, -4)
+        asm.SUB(2, 1, 'R3')
+        asm.AND(3, 2, 7)
+        asm.NOR(4, 3, 'R5')
+        asm.SLT(5, 4, -1)
+        asm.MUL(6, 5, 'R4')
+        asm.SLL(7, 6, 3)
+        asm.SRL(8, 7, 31)
+        asm.SRA(9, 8, 1)
+        asm.LW(10, -8, 1)
+        asm.SW(10, 12, 2)
+        asm.NOP()
+        asm.JR(31)
+        asm.BEQ(1, 2, 'top')
+        asm.BGTZ(3, 'top')
+        asm.BLTZ(4, 'top')
+        asm.J('top')
+        asm.BREAK()
+        path = os.path.join(self.tmp, 'sample.txt')
+        asm.write(path)
+        expected = ['ADD R1, R0, #-4', 'SUB R2, R1, R3', 'AND R3, R2, #7', 'NOR R4, R3, R5',
+            'SLT R5, R4, #-1', 'MUL R6, R5, R4', 'SLL R7, R6, #3', 'SRL R8, R7, #31', 'SRA R9, R8, #1',
+            'LW R10, -8(R1)', 'SW R10, 12(R2)', 'NOP', 'JR R31', 'BEQ R1, R2, #-56', 'BGTZ R3, #-60',
+            'BLTZ R4, #-64', 'J #64', 'BREAK']
+        p = load(path)
+        self.assertEqual([I.mips for I in p.ists], expected)
+        self.assertEqual([I.pc for I in p.ists], [encoder.START_PC + 4*i for i in range(len(expected))])
+
+    def test_fields(self):
+        w = encoder.category2('ADD', True, 1, 2, -3)
+        self.assertEqual((decoder.opcode(w), decoder.rs(w), decoder.rt(w), decoder.imm(w)),
+            (0b110000, 2, 1, -3))
+        w = encoder.shift('SRA', 9, 8, 31)
+        self.assertEqual((decoder.rt(w), decoder.rd(w), decoder.sa(w)), (8, 9, 31))
+        self.assertTrue(decoder.is_break(encoder.special(encoder.FUNCTS['BREAK'])))
+        self.assertFalse(decoder.is_break(0))
+
+    def test_unknown_word(self):
+        self.assertIsNone(decoder.decode_fields(encoder.special(0b111111)))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNone(decoder.decode(encoder.special(0b111111), None))
+
+    def test_cache(self):
+        w = encoder.category2('SUB', False, 3, 4, 5)
+        fields = decoder.decode_fields(w)
+        self.assertIs(decoder.decode_fields(w), fields)
+        decoder.clear_cache()
+        self.assertIsNot(decoder.decode_fields(w), fields)
+        self.assertEqual(decoder.decode_fields(w), fields)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Fast-forwarded idle cycles against cycle by cycle stepping
+"""
+import os
+import io
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+import src.main as main
+import src.config as config
+import bench.workloads as workloads
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = [os.path.join(ROOT, d, 'sample.txt') for d in ('sample', 'sample-pipeline', 'test')]
+
+SLOW = [
+    dict(unit_latencies=[3, 6, 4]),
+    dict(unit_counts=[2, 1, 2], unit_latencies=[2, 5, 3], queue_sizes=[3, 2, 3]),
+    dict(dcache='lru', dcache_size=64, dcache_assoc=2, dcache_line=8, dcache_miss_latency=7),
+]
+
+def load(path, cfg=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = main.program(path, cfg)
+        p.load()
+    return p
+
+# Records of every cycle stepped in full, idle ones included
+def stepped_records(p):
+    records = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        while not p.is_break_fetched:
+            IF_str = p.step_pipeline()
+            records.append(p.get_pipeline_header() + p.get_pipeline_body(IF_str))
+    return records
+
+class fast_forward_test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.samples = list(SAMPLES)
+        for name in sorted(workloads.WORKLOADS):
+            path = os.path.join(cls.tmp, name, 'sample.txt')
+            os.makedirs(os.path.dirname(path))
+            workloads.generate(name, path, size=30, unroll=3)
+            cls.samples.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def test_records(self):
+        for path in self.samples:
+            for fields in SLOW:
+                with self.subTest(path=path, config=fields):
+                    cfg = config.from_dict(fields)
+                    expected = stepped_records(load(path, cfg))
+                    p = load(path, cfg)
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        self.assertEqual(list(p.pipeline_records()), expected)
+
+    def test_run_pipeline(self):
+        skipped = 0
+        for path in self.samples:
+            for fields in SLOW:
+                with self.subTest(path=path, config=fields):
+                    cfg = config.from_dict(fields)
+                    ref = load(path, cfg)
+                    n = len(stepped_records(ref))
+                    p = load(path, cfg)
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        while not p.is_break_fetched:
+                            p.step_pipeline()
+                            skipped += p.idle_cycles
+                            p.skip_cycles(p.idle_cycles)
+                    self.assertEqual((p.cycle, p.ist_count, p.regs), (n, ref.ist_count, ref.regs))
+                    self.assertEqual(p.get_data_runs(), ref.get_data_runs())
+        self.assertGreater(skipped, 0)
+
+    # the Proj2 latencies leave no cycle to skip
+    def test_default_config(self):
+        for path in self.samples:
+            p = load(path)
+            with contextlib.redirect_stdout(io.StringIO()):
+                while not p.is_break_fetched:
+                    p.step_pipeline()
+                    self.assertEqual(p.idle_cycles, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Closure-compiled engine against simulate()
+"""
+import os
+import io
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+import src.main as main
+import src.fastsim as fastsim
+import bench.workloads as workloads
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = [os.path.join(ROOT, d, 'sample.txt') for d in ('sample', 'sample-pipeline', 'test')]
+
+def load(path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = main.program(path)
+        p.load()
+    return p
+
+def state(p):
+    return p.get_pc(), p.cycle, p.regs, p.get_data_runs()
+
+class closure_engine_test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.samples = list(SAMPLES)
+        for name in sorted(workloads.WORKLOADS):
+            path = os.path.join(cls.tmp, name, 'sample.txt')
+            os.makedirs(os.path.dirname(path))
+            workloads.generate(name, path, size=50, unroll=3)
+            cls.samples.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def reference(self, path):
+        p = load(path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            records = list(p.simulation_records())
+        return p, records
+
+    def test_whole_run(self):
+        for path in self.samples:
+            with self.subTest(path=path):
+                ref, records = self.reference(path)
+                p = load(path)
+                self.assertEqual(fastsim.closure_engine(p).run(), len(records))
+                self.assertEqual(state(p), state(ref))
+
+    # runs of max_ists instructions stop exactly and resume where they stopped
+    def test_chunks(self):
+        for path in self.samples:
+            with self.subTest(path=path):
+                ref, records = self.reference(path)
+                p = load(path)
+                engine = fastsim.closure_engine(p)
+                total = 0
+                while p.get_pc() != -1:
+                    n = engine.run(7)
+                    self.assertLessEqual(n, 7)
+                    total += n
+                    if p.get_pc() != -1:
+                        self.assertEqual(n, 7)
+                        self.assertEqual(p.cycle, total)
+                self.assertEqual(total, len(records))
+                self.assertEqual(state(p), state(ref))
+
+    # only the record of the last cycle
+    def test_simulate_fast(self):
+        for path in self.samples:
+            with self.subTest(path=path):
+                ref, records = self.reference(path)
+                p = load(path)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    disassembly, simulation = p.simulate_fast()
+                self.assertEqual(simulation, records[-1])
+
+if __name__ == '__main__':
+    unittest.main()
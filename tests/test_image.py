@@ -0,0 +1,98 @@
+"""
+Packed images against the sample.txt they were packed from
+"""
+import os
+import io
+import shutil
+import struct
+import tempfile
+import unittest
+import contextlib
+
+import src.main as main
+import src.image as image
+import src.utils as utils
+import bench.workloads as workloads
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = [os.path.join(ROOT, d, 'sample.txt') for d in ('sample', 'sample-pipeline', 'test')]
+
+def load(path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = main.program(path)
+        p.load()
+    return p
+
+def outputs(path):
+    p = load(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ret = [''.join(p.disassembly_records()), ''.join(p.simulation_records())]
+        p.reset()
+        ret.append(''.join(p.pipeline_records()))
+    return ret
+
+class image_test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.samples = list(SAMPLES)
+        path = os.path.join(cls.tmp, 'memory', 'sample.txt')
+        os.makedirs(os.path.dirname(path))
+        workloads.generate('memory', path, size=30, unroll=2)
+        cls.samples.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def test_same_outputs(self):
+        for sample in self.samples:
+            expected = outputs(sample)
+            for byteorder in ('little', 'big'):
+                with self.subTest(sample=sample, byteorder=byteorder):
+                    path = os.path.join(self.tmp, 'run.img')
+                    image.pack_sample(sample, path, byteorder)
+                    self.assertTrue(image.is_image(path))
+                    self.assertFalse(image.is_image(sample))
+                    self.assertEqual(outputs(path), expected)
+
+    # instructions are decoded on first fetch
+    def test_lazy_decode(self):
+        path = os.path.join(self.tmp, 'lazy.img')
+        image.pack_sample(self.samples[-1], path)
+        p = load(path)
+        self.assertEqual(p.ists.decoded(), 0)
+        p.ists[3]
+        self.assertEqual(p.ists.decoded(), 1)
+        p.image.close()
+
+    def test_unpack(self):
+        for sample in self.samples:
+            with self.subTest(sample=sample):
+                path = os.path.join(self.tmp, 'unpack.img')
+                out = os.path.join(self.tmp, 'unpacked.txt')
+                image.pack_sample(sample, path, 'big')
+                image.unpack_image(path, out)
+                lines = [l.strip() for l in utils.read(sample) if l.strip()]
+                with open(out, 'r') as f:
+                    self.assertEqual(f.read().split(), lines)
+
+    def test_invalid(self):
+        path = os.path.join(self.tmp, 'bad.img')
+        image.pack([1, 2, 3], path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        cases = {
+            'truncated': data[:-4],
+            'version': data[:4] + struct.pack('<H', image.VERSION + 1) + data[6:],
+            'byte order': data[:6] + b'=' + data[7:],
+        }
+        for name, content in cases.items():
+            with self.subTest(case=name):
+                with open(path, 'wb') as f:
+                    f.write(content)
+                with self.assertRaises(ValueError):
+                    image.packed_image(path)
+
+if __name__ == '__main__':
+    unittest.main()
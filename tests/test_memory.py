@@ -0,0 +1,81 @@
+"""
+Paged memory reads, writes, spilled values and Data runs
+"""
+import unittest
+from array import array
+
+import src.memory as memory
+
+PAGE = memory.PAGE_SIZE
+
+class paged_memory_test(unittest.TestCase):
+    def setUp(self):
+        self.m = memory.paged_memory()
+
+    def test_pages_on_touch(self):
+        m = self.m
+        self.assertEqual(m[4 * PAGE + 8], 0)
+        self.assertEqual(m.allocated(), 0)
+        m[4 * PAGE + 8] = -5
+        m[(1 << 32) - 4] = 9
+        self.assertEqual((m[4 * PAGE + 8], m[(1 << 32) - 4]), (-5, 9))
+        self.assertEqual(sorted(m.pages), [4, (1 << 32) // PAGE - 1])
+        self.assertEqual(m.allocated(), 2 * PAGE)
+        self.assertEqual(m.high, (1 << 32) - 4)
+
+    def test_invalid_address(self):
+        for addr in (2, -4, 1 << 32):
+            with self.assertRaises(IndexError):
+                self.m[addr] = 1
+            with self.assertRaises(IndexError):
+                self.m[addr]
+
+    # values which are not int32 are kept exactly
+    def test_spill(self):
+        m = self.m
+        for v in (True, 1 << 40, -(1 << 31) - 1):
+            m[16] = v
+            self.assertEqual((m[16], type(m[16])), (v, type(v)))
+        self.assertEqual(m.read_range(12, 3), [0, -(1 << 31) - 1, 0])
+        m[16] = 3
+        self.assertEqual((m[16], m.spill), (3, {}))
+        m[16] = False
+        m.load_words(12, [1, 2])
+        self.assertEqual((m[16], m.spill), (2, {}))
+
+    def test_bulk_load(self):
+        m = self.m
+        values = list(range(-10, PAGE // 4 + 10))
+        m.load_words(PAGE - 40, values)
+        self.assertEqual(m.read_range(PAGE - 40, len(values)), values)
+        self.assertEqual(m.high, PAGE - 40 + 4 * (len(values) - 1))
+        words = array('i', [1, -2, 3])
+        words.byteswap()
+        m.load_bytes(0, words.tobytes(), swap=True)
+        self.assertEqual(m.read_range(0, 3), [1, -2, 3])
+        with self.assertRaises(IndexError):
+            m.load_words((1 << 32) - 4, [1, 2])
+
+    def test_data_runs(self):
+        m = self.m
+        start = 200
+        self.assertEqual(m.data_runs(start), [])
+        m.load_words(start, [1, 2, 3])
+        self.assertEqual(m.data_words(start), 3)
+        self.assertEqual(m.data_runs(start), [(start, 3)])
+        # a store pages away adds the rows of its page up to the store, not
+        # the pages in between
+        far = start + 10 * PAGE + 4 * 13
+        m[far] = 7
+        self.assertEqual(m.data_words(start), (far - start) // 4 + 1)
+        first_end = start + -(-(PAGE - start) // 32) * 32
+        row = start + (10 * PAGE - start) // 32 * 32
+        self.assertEqual(m.data_runs(start), [(start, (first_end - start) // 4), (row, (far + 4 - row) // 4)])
+        self.assertEqual(m.read_range(row, (far + 4 - row) // 4)[-1], 7)
+        # every page in between written, one run
+        for n in range(1, 10):
+            m[n * PAGE] = n
+        self.assertEqual(m.data_runs(start), [(start, (far + 4 - start) // 4)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Branch predictor tables, statistics and state
+"""
+import types
+import unittest
+
+import src.predictor as predictor
+
+def branch(name='BEQ', offset=4):
+    return types.SimpleNamespace(name=name, offset=offset)
+
+PC = 100
+TAKEN = predictor.taken_target(PC, branch())
+
+class static_test(unittest.TestCase):
+    def test_not_taken(self):
+        p = predictor.static_predictor(16)
+        self.assertEqual(p.predict(PC, branch()), PC + 4)
+        self.assertIsNone(p.predict(PC, branch('JR')))
+
+class bimodal_test(unittest.TestCase):
+    def test_counter_saturates(self):
+        p = predictor.bimodal_predictor(16)
+        I = branch()
+        self.assertEqual(p.predict(PC, I), PC + 4)
+        p.resolve(PC, I, p.predict(PC, I), TAKEN)
+        self.assertEqual(p.predict(PC, I), TAKEN)
+        for i in range(3):
+            p.resolve(PC, I, p.predict(PC, I), TAKEN)
+        # strongly taken, one not taken branch keeps the prediction
+        p.resolve(PC, I, p.predict(PC, I), PC + 4)
+        self.assertEqual(p.predict(PC, I), TAKEN)
+        p.resolve(PC, I, p.predict(PC, I), PC + 4)
+        self.assertEqual(p.predict(PC, I), PC + 4)
+        r = p.report()
+        self.assertEqual((r['branches'], r['predicted'], r['correct']), (6, 6, 3))
+
+    def test_aliasing(self):
+        p = predictor.bimodal_predictor(4)
+        p.train(PC, branch(), TAKEN)
+        self.assertEqual(p.predict(PC + 16, branch()), predictor.taken_target(PC + 16, branch()))
+
+class btb_test(unittest.TestCase):
+    def test_taken_branch_enters(self):
+        p = predictor.btb_predictor(16)
+        I = branch()
+        p.train(PC, I, PC + 4)
+        self.assertEqual(p.table, [None] * 16)
+        p.train(PC, I, TAKEN)
+        self.assertEqual(p.predict(PC, I), TAKEN)
+        p.train(PC, I, PC + 4)
+        self.assertEqual(p.predict(PC, I), PC + 4)
+
+    def test_jr_target(self):
+        p = predictor.btb_predictor(16)
+        I = branch('JR')
+        self.assertIsNone(p.predict(PC, I))
+        p.train(PC, I, 400)
+        self.assertEqual(p.predict(PC, I), 400)
+        p.train(PC, I, 480)
+        self.assertEqual(p.predict(PC, I), 480)
+
+    def test_conflict_replaces(self):
+        p = predictor.btb_predictor(4)
+        p.train(PC, branch(), TAKEN)
+        p.train(PC + 16, branch(), 200)
+        self.assertEqual(p.predict(PC, branch()), PC + 4)
+        self.assertEqual(p.predict(PC + 16, branch()), 200)
+
+class state_test(unittest.TestCase):
+    def test_round_trip(self):
+        for name, cls in predictor.PREDICTORS.items():
+            p = cls(8)
+            for i in range(20):
+                pc = PC + 4 * (i % 5)
+                I = branch('JR' if i % 7 == 0 else 'BEQ')
+                p.resolve(pc, I, p.predict(pc, I), pc + 4 if i % 3 else 300 + i)
+            p.flush(2)
+            q = cls(8)
+            q.set_state(p.get_state())
+            self.assertEqual(q.report(), p.report(), name)
+            for i in range(5):
+                pc = PC + 4 * i
+                self.assertEqual(q.predict(pc, branch()), p.predict(pc, branch()), name)
+                self.assertEqual(q.predict(pc, branch('JR')), p.predict(pc, branch('JR')), name)
+
+if __name__ == '__main__':
+    unittest.main()
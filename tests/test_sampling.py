@@ -0,0 +1,89 @@
+"""
+Sampled pipeline runs against full functional and pipeline runs
+"""
+import os
+import io
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+import src.main as main
+import src.config as config
+import src.sampling as sampling
+import bench.workloads as workloads
+
+HAZARDS = config.pipeline_config(fetch_hazards=True, read_hazards=True)
+
+def load(path, cfg=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = main.program(path, cfg)
+        p.load()
+    return p
+
+# Sampler that keeps the program of its last pass
+class kept_sampler(sampling.sampler):
+    def load(self):
+        self.program = sampling.sampler.load(self)
+        return self.program
+
+class sampling_test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.samples = {}
+        for name in ('memory', 'mulshift'):
+            path = os.path.join(cls.tmp, name, 'sample.txt')
+            os.makedirs(os.path.dirname(path))
+            workloads.generate(name, path, size=300, unroll=4)
+            cls.samples[name] = path
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def pipeline(self, path):
+        p = load(path, HAZARDS)
+        with contextlib.redirect_stdout(io.StringIO()):
+            p.run_pipeline()
+        return p
+
+    # BREAK is fetched in the last measurement window, the run ends there
+    def test_break_in_window(self):
+        for name, path in self.samples.items():
+            with self.subTest(name=name):
+                s = kept_sampler(path, period=2000, warmup=200, measure=400)
+                result = s.run()
+                self.assertTrue(s.program.is_break_fetched)
+                ref = self.pipeline(path)
+                self.assertEqual(result.instructions, ref.ist_count)
+                self.assertLess(abs(result.cycles() - ref.cycle) / ref.cycle, 0.05)
+
+    # every drained window hands the simulate() state to the functional engine
+    def test_state_after_windows(self):
+        path = self.samples['mulshift']
+        s = kept_sampler(path, period=1000, warmup=100, measure=300)
+        result = s.run()
+        self.assertFalse(s.program.is_break_fetched)
+        ref = load(path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            ref.simulate()
+        self.assertEqual(result.instructions, ref.cycle)
+        self.assertEqual(s.program.regs, ref.regs)
+        self.assertEqual(s.program.get_data_runs(), ref.get_data_runs())
+
+    def test_bbv(self):
+        path = self.samples['memory']
+        result = sampling.sampler(path, 'bbv', period=1000, warmup=100, measure=300, clusters=2).run()
+        self.assertEqual(result.instructions, self.pipeline(path).ist_count)
+        self.assertTrue(result.windows)
+        self.assertEqual(sum(result.weights.values()), 1.0)
+
+    def test_needs_hazards(self):
+        with self.assertRaises(ValueError):
+            sampling.sampler(self.samples['memory'], pipeline_config=config.pipeline_config())
+        with self.assertRaises(ValueError):
+            sampling.sampler(self.samples['memory'], pipeline_config=config.pipeline_config(fetch_hazards=True))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Register masks of decoded instructions and the pipeline scoreboard
+"""
+import os
+import io
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+import src.main as main
+import src.config as config
+import src.encoder as encoder
+import src.instruction as ist
+import bench.workloads as workloads
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = [os.path.join(ROOT, d, 'sample.txt') for d in ('sample', 'sample-pipeline', 'test')]
+
+HAZARDS = dict(fetch_hazards=True, read_hazards=True)
+CONFIGS = [
+    {},
+    HAZARDS,
+    dict(unit_counts=[2, 1, 2], unit_latencies=[1, 3, 2], queue_sizes=[3, 2, 3], issue_width=4),
+    dict(predictor='bimodal', **HAZARDS),
+]
+
+def load(path, cfg=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = main.program(path, cfg)
+        p.load()
+    return p
+
+# destination registers of the issued instructions not written back
+def issued_dmask(p):
+    mask = 0
+    for l in (p.queue_PRE_ALU, p.queue_PRE_ALUB, p.queue_PRE_MEM,
+        p.buffer_POST_ALU, p.buffer_POST_ALUB, p.buffer_POST_MEM):
+        for I in l:
+            mask |= I.dmask
+    return mask
+
+class mask_test(unittest.TestCase):
+    def test_instruction_masks(self):
+        asm = encoder.assembler()
+        asm.label('top')
+        asm.ADD(1, 2, 'R3')
+        asm.SUB(4, 5, -1)
+        asm.MUL(6, 7, 'R8')
+        asm.SLL(9, 10, 2)
+        asm.LW(11, 4, 12)
+        asm.SW(13, 8, 14)
+        asm.BEQ(15, 16, 'top')
+        asm.NOP()
+        asm.BREAK()
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'sample.txt')
+            asm.write(path)
+            p = load(path)
+        finally:
+            shutil.rmtree(tmp)
+        bit = lambda *regs: sum(1 << r for r in regs)
+        expected = [
+            (bit(2, 3), bit(1), ist.UNIT_ALU),
+            (bit(5), bit(4), ist.UNIT_ALU),
+            (bit(7, 8), bit(6), ist.UNIT_ALUB),
+            (bit(10), bit(9), ist.UNIT_ALUB),
+            (bit(12), bit(11), ist.UNIT_MEM),
+            (bit(13, 14), 0, ist.UNIT_MEM),
+            (bit(15, 16), 0, ist.UNIT_BRANCH),
+            (0, 0, ist.UNIT_ALUB),                 # NOP is named SRA, as in the original pipeline
+            (0, 0, ist.UNIT_NONE),
+        ]
+        self.assertEqual([(I.smask, I.dmask, I.unit) for I in p.ists], expected)
+
+class scoreboard_test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.samples = list(SAMPLES)
+        for name in sorted(workloads.WORKLOADS):
+            path = os.path.join(cls.tmp, name, 'sample.txt')
+            os.makedirs(os.path.dirname(path))
+            workloads.generate(name, path, size=30, unroll=3)
+            cls.samples.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    # the scoreboard holds the destinations of every issued instruction
+    # until it is written back
+    def test_unready_mask(self):
+        for path in self.samples:
+            for fields in CONFIGS:
+                with self.subTest(path=path, config=fields):
+                    p = load(path, config.from_dict(fields))
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        for IF_str in p.pipeline_steps():
+                            self.assertEqual(p.unready_mask, issued_dmask(p))
+                    self.assertTrue(p.is_break_fetched)
+
+if __name__ == '__main__':
+    unittest.main()
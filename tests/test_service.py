@@ -0,0 +1,133 @@
+"""
+Simulation service and client round trips on a temporary socket
+"""
+import os
+import io
+import sys
+import json
+import time
+import base64
+import shutil
+import tempfile
+import unittest
+import contextlib
+import subprocess
+
+import src.main as main
+import src.config as config
+import src.client as client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = [os.path.join(ROOT, d, 'sample.txt') for d in ('sample', 'sample-pipeline', 'test')]
+
+# Listing, simulation and pipeline of a sample run in this process
+def expected_outputs(path, cfg=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = main.program(path, cfg)
+        p.load()
+        ret = {'disassembly.txt': ''.join(p.disassembly_records()),
+            'simulation.txt': ''.join(p.simulation_records())}
+        instructions = p.cycle
+        p.reset()
+        ret['pipeline.txt'] = ''.join(p.pipeline_records())
+    return ret, (instructions, p.cycle)
+
+class service_test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.socket = os.path.join(cls.tmp, 'service.sock')
+        cls.service = subprocess.Popen([sys.executable, '-m', 'src.service', 'serve', '--socket', cls.socket,
+            '-j', '1'], cwd=ROOT)
+        deadline = time.time() + 30
+        while not client.is_running(cls.socket):
+            if cls.service.poll() is not None or time.time() > deadline:
+                cls.service.kill()
+                shutil.rmtree(cls.tmp)
+                raise RuntimeError('The service did not start')
+            time.sleep(0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            list(client.request({'op': 'shutdown'}, cls.socket))
+            cls.service.wait(30)
+        finally:
+            if cls.service.poll() is None:
+                cls.service.kill()
+                cls.service.wait()
+            shutil.rmtree(cls.tmp)
+
+    def copy(self, sample, name):
+        path = os.path.join(self.tmp, name, 'sample.txt')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copy(sample, path)
+        return path
+
+    def check_results(self, reply, counts):
+        results = dict((r['engine'], r) for r in reply['results'])
+        self.assertEqual((results['functional']['instructions'], results['pipeline']['cycles']), counts)
+
+    # outputs are written next to the input
+    def test_path_job(self):
+        for idx, sample in enumerate(SAMPLES):
+            with self.subTest(sample=sample):
+                path = self.copy(sample, 'path%d'%idx)
+                expected, counts = expected_outputs(path)
+                reply = client.submit({'id': idx, 'path': path, 'mode': 'both'}, self.socket)
+                self.assertEqual((reply['id'], reply['type']), (idx, 'result'))
+                self.check_results(reply, counts)
+                for name, text in expected.items():
+                    with open(os.path.join(os.path.dirname(path), name), 'r') as f:
+                        self.assertEqual(f.read(), text)
+
+    # outputs are sent back, the program is decoded once
+    def test_inline_job(self):
+        path = SAMPLES[0]
+        with open(path, 'rb') as f:
+            job = {'id': 'x', 'data': base64.b64encode(f.read()).decode(), 'mode': 'both',
+                'config': {'issue_width': 2}}
+        cached = []
+        for i in range(2):
+            outputs = {}
+            reply = client.submit(job, self.socket, outputs.__setitem__)
+            cached.append(reply['cached'])
+        self.assertEqual(cached, [False, True])
+        expected, counts = expected_outputs(path, config.pipeline_config(issue_width=2))
+        self.assertEqual(outputs, expected)
+        self.check_results(reply, counts)
+
+    def test_errors(self):
+        with self.assertRaises(RuntimeError):
+            client.submit({'path': SAMPLES[0], 'mode': 'unknown'}, self.socket)
+        with self.assertRaises(RuntimeError):
+            client.submit({'path': os.path.join(self.tmp, 'missing.txt')}, self.socket)
+        with self.assertRaises(RuntimeError):
+            client.submit({'path': SAMPLES[0], 'config': {'issue_width': 0}}, self.socket)
+        with client.connect(self.socket) as s, s.makefile('rb') as f:
+            s.sendall(b'not json\n[1]\n')
+            for i in range(2):
+                reply = json.loads(f.readline())
+                self.assertEqual((reply['id'], reply['type']), (None, 'error'))
+
+    # jobs of one connection run concurrently, replies carry their id
+    def test_one_connection(self):
+        paths = [self.copy(sample, 'conn%d'%idx) for idx, sample in enumerate(SAMPLES)]
+        with client.connect(self.socket) as s, s.makefile('rb') as f:
+            for idx, path in enumerate(paths):
+                s.sendall(json.dumps({'id': idx, 'path': path, 'mode': 'stats'}).encode() + b'\n')
+            replies = [json.loads(f.readline()) for path in paths]
+        self.assertEqual(sorted(r['id'] for r in replies), list(range(len(paths))))
+        for r in replies:
+            self.assertEqual(r['type'], 'result')
+            self.check_results(r, expected_outputs(paths[r['id']])[1])
+
+    def test_ping(self):
+        before = list(client.request({'op': 'ping', 'id': 1}, self.socket))[0]
+        client.submit({'path': SAMPLES[2], 'mode': 'stats'}, self.socket)
+        after = list(client.request({'op': 'ping', 'id': 2}, self.socket))[0]
+        self.assertEqual((after['id'], after['type']), (2, 'pong'))
+        self.assertEqual(after['jobs'], before['jobs'] + 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Delta trace round trip and the sparse Data dump
+"""
+import os
+import io
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+import src.main as main
+import src.trace as trace
+import src.encoder as encoder
+import src.formatter as formatter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = [os.path.join(ROOT, d, 'sample.txt') for d in ('sample', 'sample-pipeline', 'test')]
+
+def load(path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = main.program(path)
+        p.load()
+    return p
+
+def text(p, kind):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return ''.join(p.simulation_records() if kind == trace.KIND_SIMULATION else p.pipeline_records())
+
+def write_trace(path, p, kind, keyframe_interval):
+    with contextlib.redirect_stdout(io.StringIO()):
+        if kind == trace.KIND_SIMULATION:
+            trace.write_simulation_trace(path, p, keyframe_interval)
+        else:
+            trace.write_pipeline_trace(path, p, keyframe_interval)
+
+class trace_test(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'run.trace')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def check(self, sample, kind, keyframe_interval):
+        expected = text(load(sample), kind)
+        write_trace(self.path, load(sample), kind, keyframe_interval)
+        with trace.delta_trace_reader(self.path) as r:
+            self.assertEqual(''.join(r.render()), expected)
+            records = expected.split(formatter.SEPARATOR)[1:]
+            middle = len(records) // 2
+            self.assertEqual(''.join(r.render(r.first_cycle + middle, r.first_cycle + middle + 1)),
+                ''.join(formatter.SEPARATOR + x for x in records[middle:middle+2]))
+        # a trace cut in a record renders the cycles before the cut
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:len(data) * 2 // 3])
+        with trace.delta_trace_reader(self.path) as r:
+            out = ''.join(r.render())
+            self.assertTrue(out and expected.startswith(out))
+
+    def test_round_trip(self):
+        for sample in SAMPLES:
+            for kind in (trace.KIND_SIMULATION, trace.KIND_PIPELINE):
+                for keyframe_interval in (1, 7, 1000):
+                    with self.subTest(sample=sample, kind=kind, keyframe_interval=keyframe_interval):
+                        self.check(sample, kind, keyframe_interval)
+
+    def test_values(self):
+        for v in (0, -1, 1 << 40, -(1 << 63), 1 << 70, -(1 << 90), True, False):
+            packed = trace.pack_value(v)
+            got, off = trace.unpack_value(packed, 0)
+            self.assertEqual((got, type(got), off), (v, type(v), len(packed)))
+
+    # one store far above the Data region
+    def test_sparse_store(self):
+        asm = encoder.assembler()
+        asm.li(1, 1 << 24)
+        asm.ADD(2, 0, 7)
+        asm.SW(2, 0, 1)
+        asm.NOP()
+        asm.BREAK()
+        asm.data = [1, 2, 3]
+        sample = os.path.join(self.tmp, 'sample.txt')
+        asm.write(sample)
+        p = load(sample)
+        expected = text(p, trace.KIND_SIMULATION)
+        self.assertLess(len(expected), 100000)
+        self.assertIn('\n%d:\t0\t0\t7\n'%((1 << 24) - 8), expected)
+        self.assertEqual(p.mems[1 << 24], 7)
+        write_trace(self.path, load(sample), trace.KIND_SIMULATION, 2)
+        with trace.delta_trace_reader(self.path) as r:
+            self.assertEqual(''.join(r.render()), expected)
+
+if __name__ == '__main__':
+    unittest.main()
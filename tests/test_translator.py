@@ -0,0 +1,107 @@
+"""
+Block translator against simulate(), block splitting and invalidation
+"""
+import os
+import io
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+import src.main as main
+import src.encoder as encoder
+import src.translator as translator
+import bench.workloads as workloads
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = [os.path.join(ROOT, d, 'sample.txt') for d in ('sample', 'sample-pipeline', 'test')]
+
+def load(path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = main.program(path)
+        p.load()
+    return p
+
+def state(p):
+    return p.get_pc(), p.cycle, p.regs, p.get_data_runs()
+
+class block_translator_test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.samples = list(SAMPLES)
+        for name in sorted(workloads.WORKLOADS):
+            path = os.path.join(cls.tmp, name, 'sample.txt')
+            os.makedirs(os.path.dirname(path))
+            workloads.generate(name, path, size=50, unroll=3)
+            cls.samples.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def reference(self, path):
+        p = load(path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            n = len(list(p.simulation_steps()))
+        return p, n
+
+    def test_whole_run(self):
+        for path in self.samples:
+            with self.subTest(path=path):
+                ref, n = self.reference(path)
+                p = load(path)
+                bbv = {}
+                self.assertEqual(translator.block_translator(p).run(bbv=bbv), n)
+                self.assertEqual(state(p), state(ref))
+                self.assertEqual(sum(bbv.values()), n)
+
+    # a run stops after the block reaching max_ists
+    def test_chunks(self):
+        for path in self.samples:
+            with self.subTest(path=path):
+                ref, n = self.reference(path)
+                p = load(path)
+                engine = translator.block_translator(p)
+                total = 0
+                while p.get_pc() != -1:
+                    k = engine.run(10)
+                    if p.get_pc() != -1:
+                        self.assertGreaterEqual(k, 10)
+                    total += k
+                self.assertEqual(total, n)
+                self.assertEqual(state(p), state(ref))
+
+    def straight_line(self, n):
+        asm = encoder.assembler()
+        for i in range(n):
+            asm.ADD(1 + i % 4, 1 + (i + 3) % 4, 1)
+        asm.BREAK()
+        path = os.path.join(self.tmp, 'straight', 'sample.txt')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        asm.write(path)
+        return load(path)
+
+    def test_long_block(self):
+        p = self.straight_line(600)
+        engine = translator.block_translator(p)
+        engine.run()
+        size = translator.MAX_BLOCK_SIZE
+        self.assertEqual(sorted((b.start, b.size) for b in engine.cache.values()),
+            [(p.START_PC, size), (p.START_PC + 4*size, size), (p.START_PC + 8*size, 601 - 2*size)])
+        self.assertEqual(p.cycle, 601)
+
+    def test_invalidate(self):
+        p = self.straight_line(20)
+        engine = translator.block_translator(p)
+        engine.run(5)
+        self.assertEqual(list(engine.cache), [p.START_PC])
+        engine.invalidate(p.START_PC + 8)
+        self.assertEqual(engine.cache, {})
+        p.reset()
+        engine.run()
+        engine.invalidate()
+        self.assertEqual(engine.cache, {})
+
+if __name__ == '__main__':
+    unittest.main()